@@ -0,0 +1,77 @@
+// Batch mode main function for RNALoops instances, replaces
+// rtlib/generic_main.cc when addRNAoptions.pl is run with mode 3.
+// Instead of folding the sequence given on the command line once, the binary
+// reads one sequence per line from stdin and folds them one after another.
+// Every record gets a fresh instance object, while the static motif tables
+// from motif.hh are only built once for the whole process.
+// After each record a line consisting of the ASCII record separator (0x1e)
+// and the exit status of that record is written to stdout and flushed, that
+// way RNALoops.py can map the streamed outputs back to their record IDs.
+#include <cstdlib>
+#include <cstring>
+#include <exception>
+#include <iostream>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include "rtlib/string.hh"
+#include "rtlib/list.hh"
+#include "rtlib/hash.hh"
+#include "rtlib/asymptotics.hh"
+#include "Extensions/rnaoptions.hh"
+
+#define BATCH_RECORD_SEPARATOR '\x1e'
+
+// Frees the sequences of the previous record and sets line as the only
+// input track
+inline void set_batch_input(const std::string &line) {
+  gapc::Opts::inputs_t &inputs = gapc::Opts::getOpts()->inputs;
+  for (gapc::Opts::inputs_t::iterator i = inputs.begin(); i != inputs.end();
+       ++i)
+    delete[] (*i).first;
+  inputs.clear();
+  char *input = new char[line.size() + 1];
+  std::memcpy(input, line.c_str(), line.size() + 1);
+  inputs.push_back(std::make_pair(input, line.size()));
+}
+
+int main(int argc, char **argv) {
+  // Opts::parse throws without an input sequence, so a placeholder gets
+  // appended which is replaced before the first record is folded
+  std::vector<char*> batch_argv(argv, argv + argc);
+  char placeholder[] = "N";
+  batch_argv.push_back(placeholder);
+  batch_argv.push_back(nullptr);
+  try {
+    gapc::Opts::getOpts()->parse(argc + 1, batch_argv.data());
+  } catch (std::exception &e) {
+    std::cerr << "Exception: " << e.what() << '\n';
+    std::exit(1);
+  }
+  std::ios_base::sync_with_stdio(false);
+
+  std::string line;
+  while (std::getline(std::cin, line)) {
+    if (!line.empty() && line.back() == '\r')
+      line.pop_back();
+    set_batch_input(line);
+    int status = 0;
+    try {
+      gapc::class_name obj;
+      obj.init(*gapc::Opts::getOpts());
+      obj.cyk();
+      gapc::return_type res = obj.run();
+      obj.print_result(std::cout, res);
+      for (unsigned int i = 0; i != gapc::Opts::getOpts()->repeats; ++i)
+        obj.print_backtrack(std::cout, res);
+    } catch (std::exception &e) {
+      // Errors are written to stdout in batch mode so they stay attached to
+      // the record they belong to
+      std::cout << "Exception: " << e.what() << '\n';
+      status = 1;
+    }
+    std::cout << BATCH_RECORD_SEPARATOR << status << std::endl;
+  }
+  return 0;
+}
@@ -1,24 +1,27 @@
 #ifndef MOTIF_HH
 #define MOTIF_HH
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <array>
+#include <cstdint>
+#include <fstream>
+#include <iostream>
+#include <map>
+#include <mutex>
+#include <sstream>
+#include <string>
+#include <typeinfo>
+#include <unordered_map>
+#include <vector>
 #include "subsequence.hh"
 #include "rnaoptions.hh"
-#include<stdio.h>
-#include<stdlib.h>
-#include<string.h>
-#include<iostream>
-#include<typeinfo>
-#include<fstream>
-#include<unordered_map>
-#include<string>
-#include<vector>
-#include<sstream>
-#include<map>
-#include<mutex>
 #include "mot_header.hh"
-typedef std::unordered_map<std::string, char> HashMap;
-static HashMap HairpinHashMap;
-static HashMap InternalHashMap;
-static HashMap BulgeHashMap;
+#include "motif_catalogue.hh"
+#include "motif_table.hh"
+static MotifTable HairpinTable;
+static MotifTable InternalTable;
+static MotifTable BulgeTable;
 static bool initialized;
 static std::array Hairpins         = {hbgsu_fw, hrfam_fw, hboth_fw, hbgsu_rv, hrfam_rv, hboth_rv, hbgsu_both, hrfam_both, hboth_both};
 static std::array Hairpin_lengths  = {hbgsu_fw_len, hrfam_fw_len, hboth_fw_len, hbgsu_rv_len, hrfam_rv_len, hboth_rv_len, hbgsu_both_len, hrfam_both_len, hboth_both_len};
@@ -27,68 +30,52 @@ static std::array Internal_lengths = {ibgsu_fw_len, irfam_fw_len, iboth_fw_len,
 static std::array Bulges           = {bbgsu_fw, brfam_fw, bboth_fw, bbgsu_rv, brfam_rv, bboth_rv, bbgsu_both, brfam_both, bboth_both};
 static std::array Bulge_lengths    = {bbgsu_fw_len, brfam_fw_len, bboth_fw_len, bbgsu_rv_len, brfam_rv_len, bboth_rv_len, bbgsu_both_len, brfam_both_len, bboth_both_len};
 
-//Split function that allows me to split my input strings from they xx,yy form into v[0]="xx" and v[1]="yy" splitting the sequences from their single letter abbreviations
-inline std::vector<std::string> split (const std::string &s, char delim){
-    std::vector<std::string> result;
-    std::stringstream ss (s);
-    std::string item;
-    while (getline(ss,item,delim)) {
-        result.push_back(item);
+// Builds a MotifTable from the table selected by -Q (1 = BGSU, 2 = RMFAM,
+// 3 = both) and -b (1 = no reverses, 2 = only reverses, 3 = both reverse and
+// forward). Internal loop tables are two sided.
+inline void Motif_Table(MotifTable &table, const std::array<char*, 9> &arr,
+                        const std::array<unsigned int, 9> &len_arr,
+                        bool two_sided) {
+    unsigned int index = (gapc::Opts::getOpts()->reversed - 1) * 3 +
+                         (gapc::Opts::getOpts()->motifs - 1);
+    table.build(arr[index], len_arr[index], two_sided);
+}
+
+// Builds the motif tables on first use, from the motif catalogue file if one
+// was given with -X and from the compiled in tables otherwise
+inline void init_motif_maps() {
+    if (initialized) {
+        return;
+    }
+    initialized = true;
+    if (strcmp(gapc::Opts::getOpts()->motif_catalogue, "\0") != 0) {
+        load_motif_catalogue(gapc::Opts::getOpts()->motif_catalogue,
+                             Hairpins, Hairpin_lengths, Internals,
+                             Internal_lengths, Bulges, Bulge_lengths);
     }
-    return result;   
+    Motif_Table(HairpinTable, Hairpins, Hairpin_lengths, false);
+    Motif_Table(InternalTable, Internals, Internal_lengths, true);
+    Motif_Table(BulgeTable, Bulges, Bulge_lengths, false);
 }
 
-//HashMap implementation functions for all three loop types in the macrostate grammar.DB =database, which one gets used 1=BGSU, 2=RMFAM, 3 = bot // R = reverse, 1= No Reverses, 2 = Only Reverses, 3 = Both reverse and Forward
-inline HashMap Motif_HashMap(HashMap x, std::array<char* ,9> arr, std::array<unsigned int,9> len_arr) {
-    std::string str_mot_ar;
-    switch(gapc::Opts::getOpts()->reversed){
-       case 1:     
-           switch(gapc::Opts::getOpts()->motifs){
-               case 1:
-                   str_mot_ar.assign(arr[0],len_arr[0]);
-                   break;
-               case 2:
-                   str_mot_ar.assign(arr[1],len_arr[1]);
-                   break;
-               case 3:
-                   str_mot_ar.assign(arr[2],len_arr[2]);
-                   break;
-                   }
-       break;
-       case 2:
-           switch(gapc::Opts::getOpts()->motifs){
-               case 1:
-                   str_mot_ar.assign(arr[3],len_arr[3]);
-                   break;
-               case 2:
-                   str_mot_ar.assign(arr[4],len_arr[4]);
-                   break;
-               case 3:
-                   str_mot_ar.assign(arr[5],len_arr[5]);
-                   break;
-                   }
-       break;
-       case 3:
-           switch(gapc::Opts::getOpts()->motifs){
-                case 1:
-                    str_mot_ar.assign(arr[6],len_arr[6]);
-                    break;
-                case 2:
-                    str_mot_ar.assign(arr[7],len_arr[7]);
-                    break;
-                case 3:
-                    str_mot_ar.assign(arr[8],len_arr[8]);
-                    break;
-                   }
-       break;
-   }
-   std::string Line;
-   std::istringstream isstream(str_mot_ar);
-   while (std::getline (isstream, Line,'\n')) {
-       std::vector<std::string> v = split(Line,',');
-       x[v[0]]=v[1].c_str()[0];
-   }
-    return x;
+// Appends the 2 bit codes of a Basic_Subsequence to a motif key (see
+// motif_table.hh), bases that are not G, A or C count as U like in
+// InputManagement
+inline uint64_t encode_motif(const Basic_Subsequence<char, unsigned int> &a,
+                             uint64_t key = 1) {
+    for (unsigned int p = 0; p < a.size(); p++) {
+        char base = base_t(a.seq->seq[a.i + p]);
+        if (base == G_BASE) {
+            key = key << 2 | 2;
+        } else if (base == A_BASE) {
+            key = key << 2 | 0;
+        } else if (base == C_BASE) {
+            key = key << 2 | 1;
+        } else {
+            key = key << 2 | 3;
+        }
+    }
+    return key;
 }
 
 //Input Manipulation Function, allowing for ONE RNA Basic_Subsequence inputs to be converted to the HashMap Key Formatting
@@ -144,48 +131,41 @@ inline std::string InputManagement(const Basic_Subsequence<char, unsigned int> &
 }
 
 //Overloaded identify_motif functions, two identify_motif for Hairpins and Internal Loops respectively while identify_motif_b is for bulge loops
+// Candidates whose lengths lie outside the shortest and longest motif of a
+// table are rejected before they get encoded, motifs longer than
+// motif_key_bases are looked up in their string form (InputManagement).
 inline char identify_motif(const Basic_Subsequence<char, unsigned int> &a, char res) {
-    if (!initialized){
-        initialized = true;
-        HairpinHashMap  = Motif_HashMap(HairpinHashMap, Hairpins, Hairpin_lengths);
-        InternalHashMap = Motif_HashMap(InternalHashMap, Internals, Internal_lengths);
-        BulgeHashMap    = Motif_HashMap(BulgeHashMap, Bulges, Bulge_lengths);
+    init_motif_maps();
+    if (!HairpinTable.accepts(a.size())) {
+        return res;
     }
-    std::string Motif;
-    Motif = InputManagement(a);
-    if (auto search = HairpinHashMap.find(Motif); search != HairpinHashMap.end()){
-        return search->second;
+    if (a.size() > motif_key_bases) {
+        return HairpinTable.find(InputManagement(a), res);
     }
-    return res;
+    return HairpinTable.find(encode_motif(a), res);
 }
 
 inline char identify_motif(const Basic_Subsequence<char, unsigned int> &a, const Basic_Subsequence<char, unsigned int> &b, char res) {
-    if (!initialized){
-        initialized = true;
-        HairpinHashMap  = Motif_HashMap(HairpinHashMap, Hairpins, Hairpin_lengths);
-        InternalHashMap = Motif_HashMap(InternalHashMap, Internals, Internal_lengths);
-        BulgeHashMap    = Motif_HashMap(BulgeHashMap, Bulges, Bulge_lengths);
-    }   
-    std::string Motif;
-    Motif = InputManagement(a,b); //Jedes mal wenn die Funktion aufgerufen wird, wird erst res erstellt und dann Input Management gerufen um die Basic_Subsequence zu verarbeiten
-    if (auto search = InternalHashMap.find(Motif); search != InternalHashMap.end()) {
-        return search->second;
+    init_motif_maps();
+    if (!InternalTable.accepts(a.size(), b.size())) {
+        return res;
+    }
+    if (a.size() + b.size() > motif_key_bases) {
+        return InternalTable.find(InputManagement(a, b), res);
     }
-    return res;
+    return InternalTable.find(
+        MotifTable::two_sided_key(encode_motif(b, encode_motif(a)), a.size()),
+        res);
 }
 
 inline char identify_motif_b(const Basic_Subsequence<char, unsigned int> &a, char res) {
-    if (!initialized){
-        initialized = true;
-        HairpinHashMap  = Motif_HashMap(HairpinHashMap, Hairpins, Hairpin_lengths);
-        InternalHashMap = Motif_HashMap(InternalHashMap, Internals, Internal_lengths);
-        BulgeHashMap    = Motif_HashMap(BulgeHashMap, Bulges, Bulge_lengths);
+    init_motif_maps();
+    if (!BulgeTable.accepts(a.size())) {
+        return res;
     }
-    std::string Motif;
-    Motif = InputManagement(a); //Jedes mal wenn die Funktion aufgerufen wird, wird erst res erstellt und dann Input Management gerufen um die Basic_Subsequence zu verarbeiten
-    if (auto search = BulgeHashMap.find(Motif); search != BulgeHashMap.end()) {
-        return search->second;
+    if (a.size() > motif_key_bases) {
+        return BulgeTable.find(InputManagement(a), res);
     }
-    return res;
+    return BulgeTable.find(encode_motif(a), res);
 }
-#endif
\ No newline at end of file
+#endif
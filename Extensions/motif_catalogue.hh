@@ -0,0 +1,119 @@
+#ifndef MOTIF_CATALOGUE_HH
+#define MOTIF_CATALOGUE_HH
+
+// Runtime motif catalogue (-X), written by src/catalogue.py. All integers are
+// little endian uint32:
+// "RLMC" | format version | 32 byte motif version stamp | table count |
+// table count x (16 byte name | offset | length) | table data
+// Tables hold the same "SEQUENCE,ABBREVIATION" lines as the arrays of
+// mot_header.hh and carry their names (hbgsu_fw, irfam_rv, ...). The file is
+// memory mapped once and stays mapped for the lifetime of the process, the
+// motif tables point directly into the mapping.
+
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#include <array>
+#include <cstdint>
+#include <cstring>
+#include <stdexcept>
+#include <string>
+
+static const char motif_catalogue_magic[4] = {'R', 'L', 'M', 'C'};
+static const uint32_t motif_catalogue_format = 1;
+static const size_t motif_catalogue_header = 44;
+static const size_t motif_catalogue_entry = 24;
+// same order as the Hairpins, Internals and Bulges arrays in motif.hh
+static const std::array<const char*, 9> motif_table_keys = {
+    "bgsu_fw", "rfam_fw", "both_fw", "bgsu_rv", "rfam_rv", "both_rv",
+    "bgsu_both", "rfam_both", "both_both"};
+// motif version stamp of the loaded catalogue, empty without one
+static char motif_catalogue_version[33];
+
+inline uint32_t motif_catalogue_u32(const char *p) {
+  uint32_t value;
+  memcpy(&value, p, 4);
+  return value;
+}
+
+// Replaces the compiled in tables with the tables of the catalogue, tables
+// missing from the catalogue keep their compiled in sequences
+inline void load_motif_catalogue(
+    const char *path, std::array<char*, 9> &hairpins,
+    std::array<unsigned int, 9> &hairpin_lengths,
+    std::array<char*, 9> &internals,
+    std::array<unsigned int, 9> &internal_lengths,
+    std::array<char*, 9> &bulges, std::array<unsigned int, 9> &bulge_lengths) {
+  const std::string name_of_file(path);
+  int fd = open(path, O_RDONLY);
+  if (fd < 0) {
+    throw std::runtime_error("Could not open motif catalogue " + name_of_file);
+  }
+  struct stat info;
+  if (fstat(fd, &info) != 0 ||
+      static_cast<size_t>(info.st_size) < motif_catalogue_header) {
+    close(fd);
+    throw std::runtime_error(name_of_file + " is not a motif catalogue");
+  }
+  size_t size = info.st_size;
+  void *mapping = mmap(nullptr, size, PROT_READ, MAP_PRIVATE, fd, 0);
+  close(fd);
+  if (mapping == MAP_FAILED) {
+    throw std::runtime_error("Could not map motif catalogue " + name_of_file);
+  }
+  char *data = static_cast<char*>(mapping);
+  if (memcmp(data, motif_catalogue_magic, 4) != 0) {
+    throw std::runtime_error(name_of_file + " is not a motif catalogue");
+  }
+  if (motif_catalogue_u32(data + 4) != motif_catalogue_format) {
+    throw std::runtime_error("Motif catalogue " + name_of_file +
+                             " has an unsupported format version");
+  }
+  size_t version_length = strnlen(data + 8, 32);
+  memcpy(motif_catalogue_version, data + 8, version_length);
+  motif_catalogue_version[version_length] = '\0';
+  uint32_t count = motif_catalogue_u32(data + 40);
+  if (motif_catalogue_header + static_cast<size_t>(count) *
+      motif_catalogue_entry > size) {
+    throw std::runtime_error("Motif catalogue " + name_of_file +
+                             " is truncated");
+  }
+  for (uint32_t i = 0; i < count; i++) {
+    const char *entry =
+        data + motif_catalogue_header + i * motif_catalogue_entry;
+    std::string name(entry, strnlen(entry, 16));
+    uint32_t offset = motif_catalogue_u32(entry + 16);
+    uint32_t length = motif_catalogue_u32(entry + 20);
+    if (static_cast<size_t>(offset) + length > size) {
+      throw std::runtime_error("Table " + name + " exceeds motif catalogue " +
+                               name_of_file);
+    }
+    std::array<char*, 9> *tables;
+    std::array<unsigned int, 9> *lengths;
+    switch (name.empty() ? '\0' : name[0]) {
+      case 'h':
+        tables = &hairpins;
+        lengths = &hairpin_lengths;
+        break;
+      case 'i':
+        tables = &internals;
+        lengths = &internal_lengths;
+        break;
+      case 'b':
+        tables = &bulges;
+        lengths = &bulge_lengths;
+        break;
+      default:
+        continue;
+    }
+    for (size_t k = 0; k < motif_table_keys.size(); k++) {
+      if (name.compare(1, std::string::npos, motif_table_keys[k]) == 0) {
+        (*tables)[k] = data + offset;
+        (*lengths)[k] = length;
+      }
+    }
+  }
+}
+
+#endif
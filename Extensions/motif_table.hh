@@ -0,0 +1,157 @@
+#ifndef MOTIF_TABLE_HH
+#define MOTIF_TABLE_HH
+
+// Compact motif matcher for the DP hot path. Motif sequences are 2 bit encoded
+// (A=0, C=1, G=2, U=3) behind a leading 1 bit that marks their length, two
+// sided (internal loop) motifs additionally carry the length of their 5' side
+// in the top bits of the key. Keys live in an open addressing table with
+// linear probing, candidates whose side lengths lie outside the shortest and
+// longest motif of the table are rejected before they are encoded at all.
+// Motifs longer than motif_key_bases do not fit into a key and are kept in a
+// string map instead.
+
+#include <algorithm>
+#include <climits>
+#include <cstdint>
+#include <string>
+#include <unordered_map>
+#include <utility>
+#include <vector>
+
+static const unsigned int motif_key_bases = 28;
+static const unsigned int motif_key_side_shift = 58;
+
+inline uint64_t motif_char_code(char c) {
+  switch (c) {
+    case 'A':
+      return 0;
+    case 'C':
+      return 1;
+    case 'G':
+      return 2;
+    default:
+      return 3;
+  }
+}
+
+class MotifTable {
+ public:
+  unsigned int min_left = UINT_MAX, max_left = 0;
+  unsigned int min_right = UINT_MAX, max_right = 0;
+
+  // table holds "SEQUENCE,ABBREVIATION" lines like the arrays of
+  // mot_header.hh, two sided tables hold "LEFT$RIGHT" sequences. Later lines
+  // overwrite earlier lines with the same sequence, entries that can never be
+  // looked up (wrong side count, other characters than ACGU) are skipped.
+  void build(const char *table, unsigned int length, bool two_sided) {
+    std::vector<std::pair<std::string, char> > entries;
+    unsigned int start = 0;
+    while (start < length) {
+      unsigned int end = start;
+      while (end < length && table[end] != '\n') {
+        end++;
+      }
+      std::string line(table + start, end - start);
+      std::string::size_type comma = line.find(',');
+      if (comma != std::string::npos && comma + 1 < line.size()) {
+        entries.emplace_back(line.substr(0, comma), line[comma + 1]);
+      }
+      start = end + 1;
+    }
+    unsigned int capacity = 16;
+    while (capacity < 2 * entries.size()) {
+      capacity <<= 1;
+    }
+    keys.assign(capacity, 0);
+    values.assign(capacity, '\0');
+    mask = capacity - 1;
+    shift = 64;
+    for (unsigned int c = capacity; c > 1; c >>= 1) {
+      shift--;
+    }
+    for (auto &entry : entries) {
+      add(entry.first, entry.second, two_sided);
+    }
+  }
+
+  bool accepts(unsigned int left, unsigned int right = 0) const {
+    return left >= min_left && left <= max_left && right >= min_right &&
+           right <= max_right;
+  }
+
+  static uint64_t two_sided_key(uint64_t bits, unsigned int left) {
+    return bits | (static_cast<uint64_t>(left) << motif_key_side_shift);
+  }
+
+  char find(uint64_t key, char res) const {
+    for (uint64_t slot = hash(key);; slot = (slot + 1) & mask) {
+      if (keys[slot] == key) {
+        return values[slot];
+      }
+      if (keys[slot] == 0) {
+        return res;
+      }
+    }
+  }
+
+  // lookup for motifs longer than motif_key_bases, in their string form
+  char find(const std::string &motif, char res) const {
+    auto search = overflow.find(motif);
+    if (search != overflow.end()) {
+      return search->second;
+    }
+    return res;
+  }
+
+ private:
+  // 0 marks an empty slot, encoded keys always carry the leading length bit
+  std::vector<uint64_t> keys;
+  std::vector<char> values;
+  uint64_t mask = 0;
+  unsigned int shift = 60;
+  std::unordered_map<std::string, char> overflow;
+
+  uint64_t hash(uint64_t key) const {
+    return (key * 0x9E3779B97F4A7C15ULL) >> shift;
+  }
+
+  void add(const std::string &sequence, char value, bool two_sided) {
+    std::string::size_type separator = sequence.find('$');
+    if (two_sided != (separator != std::string::npos) ||
+        sequence.find_first_not_of(two_sided ? "ACGU$" : "ACGU") !=
+            std::string::npos) {
+      return;
+    }
+    unsigned int left = two_sided ? separator : sequence.size();
+    unsigned int right = two_sided ? sequence.size() - separator - 1 : 0;
+    if (two_sided && sequence.find('$', separator + 1) != std::string::npos) {
+      return;
+    }
+    min_left = std::min(min_left, left);
+    max_left = std::max(max_left, left);
+    min_right = std::min(min_right, right);
+    max_right = std::max(max_right, right);
+    if (left + right > motif_key_bases) {
+      overflow[sequence] = value;
+      return;
+    }
+    uint64_t key = 1;
+    for (char c : sequence) {
+      if (c != '$') {
+        key = key << 2 | motif_char_code(c);
+      }
+    }
+    if (two_sided) {
+      key = two_sided_key(key, left);
+    }
+    for (uint64_t slot = hash(key);; slot = (slot + 1) & mask) {
+      if (keys[slot] == 0 || keys[slot] == key) {
+        keys[slot] = key;
+        values[slot] = value;
+        return;
+      }
+    }
+  }
+};
+
+#endif
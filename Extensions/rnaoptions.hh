@@ -135,6 +135,7 @@ class Opts {
     const char* probing_normalization;
     int motifs;
     int reversed;
+    const char* motif_catalogue;
 #ifdef CHECKPOINTING_INTEGRATED
     size_t checkpoint_interval;  // default interval: 3600s (1h)
     boost::filesystem::path  checkpoint_out_path;  // default path: cwd
@@ -180,6 +181,7 @@ class Opts {
             probing_normalization("centroid"),
             motifs(1),
             reversed(1),
+            motif_catalogue("\0"),
     #ifdef CHECKPOINTING_INTEGRATED
             checkpoint_interval(DEFAULT_CHECKPOINT_INTERVAL),
             checkpoint_out_path(boost::filesystem::current_path()),
@@ -317,9 +319,12 @@ class Opts {
         << "for dot plots, aka. outside computation." << std::endl
         << "   0 = consensus, 1 = most informative sequence" << std::endl
         << std::endl
-        << "-Q <1,2,3> Select motif source: 1 = BGSU, 2 = RFAM, 3 = Both" << std::endl
-        << std::endl
-        << "-b <1,2,3> Select motif direction : 1 = 5' -> 3', 2 = 3' -> 5', 3  = Both" << std::endl
+        << "-Q <1,2,3> Select motif source: 1 = BGSU, 2 = RFAM, 3 = Both"
+        << std::endl << std::endl
+        << "-b <1,2,3> Select motif direction : 1 = 5' -> 3', "
+        << "2 = 3' -> 5', 3  = Both" << std::endl << std::endl
+        << "-X <file> Load motif sequences from a motif catalogue file "
+        << "instead of the compiled in motif tables" << std::endl
         << std::endl
         << "-h, --help Print this help." << std::endl << std::endl
         << " (-[drk] [0-9]+)*" << std::endl << std::endl
@@ -414,7 +419,7 @@ class Opts {
          * (centroid, RNAstructure, logplain, asProbabilities)
          */
         "S:A:B:M:N:"
-        "hd:r:k:p:I:KO:Q:b:", long_opts, nullptr)) != -1) {
+        "hd:r:k:p:I:KO:Q:b:X:", long_opts, nullptr)) != -1) {
       switch (o) {
       case 'f':
         {
@@ -541,6 +546,9 @@ class Opts {
       case 'b':
         reversed = std::atoi(optarg);
         break;
+      case 'X':
+        motif_catalogue = optarg;
+        break;
       case 'a':
         consensusType = std::atoi(optarg);
         break;
@@ -672,6 +680,15 @@ class Opts {
     if (reversed < 1 || reversed > 3) {
       throw OptException("Choose reverse mode between 1 and 3");
     }
+    if (strcmp(motif_catalogue, "\0") != 0) {
+      struct stat buffer;
+      if (stat(motif_catalogue, &buffer) != 0) {
+        std::string message = "Motif catalogue file (-X '";
+        message.append(motif_catalogue);
+        message.append("') does not exist!");
+        throw OptException(message);
+      }
+    }
     if (strcmp(dotPlotFilename, "\0") == 0) {
       dotPlotFilename = "./dotPlot.ps";
     }
@@ -20,7 +20,7 @@ use foldGrammars::Utils;
 my $sedBinary = Settings::getBinary('sed');
 
 my ($infile, $mode, $grammar, $algebraproduct) = @ARGV;
-die "usage: perl $0 <out.mf> <mode> [grammar] [algebra product]\n  available modes:\n    0 = default\n    1 = read second argument as structure for RNAeval approach\n    2 = for MEA computation\n[grammar] will be tested to contain 'macrostate' and [algebra product] will be screened for the use of 'MFE'/'pfunc' algebras. If so, the compiled binary shall raise a warning about violated energy parameter asumptions." if (@ARGV < 2) or (@ARGV > 4);
+die "usage: perl $0 <out.mf> <mode> [grammar] [algebra product]\n  available modes:\n    0 = default\n    1 = read second argument as structure for RNAeval approach\n    2 = for MEA computation\n    3 = batch mode, main reads one sequence per line from stdin (Extensions/batch_main.cc)\n[grammar] will be tested to contain 'macrostate' and [algebra product] will be screened for the use of 'MFE'/'pfunc' algebras. If so, the compiled binary shall raise a warning about violated energy parameter asumptions." if (@ARGV < 2) or (@ARGV > 4);
 
 my $content = "";
 my $warn_macrostate = 0;
@@ -36,6 +36,7 @@ open (IN, $infile) || die "can't read file '$infile': $!";
 			$line = <IN>; #: '#include "XXX.hh"' > $@
 			$content .= $line;
 			$line = <IN>; #: cat $(RTLIB)/generic_main.cc >> out_main.cc
+			$line =~ s|\$\(RTLIB\)/generic_main.cc|Extensions/batch_main.cc| if ($mode == 3);
 			$content .= $line;
 			if ($warn_macrostate) {
 				$content .= "\t".$sedBinary.' -i \'s|opts.parse(argc, argv);|opts.parse(argc, argv); test_macrostate_mme_assumption();|\' '.$1.'_main.cc'."\n";				
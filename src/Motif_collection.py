@@ -1,11 +1,21 @@
 # A simplified and class based approach to motif collection, hopefully making it less of a mess.
 # New fix for duplicate sequences: They will be assigned to the motif they were found with first (order in motifs.json) but with a lower case letter to indicate that they might be something else aswell.
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import catalogue
 import json
+import logging
 import os.path
+import random
 import re
 import requests
-from time import sleep
+import requests.adapters
+import requests.structures
+import tempfile
+import threading
+import zipfile
+from time import sleep, time
+from typing import Optional
 from Bio import AlignIO
 from io import StringIO
 from logging import Logger
@@ -13,8 +23,195 @@ import sys
 from pathlib import Path
 
 
+# HTTP client for the motif update. One pooled session is shared by a bounded number of threads, so all BGSU loop annotations and Rfam
+# alignments of an update are fetched concurrently and reuse their connections. Failed requests (connection errors, 429 and 5xx) are retried
+# with exponential backoff and jitter (or the Retry-After header), up to attempts per request. All requests share a retry budget: it starts
+# at retry_budget retries and every new request adds retry_ratio retries to it, so a flaky server gets retried while an unreachable server
+# fails the update quickly instead of being retried forever. Responses are kept per URL, every URL is only fetched once.
+# The base URLs can be overridden (or set through RNALOOPS_BGSU_URL and RNALOOPS_RFAM_URL) to run the update against a local server.
+class ApiClient:
+    bgsu_default = "http://rna.bgsu.edu"
+    rfam_default = "https://rfam.org"
+
+    def __init__(
+        self,
+        logger: Optional[Logger] = None,
+        workers: int = 16,
+        attempts: int = 6,
+        retry_budget: int = 20,
+        retry_ratio: float = 0.2,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        timeout: float = 60.0,
+        bgsu_url: Optional[str] = None,
+        rfam_url: Optional[str] = None,
+    ):
+        self.log = logger or logging.getLogger(__name__)  # type:Logger
+        self.workers = workers
+        self.attempts = attempts
+        self.retry_budget = float(retry_budget)  # retries left for all requests of this client
+        self.retry_ratio = retry_ratio  # retries added to the budget per new request
+        self.backoff = backoff  # seconds before the first retry, doubles with every further retry
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.bgsu_url = (bgsu_url or os.environ.get("RNALOOPS_BGSU_URL") or self.bgsu_default).rstrip("/")
+        self.rfam_url = (rfam_url or os.environ.get("RNALOOPS_RFAM_URL") or self.rfam_default).rstrip("/")
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.responses = {}  # type:dict[str, requests.Response]
+        self._lock = threading.Lock()
+
+    def release_call(self, loop_type: str) -> str:
+        return f"{self.bgsu_url}/rna3dhub/motifs/release/{loop_type}/current/json"
+
+    def loop_call(self, loop: str) -> str:
+        return f"{self.bgsu_url}/correspondence/pairwise_interactions_single?selection_type=loop_id&selection={loop}"
+
+    def rfam_call(self, motif: str) -> str:
+        return f"{self.rfam_url}/motif/{motif}/alignment?acc={motif}&format=stockholm&download=0"
+
+    def get(self, call: str) -> requests.Response:
+        if call not in self.responses:
+            self.responses[call] = self._fetch(call)
+        return self.responses[call]
+
+    # fetches all calls not fetched yet concurrently, returns the responses in order of calls
+    def get_many(self, calls: list[str]) -> list[requests.Response]:
+        missing = list(dict.fromkeys(call for call in calls if call not in self.responses))
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(missing))) as executor:
+                for call, response in zip(missing, executor.map(self._fetch, missing)):
+                    self.responses[call] = response
+        return [self.responses[call] for call in calls]
+
+    def _fetch(self, call: str) -> requests.Response:
+        with self._lock:
+            self.retry_budget += self.retry_ratio
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(call, timeout=self.timeout)
+                if response.status_code == 200:
+                    return response
+                reason = f"status {response.status_code}"
+                retry_after = response.headers.get("Retry-After", "")
+                if response.status_code != 429 and response.status_code < 500:
+                    raise ConnectionError(f"Error during API request {call}, request return:{response.status_code}")
+            except requests.RequestException as error:
+                reason = type(error).__name__
+                retry_after = ""
+            attempt += 1
+            if attempt >= self.attempts or not self._take_retry():
+                raise ConnectionError(f"Giving up on API request {call} after {attempt} attempts, last error: {reason}")
+            delay = float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** (attempt - 1)
+            delay = min(delay, self.max_backoff) * random.uniform(0.5, 1.0)
+            self.log.debug(f"API request {call} failed ({reason}), retrying in {delay:.2f}s.")
+            sleep(delay)
+
+    def _take_retry(self) -> bool:
+        with self._lock:
+            if self.retry_budget < 1:
+                return False
+            self.retry_budget -= 1
+            return True
+
+    # snapshot key of a call, independent of the base URL it was fetched from
+    def snapshot_key(self, call: str) -> str:
+        for name, base in (("bgsu", self.bgsu_url), ("rfam", self.rfam_url)):
+            if call.startswith(base):
+                return name + call[len(base) :]
+        return call
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}: {self.bgsu_url}, {self.rfam_url}, {len(self.responses)} responses, {self.retry_budget:.1f} retries left"
+
+
+# Offline snapshots: every response fetched during an update is stored in a zip archive with a manifest.json, that maps the snapshot key of
+# each call (see ApiClient.snapshot_key) to the stored body and headers. Archives are versioned by snapshot format and BGSU release.
+# ReplayClient answers all calls of an update from such an archive, so the motif catalogue can be rebuilt without network access.
+SNAPSHOT_FORMAT = 1
+
+
+# release version of a release json response, e.g. HL_3.92.json
+def release_version(response: requests.Response) -> str:
+    return response.headers["Content-disposition"].split("=")[1]
+
+
+# writes the archive atomically, a directory as path stores it as [release].zip inside of it
+def save_snapshot(client: ApiClient, path: str) -> str:
+    release = release_version(client.get(client.release_call("hl")))
+    if os.path.isdir(path):
+        path = os.path.join(path, f"{os.path.splitext(release)[0]}.zip")
+    entries = {}  # type:dict[str, dict]
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".zip")
+    os.close(fd)
+    with zipfile.ZipFile(temporary, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for i, (call, response) in enumerate(sorted(client.responses.items())):
+            name = f"responses/{i:06d}"
+            archive.writestr(name, response.content)
+            entries[client.snapshot_key(call)] = {"file": name, "headers": dict(response.headers)}
+        manifest = {"format": SNAPSHOT_FORMAT, "release": release, "created": time(), "responses": entries}
+        archive.writestr("manifest.json", json.dumps(manifest, indent=1))
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temporary, 0o666 & ~umask)  # mkstemp files are private
+    os.replace(temporary, path)
+    return path
+
+
+def read_manifest(archive: zipfile.ZipFile) -> dict:
+    manifest = json.loads(archive.read("manifest.json"))
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(
+            f"Snapshot {archive.filename} has format {manifest.get('format')}, this version of RNALoops reads format {SNAPSHOT_FORMAT}."
+        )
+    return manifest
+
+
+def snapshot_release(path: str) -> str:
+    with zipfile.ZipFile(path) as archive:
+        return read_manifest(archive)["release"]
+
+
+class ReplayClient(ApiClient):
+    def __init__(self, path: str, logger: Optional[Logger] = None):
+        super().__init__(logger, workers=1, attempts=1)
+        self.path = path
+        self.archive = zipfile.ZipFile(path)
+        self.manifest = read_manifest(self.archive)
+
+    def _fetch(self, call: str) -> requests.Response:
+        entry = self.manifest["responses"].get(self.snapshot_key(call))
+        if entry is None:
+            raise ConnectionError(f"{self.snapshot_key(call)} is not part of snapshot {self.path}")
+        response = requests.Response()
+        response.status_code = 200
+        response.url = call
+        response._content = self.archive.read(entry["file"])
+        response.headers = requests.structures.CaseInsensitiveDict(entry["headers"])
+        return response
+
+    def close(self) -> None:
+        super().close()
+        self.archive.close()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}: {self.path}, release {self.manifest['release']}, {len(self.manifest['responses'])} responses"
+
+
 class Motif:
-    def __init__(self, motif_json: dict, bgsu_json: list, main_process_logger: Logger):
+    def __init__(
+        self,
+        motif_json: dict,
+        bgsu_index: dict,
+        main_process_logger: Logger,
+        client: Optional[ApiClient] = None,
+    ):
         self.name = motif_json["motif_name"]  # type:str
         self.abbreviation = motif_json["abbreviation"]  # type:str
         self.instances = motif_json["instances"]  # type:list[str]
@@ -33,9 +230,10 @@ class Motif:
             },
         )
         self.log = main_process_logger
+        self.client = client or ApiClient(main_process_logger)  # type:ApiClient
 
         if len(self.instances):
-            self.get_instances(bgsu_json)
+            self.get_instances(bgsu_index)
             for instance in self.instances:
                 self.sequence_dict["bgsu_sequences"].extend(instance.get_sequences())
             self.sequence_dict["bgsu_reverse"] = self.reverse_sequences(
@@ -56,6 +254,11 @@ class Motif:
     def get_rfam_sequences(self):
         pass
 
+    # release entries of this motifs instances in release order, looked up in the shared index of the release (see index_release)
+    def release_entries(self, bgsu_index: dict[str, list[tuple[int, dict]]]) -> list[dict]:
+        hits = [hit for ID in set(self.instances) for hit in bgsu_index.get(ID, [])]
+        return [entry for _, entry in sorted(hits, key=lambda hit: hit[0])]
+
     def reverse_sequences(self, seqlist: list[str]) -> list[str]:
         rev = []  # type:list[str]
         for sequence in seqlist:
@@ -82,23 +285,24 @@ class Motif:
 
 class Hairpin(Motif):
 
-    def __init__(self, motif_json: list, bgsu_json: list, main_proc_log: Logger):
-        super().__init__(motif_json, bgsu_json, main_proc_log)
+    def __init__(
+        self, motif_json: list, bgsu_index: dict, main_proc_log: Logger, client: Optional[ApiClient] = None
+    ):
+        super().__init__(motif_json, bgsu_index, main_proc_log, client)
 
-    def get_instances(self, bgsu: list):
+    def get_instances(self, bgsu_index: dict):
         alignments = []
-        for i in range(len(bgsu)):
-            ID = re.split("[.]", bgsu[i]["motif_id"])[0]
-            if ID in self.instances:
-                alignments.append(
-                    Instance(
-                        "hairpin",
-                        ID,
-                        bgsu[i]["alignment"],
-                        int(bgsu[i]["num_nucleotides"]),
-                        self.log,
-                    )
+        for entry in self.release_entries(bgsu_index):
+            alignments.append(
+                Instance(
+                    "hairpin",
+                    instance_id(entry),
+                    entry["alignment"],
+                    int(entry["num_nucleotides"]),
+                    self.log,
+                    client=self.client,
                 )
+            )
         self.instances = alignments
 
     def get_rfam_sequences(self):
@@ -109,27 +313,15 @@ class Hairpin(Motif):
     def make_rfam_api_calls(self):
         calls = []  # type:list[str]
         for entry in self.rfam_ids:
-            call = "https://rfam.org/motif/{mot}/alignment?acc={mot}&format=stockholm&download=0".format(
-                mot=entry
-            )
-            calls.append(call)
+            calls.append(self.client.rfam_call(entry))
         return calls
 
     def get_rfam_alignments(self):
-        for call in self.rfam_api_calls:
-            answer = requests.get(call)
-            if answer.status_code == 200:
-                self.rfam_api_calls.remove(call)
-                decoded = answer.content.decode()
-                Alignment = list(AlignIO.parse(StringIO(decoded), format="stockholm"))[0]
-                return Alignment  # since all the hairpins only have one single RMFAM ID, this works. If
-                # I ever add this to internal loops I'll have to return a list of alignments
-            else:
-                raise ConnectionError(
-                    "Error during API request for {mot}, request return:{code}".format(
-                        mot=self.name, code=answer.status_code
-                    )
-                )
+        for answer in self.client.get_many(self.rfam_api_calls):
+            decoded = answer.content.decode()
+            Alignment = list(AlignIO.parse(StringIO(decoded), format="stockholm"))[0]
+            return Alignment  # since all the hairpins only have one single RMFAM ID, this works. If
+            # I ever add this to internal loops I'll have to return a list of alignments
 
     def extract_rmfam_sequences(self):
         sequences = []
@@ -148,39 +340,41 @@ class Hairpin(Motif):
 
 class Internal(Motif):
 
-    def __init__(self, motif_json: list, bgsu_json: list, main_proc_log: Logger):
-        super().__init__(motif_json, bgsu_json, main_proc_log)
+    def __init__(
+        self,
+        motif_json: list,
+        bgsu_index: dict,
+        main_proc_log: Logger,
+        client: Optional[ApiClient] = None,
+        rfam_internals: Optional[dict[str, list[str]]] = None,
+    ):
+        # set before Motif.__init__, which already calls get_rfam_sequences
+        self.rfam_internals = rfam_internals  # type:Optional[dict[str, list[str]]]
+        super().__init__(motif_json, bgsu_index, main_proc_log, client)
 
-    def get_instances(self, bgsu: list):
+    def get_instances(self, bgsu_index: dict):
         alignments = []
-        for i in range(len(bgsu)):
-            ID = re.split("[.]", bgsu[i]["motif_id"])[0]
-            if ID in self.instances:
-                alignments.append(
-                    Instance(
-                        "internal",
-                        ID,
-                        bgsu[i]["alignment"],
-                        int(bgsu[i]["num_nucleotides"]),
-                        self.log,
-                        int(bgsu[i]["chainbreak"]),
-                    )
+        for entry in self.release_entries(bgsu_index):
+            alignments.append(
+                Instance(
+                    "internal",
+                    instance_id(entry),
+                    entry["alignment"],
+                    int(entry["num_nucleotides"]),
+                    self.log,
+                    int(entry["chainbreak"]),
+                    self.client,
                 )
+            )
         self.instances = alignments
 
     # Since I went through the effort of writing down every rfam internal sequence in that file, this is where they come from.
     def get_rfam_sequences(
         self,
     ):
-        rfam_internals_path = os.path.join(
-            os.path.dirname(os.path.realpath(__file__)), "data", "rfam_internals_fw.csv"
-        )
-        with open(rfam_internals_path, "r") as file:
-            rows = file.readlines()
-        split_rows = [x.split(",") for x in rows]
-        self.sequence_dict["rfam_sequences"].extend(
-            x[0] for x in split_rows if x[1].strip() == self.abbreviation
-        )
+        if self.rfam_internals is None:
+            self.rfam_internals = load_rfam_internals()
+        self.sequence_dict["rfam_sequences"].extend(self.rfam_internals.get(self.abbreviation, []))
 
     def sort_sequences(self):
         keys = list(self.sequence_dict.keys())
@@ -192,14 +386,23 @@ class Internal(Motif):
 
 
 class Instance:
-    def __init__(self, looptype, id: str, alignments: dict, len: int, logger, chainbreak: int = 0):
+    def __init__(
+        self,
+        looptype,
+        id: str,
+        alignments: dict,
+        len: int,
+        logger,
+        chainbreak: int = 0,
+        client: Optional[ApiClient] = None,
+    ):
         self.loop_type = looptype
         self.id = id
         self.alignments = alignments
         self.length = len
         self.log = logger  # type:Logger
         self.chainbreak = chainbreak  # chainbreak from the .json files, does not necessarily apply to api sequences
-        self.api_call = "http://rna.bgsu.edu/correspondence/pairwise_interactions_single?selection_type=loop_id&selection="  # full api call that every instance needs
+        self.client = client or ApiClient(logger)  # type:ApiClient
 
     # Extra function, could easily put this into __init__ but to make the algorithm more readable by calling 'get sequences' on all instances
     def get_sequences(
@@ -208,22 +411,8 @@ class Instance:
         return self.get_sequences_json() + self.get_sequences_api(self.api_requests())
 
     def api_requests(self) -> list[list[str]]:
-        api_requests = []
-        api_responses = []
-        for loop in self.alignments.keys():
-            request = self.api_call + loop
-            api_requests.append(request)
-        while len(api_requests):
-            for call in api_requests:
-                response = requests.get(call)
-                if response.status_code == 200:
-                    api_requests.remove(call)
-                    decoded = response.content.decode()
-                    split = decoded.split()
-                    api_responses.append(split)
-                else:
-                    sleep(0.5)
-        return api_responses
+        api_requests = [self.client.loop_call(loop) for loop in self.alignments.keys()]
+        return [response.content.decode().split() for response in self.client.get_many(api_requests)]
 
     # returns list of sequences of all Loops in this instance, taken from the .json
     def get_sequences_json(
@@ -299,6 +488,31 @@ class Instance:
         return element
 
 
+# motif ID without the release version, e.g. HL_37824.7 -> HL_37824
+def instance_id(bgsu_entry: dict) -> str:
+    return re.split("[.]", bgsu_entry["motif_id"])[0]
+
+
+# motif ID -> (release position, entry) of all entries of a release json, built once per release and shared by all motifs
+def index_release(bgsu_json: list) -> dict[str, list[tuple[int, dict]]]:
+    index = defaultdict(list)  # type:dict[str, list[tuple[int, dict]]]
+    for position, entry in enumerate(bgsu_json):
+        index[instance_id(entry)].append((position, entry))
+    return index
+
+
+# sequence,abbreviation rows of rfam_internals_fw.csv indexed by abbreviation, in file order
+def load_rfam_internals(path: Optional[str] = None) -> dict[str, list[str]]:
+    path = path or os.path.join(os.path.dirname(os.path.realpath(__file__)), "data", "rfam_internals_fw.csv")
+    rfam_internals = defaultdict(list)  # type:dict[str, list[str]]
+    with open(path, "r") as file:
+        for row in file:
+            split_row = row.split(",")
+            if len(split_row) > 1:
+                rfam_internals[split_row[1].strip()].append(split_row[0])
+    return rfam_internals
+
+
 # load curated motifs.json file
 def load_data_json(file_name: str, RNALoops_location: str) -> list:
     local_file = os.path.join(RNALoops_location, "src", "data", file_name)
@@ -307,36 +521,77 @@ def load_data_json(file_name: str, RNALoops_location: str) -> list:
     return motifs_json
 
 
-def get_api_response(call: str, attempts: int = 6) -> requests.Response:
-    i = 0
-    while i < attempts:
-        response = requests.get(call)
-        if response.status_code == 200:
-            return response
-        else:
-            i += 1
-    raise ConnectionError(" Could not establish connection to BGSU API.")
-
-
-def load_jsons(main_proc_logger: Logger, RNALoops_location: str) -> list[Hairpin | Internal]:
-    hl_api = get_api_response("http://rna.bgsu.edu/rna3dhub/motifs/release/hl/current/json")
-    il_api = get_api_response("http://rna.bgsu.edu/rna3dhub/motifs/release/il/current/json")
+def get_api_response(call: str, attempts: int = 6, timeout: float = 60.0) -> requests.Response:
+    client = ApiClient(attempts=attempts, timeout=timeout)
+    try:
+        return client.get(call)
+    except ConnectionError as error:
+        raise ConnectionError(f" Could not establish connection to BGSU API. {error}")
+    finally:
+        client.close()
+
+
+def load_jsons(
+    main_proc_logger: Logger, RNALoops_location: str, client: Optional[ApiClient] = None
+) -> list[Hairpin | Internal]:
+    client = client or ApiClient(main_proc_logger)
+    hl_api, il_api = client.get_many([client.release_call("hl"), client.release_call("il")])
+    hl_index = index_release(json.loads(hl_api.content.decode()))
+    il_index = index_release(json.loads(il_api.content.decode()))
+    rfam_internals = load_rfam_internals()
     motif_json = load_data_json("motifs.json", RNALoops_location)
+    prefetch(client, motif_json, hl_index, il_index)
+    main_proc_logger.debug(f"Fetched {len(client.responses)} API responses.")
     motifs = []  # type:list['Hairpin|Internal']
     for motif in motif_json:
         if motif["loop_type"] == "hairpin":
-            class_motif = Hairpin(motif, json.loads(hl_api.content.decode()), main_proc_logger)
+            class_motif = Hairpin(motif, hl_index, main_proc_logger, client)
             motifs.append(class_motif)
         elif motif["loop_type"] == "internal":
-            class_motif = Internal(motif, json.loads(il_api.content.decode()), main_proc_logger)
+            class_motif = Internal(motif, il_index, main_proc_logger, client, rfam_internals)
             motifs.append(class_motif)
         else:
             pass
     return motifs
 
 
-def update(main_process_logger: Logger, deletion_bool: bool, RNALoops_location: str) -> None:
-    motifs = load_jsons(main_process_logger, RNALoops_location)  # type:list['Hairpin|Internal']
+# Fetches the loop annotations of all motif instances and the Rfam alignments of all hairpins at once, the Motif objects then only read
+# the already fetched responses from the client.
+def prefetch(client: ApiClient, motif_json: list, hl_index: dict, il_index: dict) -> None:
+    calls = []  # type:list[str]
+    for loop_type, bgsu_index in (("hairpin", hl_index), ("internal", il_index)):
+        wanted = {instance for motif in motif_json if motif["loop_type"] == loop_type for instance in motif["instances"]}
+        hits = sorted(hit for ID in wanted for hit in bgsu_index.get(ID, []))
+        calls.extend(client.loop_call(loop) for _, entry in hits for loop in entry["alignment"].keys())
+    calls.extend(
+        client.rfam_call(rfam_id) for motif in motif_json if motif["loop_type"] == "hairpin" for rfam_id in motif["rfam_id"]
+    )
+    client.get_many(calls)
+
+
+# Writes the motif catalogue file the algorithms load at runtime (Extensions/mot_catalogue.bin by default), header additionally regenerates the
+# compiled in tables of Extensions/mot_header.hh. record stores all responses of this update as snapshot archive, replay rebuilds the
+# catalogue from such an archive instead of the APIs.
+def update(
+    main_process_logger: Logger,
+    deletion_bool: bool,
+    RNALoops_location: str,
+    client: Optional[ApiClient] = None,
+    record: Optional[str] = None,
+    replay: Optional[str] = None,
+    catalogue_path: Optional[str] = None,
+    header: bool = False,
+) -> None:
+    if replay:
+        client = ReplayClient(replay, main_process_logger)
+    client = client or ApiClient(main_process_logger)
+    try:
+        motifs = load_jsons(main_process_logger, RNALoops_location, client)  # type:list['Hairpin|Internal']
+        release = release_version(client.get(client.release_call("hl")))
+        if record:
+            main_process_logger.info(f"Recorded motif update snapshot {save_snapshot(client, record)}.")
+    finally:
+        client.close()
     main_process_logger.debug("Loaded jsons")
     if deletion_bool:
         for mot in motifs:
@@ -345,7 +600,12 @@ def update(main_process_logger: Logger, deletion_bool: bool, RNALoops_location:
             mot.remove_sequence("GAAA", "UNCG")
             mot.remove_sequence("GUGA", "UNCG")
     seq_abbreviation_dict = dupe_check(motifs, main_process_logger)
-    create_hexdumbs(motifs, seq_abbreviation_dict, RNALoops_location)
+    tables = motif_tables(motifs, seq_abbreviation_dict)
+    catalogue_path = catalogue_path or catalogue.default_path(RNALoops_location)
+    catalogue.write(tables, catalogue_path, release)
+    main_process_logger.info(f"Wrote motif catalogue {catalogue_path} for {release}.")
+    if header:
+        create_hexdumbs(tables, RNALoops_location)
 
 
 # reworked dupe check that not only checks for duplicate sequences but also creates a dictionary with sequence:abbreviations pairs (for managing duplicates).
@@ -380,9 +640,8 @@ def dupe_check(motif_list: list[Hairpin | Internal], logger: Logger) -> dict[str
     return seen
 
 
-def create_hexdumbs(
-    motif_list: list[Hairpin | Internal], abbreviations: dict, RNALoops_folder_path: str
-) -> None:
+# the 27 motif tables in header order (hairpin, internal, bulge per key), name -> "SEQUENCE,ABBREVIATION" lines
+def motif_tables(motif_list: list[Hairpin | Internal], abbreviations: dict) -> dict[str, str]:
     keys = [
         "bgsu_fw",
         "bgsu_rv",
@@ -406,11 +665,18 @@ def create_hexdumbs(
             mot.sort_sequences()
             sort_seq_dictionaries(mot, isequence_dict, "i")
             sort_seq_dictionaries(mot, bsequence_dict, "b")
+    tables = {}  # type:dict[str, str]
+    for key in keys:
+        tables["h" + key] = "\n".join(hsequence_dict[key])
+        tables["i" + key] = "\n".join(isequence_dict[key])
+        tables["b" + key] = "\n".join(bsequence_dict[key])
+    return tables
+
+
+def create_hexdumbs(tables: dict[str, str], RNALoops_folder_path: str) -> None:
     with open(os.path.join(RNALoops_folder_path, "Extensions", "mot_header.hh"), "w") as file:
-        for key in keys:
-            file.write(sequences2header(hsequence_dict[key], "h" + key))
-            file.write(sequences2header(isequence_dict[key], "i" + key))
-            file.write(sequences2header(bsequence_dict[key], "b" + key))
+        for name, table in tables.items():
+            file.write(sequences2header(table, name))
 
 
 # modifies the dictionary inplace, so no return needed, adds each motifs sequences to the 9 combinations
@@ -497,8 +763,7 @@ def flatten(xss: list[list[str]]) -> list:
     return [x for xs in xss for x in xs]
 
 
-def sequences2header(seq_set: list, name: str) -> str:
-    joined_seq_set = "\n".join(seq_set)
+def sequences2header(joined_seq_set: str, name: str) -> str:
     out = []
     out.append("static char {var_name}[] = {{".format(var_name=name))
     data = [joined_seq_set[i : i + 12] for i in range(0, len(joined_seq_set), 12)]
@@ -521,4 +786,4 @@ if __name__ == "__main__":
             remove = True
     except:
         remove = False
-    update(log, remove, Path(__file__).resolve().parents[1])
+    update(log, remove, Path(__file__).resolve().parents[1], header=True)
@@ -1,22 +1,47 @@
 import multiprocessing
 import argparse
 import multiprocessing.connection
+import multiprocessing.util
 import subprocess
+import shlex
 import configparser
 import os
+import queue
 from Bio import SeqIO
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
 import gzip
+import bz2
+import lzma
+import zipfile
 from typing import Generator
+from typing import Iterable
 from typing import Optional
 import sys
 import logging
 import Motif_collection as mc
-import glob
+import itertools
+import tempfile
+import threading
+import io
 import args
 import results
+import scheduling
+import cache
+import dedup
+import ordering
+import sinks
+import checkpoint
+import sharding
+import version_check
+import builds
+import prebuild
+import catalogue
+import profiling
+import progress
 from pathlib import Path
+from time import perf_counter
+from time import sleep
 
 
 class Constants:
@@ -28,13 +53,13 @@ class Constants:
     def get_RNALoops_path():
         return str(Path(__file__).resolve().parents[1])
 
+    @staticmethod
+    def get_cache_path():
+        return os.path.join(str(Path(__file__).resolve().parents[1]), "cache")
+
     @staticmethod
     def get_current_motifs():
-        return (
-            mc.get_api_response("http://rna.bgsu.edu/rna3dhub/motifs/release/hl/current/json")
-            .headers["Content-disposition"]
-            .split("=")[1]
-        )
+        return version_check.fetch()
 
 
 class Process:
@@ -59,6 +84,36 @@ class Process:
             cmd_args.no_update,
             cmd_args.force_update,
             cmd_args.remove,
+            batch=cmd_args.batch,
+            engine=cmd_args.engine,
+            chunksize=cmd_args.chunksize,
+            schedule=cmd_args.schedule,
+            lookahead=cmd_args.lookahead,
+            cache_path=cmd_args.cache,
+            cache_size=cmd_args.cache_size,
+            dedup=cmd_args.dedup,
+            dedup_window=cmd_args.dedup_window,
+            metrics=cmd_args.metrics,
+            input_format=cmd_args.input_format,
+            ordered=cmd_args.ordered,
+            reorder_buffer=cmd_args.reorder_buffer,
+            output=cmd_args.output,
+            output_format=cmd_args.output_format,
+            output_batch=cmd_args.output_batch,
+            checkpoint=cmd_args.checkpoint,
+            resume=cmd_args.resume,
+            shard=cmd_args.shard,
+            shard_by=cmd_args.shard_by,
+            snapshot_record=cmd_args.snapshot_record,
+            snapshot_replay=cmd_args.snapshot_replay,
+            version_ttl=cmd_args.version_ttl,
+            version_background=cmd_args.version_background,
+            build_cache=cmd_args.build_cache,
+            build_keep=cmd_args.build_keep,
+            motif_catalogue=cmd_args.motif_catalogue,
+            profile=cmd_args.profile,
+            progress_interval=cmd_args.progress_interval,
+            prometheus=cmd_args.prometheus,
         )
 
     @classmethod
@@ -87,6 +142,36 @@ class Process:
             config.getboolean("PARAMETERS", "custom_algorithm_bool"),
             config["PARAMETERS"]["custom_algorithm_call"],
             config["PARAMETERS"]["custom_algorithm_comp"],
+            batch=config.getboolean("PARAMETERS", "batch"),
+            engine=config["PARAMETERS"]["engine"],
+            chunksize=config.getint("PARAMETERS", "chunksize"),
+            schedule=config["PARAMETERS"]["schedule"],
+            lookahead=config.getint("PARAMETERS", "lookahead"),
+            cache_path=config["PARAMETERS"]["cache"],
+            cache_size=config.getint("PARAMETERS", "cache_size"),
+            dedup=config["PARAMETERS"]["dedup"],
+            dedup_window=config.getint("PARAMETERS", "dedup_window"),
+            metrics=config["PARAMETERS"]["metrics"],
+            input_format=config["PARAMETERS"]["input_format"],
+            ordered=config["PARAMETERS"]["ordered"],
+            reorder_buffer=config.getint("PARAMETERS", "reorder_buffer"),
+            output=config["PARAMETERS"]["output"],
+            output_format=config["PARAMETERS"]["output_format"],
+            output_batch=config.getint("PARAMETERS", "output_batch"),
+            checkpoint=config.getboolean("PARAMETERS", "checkpoint"),
+            resume=config.getboolean("PARAMETERS", "resume"),
+            shard=config["PARAMETERS"]["shard"],
+            shard_by=config["PARAMETERS"]["shard_by"],
+            snapshot_record=config["PARAMETERS"]["snapshot_record"],
+            snapshot_replay=config["PARAMETERS"]["snapshot_replay"],
+            version_ttl=config.getfloat("PARAMETERS", "version_ttl"),
+            version_background=config.getboolean("PARAMETERS", "version_background"),
+            build_cache=config["PARAMETERS"]["build_cache"],
+            build_keep=config.getint("PARAMETERS", "build_keep"),
+            motif_catalogue=config["PARAMETERS"]["motif_catalogue"],
+            profile=config["PARAMETERS"]["profile"],
+            progress_interval=config.getfloat("PARAMETERS", "progress"),
+            prometheus=config["PARAMETERS"]["prometheus"],
         )
 
     # init with it's own set of default values so Process can be imported and used in another program.
@@ -113,6 +198,36 @@ class Process:
         custom_algorithm_bool: Optional[bool] = False,
         custom_algorithm_call: Optional[str] = None,
         custom_algorithm_comp: Optional[str] = None,
+        batch: bool = False,
+        engine: str = "queue",
+        chunksize: int = 16,
+        schedule: str = "fifo",
+        lookahead: int = 256,
+        cache_path: Optional[str] = None,
+        cache_size: int = 1024,
+        dedup: str = "off",
+        dedup_window: int = 10000,
+        metrics: Optional[str] = None,
+        input_format: Optional[str] = None,
+        ordered: str = "off",
+        reorder_buffer: int = 1024,
+        output: Optional[str] = None,
+        output_format: str = "tsv",
+        output_batch: int = 4096,
+        checkpoint: bool = False,
+        resume: bool = False,
+        shard: Optional[str] = None,
+        shard_by: str = "ordinal",
+        snapshot_record: Optional[str] = None,
+        snapshot_replay: Optional[str] = None,
+        version_ttl: float = 86400,
+        version_background: bool = False,
+        build_cache: Optional[str] = None,
+        build_keep: int = 64,
+        motif_catalogue: Optional[str] = None,
+        profile: Optional[str] = None,
+        progress_interval: float = 0,
+        prometheus: Optional[str] = None,
     ):
 
         # Set process parameters
@@ -137,25 +252,76 @@ class Process:
         self.custom_algorithm_bool = custom_algorithm_bool  # type:Optional[bool]
         self.custom_algorithm_call = custom_algorithm_call  # type:Optional[str]
         self.custom_algorithm_comp = custom_algorithm_comp  # type:Optional[str]
+        self.batch = batch  # type:bool
+        self.engine = engine  # type:str
+        self.chunksize = chunksize  # type:int
+        self.schedule = schedule  # type:str
+        self.lookahead = lookahead  # type:int
+        # result cache is off for empty str or None
+        self.cache_path = cache_path  # type:Optional[str]
+        self.cache_size = cache_size  # type:int # in MB
+        self.dedup = dedup  # type:str
+        self.dedup_window = dedup_window  # type:int
+        # per record resource usage sidecar file, off for empty str or None
+        self.metrics = metrics  # type:Optional[str]
+        # input format overriding file ending detection, needed for stdin input. None or empty str detects the format from the file ending
+        self.input_format = input_format  # type:Optional[str]
+        self.ordered = ordered  # type:str
+        self.reorder_buffer = reorder_buffer  # type:int
+        # output file path, stdout for empty str, None or -
+        self.output = output  # type:Optional[str]
+        self.output_format = output_format  # type:str
+        self.output_batch = output_batch  # type:int # rows per write, row group size for parquet
+        # resume implies checkpointing, both only work for file input
+        self.checkpoint = checkpoint or resume  # type:bool
+        self.resume = resume  # type:bool
+        # i/N, off for empty str or None
+        self.shard = shard  # type:Optional[str]
+        self.shard_by = shard_by  # type:str
+        # motif update snapshot archives, off for empty str or None. Recording forces an update, replaying takes the motif version from the archive
+        self.snapshot_record = snapshot_record  # type:Optional[str]
+        self.snapshot_replay = snapshot_replay  # type:Optional[str]
+        self.version_ttl = version_ttl  # type:float # seconds the last motif version check stays valid
+        self.version_background = version_background  # type:bool
+        # compiled binary cache directory, [RNALoops]/cache/builds for empty str or None
+        self.build_cache = build_cache  # type:Optional[str]
+        self.build_keep = build_keep  # type:int
+        # motif catalogue file passed to the algorithms, Extensions/mot_catalogue.bin (if it exists) for empty str or None
+        self.motif_catalogue = motif_catalogue  # type:Optional[str]
+        # per stage profile report of file input, JSON goes to this path or to stderr for -, off for empty str or None
+        self.profile = profile  # type:Optional[str]
+        # seconds between progress lines on stderr during file input runs, 0 deactivates them
+        self.progress_interval = progress_interval  # type:float
+        # [host:]port or unix:path to serve live progress metrics in Prometheus text format on, off for empty str or None
+        self.prometheus = prometheus  # type:Optional[str]
         # Extrapolated Process parameters
         self.log = make_new_logger(self.loglevel, __name__)
+        self.file_input = self.input == "-" or os.path.isfile(self.input)  # type:bool
+        self._check_batch()
 
         self.RNALoops_folder_path = Constants.get_RNALoops_path()
+        self.builds = builds.BuildCache(
+            self.build_cache or os.path.join(Constants.get_cache_path(), "builds"), self.build_keep
+        )  # type:builds.BuildCache
 
         self.config = args.get_config(Constants.get_conf_path())
         self.local_motif_version = self.config["VERSIONS"]["hairpins"]
-        try:
-            self.current_motifs = Constants.get_current_motifs()
-        except Exception as e:
-            self.log.error(e)
-            self.log.error("Unable to get current motif version, resuming without updating.")
-            self.no_update = True
+        self.current_motifs = self.local_motif_version
+        if not self.no_update:
+            try:
+                self.current_motifs = self._current_motif_version()
+            except Exception as e:
+                self.log.error(e)
+                self.log.error("Unable to get current motif version, resuming without updating.")
+                self.no_update = True
 
         if self.algorithm[-3:] == "pfc":
             self.pfc = True
         else:
             self.pfc = False
         results.algorithm_output.set_pfc(self.pfc)
+        self._set_algorithm()
+        results.algorithm_output.set_algorithm(self.algorithm, bool(self.custom_algorithm_bool))
 
         # Double negative, if no_update is used it is set to positive failing the if not check.
         if not self.no_update:
@@ -174,9 +340,11 @@ class Process:
         else:
             self.time = False
         results.algorithm_output.set_time(self.time)
-        self._set_algorithm()
+        self.catalogue_path = self._resolve_catalogue()  # type:Optional[str]
         self.algorithm_path = self._identify_algorithm()  # type:str
         self.call_construct = self._call_constructor()  # type:str
+        self.result_cache = self._create_cache()  # type:Optional[cache.ResultCache]
+        self.input_bytes = progress.InputBytes()  # type:progress.InputBytes # position of the reader in the input file for the ETA
         self.algorithm_input = (
             self._check_input()
         )  # type: SeqIO.FastaIO.FastaIterator | SeqIO.QualityIO.FastqPhredIterator | Generator[SeqRecord, None, None] | SeqIO.SeqRecord
@@ -189,7 +357,10 @@ class Process:
         | SeqIO.QualityIO.FastqPhredIterator
         | Generator[SeqIO.SeqRecord, None, None]
     ):
-        if os.path.isfile(self.input):
+        if self.input == "-":
+            self.log.info("Input recognized as stdin stream.")
+            return self._read_input_file()
+        elif self.file_input:
             self.log.info("Input recognized as file.")
             return self._read_input_file()
         else:
@@ -201,6 +372,30 @@ class Process:
             self.algorithm = self.algorithm + "_" + self.hishape  # type:str
         if self.subopt:
             self.algorithm = self.algorithm + "_subopt"  # type:str
+        self.binary = builds.binary_name(self.algorithm, self.batch)  # type:str
+
+    # Batch mode only pays off for file inputs and needs control over the compilation call, so it gets disabled otherwise.
+    def _check_batch(self):
+        if not self.batch:
+            return
+        if not self.file_input:
+            self.log.debug("Batch mode is only used for file inputs, running single sequence normally.")
+            self.batch = False
+        elif self.custom_algorithm_bool:
+            self.log.warning("Batch mode is not available with custom algorithm calls, disabling batch mode.")
+            self.batch = False
+
+    # Snapshot release or the cached BGSU release, falls back to the local version while a background check is running
+    def _current_motif_version(self) -> str:
+        if self.snapshot_replay:
+            return mc.snapshot_release(self.snapshot_replay)
+        current = version_check.current_version(
+            Constants.get_cache_path(), self.version_ttl, self.version_background
+        )
+        if current is None:
+            self.log.info("Checking motif version in the background, using local motif sequences for this run.")
+            return self.local_motif_version
+        return current
 
     # checks Motif sequences version and updates them through Motif_collection.py. Updating is bound only to the hairpin version, since hairpins and internals always get updated at the same time
     def _version_check_and_update(
@@ -211,122 +406,206 @@ class Process:
         self.log.info("Checking Motif sequence version...")
         if self.local_motif_version == self.current_motifs:
             self.log.info(f"Motif sequences are up to date. Version {self.current_motifs}")
-            if update_bool:
+            if update_bool or self.snapshot_record:
                 self.log.warning("Force update enabled. Updating motifs, this may take a minute...")
-                mc.update(self.log, sequence_remove_bool, self.RNALoops_folder_path)
-                self.log.warning("Updating motif sequences successful, updating algorithm...")
-                self._compile_algorithm()
+                self._update_motifs(sequence_remove_bool)
+                self.log.warning("Updating motif sequences successful.")
         else:
             self.log.warning(
                 "Motif sequences are outdated with current bgsu release, updating may take a couple minutes..."
             )
-            mc.update(self.log, sequence_remove_bool, self.RNALoops_folder_path)
+            self._update_motifs(sequence_remove_bool)
             self.config.set("VERSIONS", "hairpins", self.current_motifs)
             with open(Constants.get_conf_path(), "w") as file:
                 self.config.write(file)
-            self.log.info(
-                f"Motif sequences have been updated to {self.current_motifs}. Updating algorithm..."
-            )
-            self._compile_algorithm()
+            self.log.info(f"Motif sequences have been updated to {self.current_motifs}.")
 
-    # searches for algorithm, if it doesn't find it tries to compile it and then searches again.
+    def _update_motifs(self, sequence_remove_bool: bool) -> None:
+        mc.update(
+            self.log,
+            sequence_remove_bool,
+            self.RNALoops_folder_path,
+            record=self.snapshot_record,
+            replay=self.snapshot_replay,
+        )
+
+    # Motif updates write the catalogue file instead of recompiling, None keeps the motif tables compiled into the algorithm.
+    def _resolve_catalogue(self) -> Optional[str]:
+        path = catalogue.resolve(self.motif_catalogue, self.RNALoops_folder_path)
+        if path is None:
+            self.log.debug("No motif catalogue file found, using the compiled in motif sequences.")
+            return None
+        version = catalogue.version(path)
+        if version != self.config["VERSIONS"]["hairpins"]:
+            self.log.info(f"Motif catalogue {path} is version {version}, config.ini lists {self.config['VERSIONS']['hairpins']}.")
+        self.log.debug(f"Using motif catalogue {path}, version {version}")
+        return path
+
+    # Looks the algorithm up in the build cache, on a miss it gets compiled and the binary is moved into the cache. The cache key covers the
+    # compilation flags and the motif sources in Extensions, other flags or compiled in motif tables lead to a new build instead of
+    # overwriting the old one.
     def _identify_algorithm(self) -> str:
-        alg_path = os.path.join(self.RNALoops_folder_path, self.algorithm)
-        if alg_path in glob.glob(self.RNALoops_folder_path + "/*"):
-            self.log.debug(f"Found algorithm {self.algorithm}")
-            return os.path.realpath(
-                os.path.join(self.RNALoops_folder_path, self.algorithm), strict=True
-            )
-        else:
-            pass
-        self.log.warning(f"{self.algorithm} was not found, trying to compile...")
-        Compilation = self._compile_algorithm()
-        if Compilation:
-            self.log.warning(f"Compilation of {self.algorithm} successful.")
-            if alg_path in glob.glob(self.RNALoops_folder_path + "/*"):
-                return os.path.realpath(
-                    os.path.join(self.RNALoops_folder_path, self.algorithm),
-                    strict=True,
-                )
-            else:
+        key = builds.BuildCache.build_key(
+            self.binary,
+            self._compilation_flags(),
+            builds.sources(self.RNALoops_folder_path),
+        )
+        cached = self.builds.lookup(self.binary, key)
+        if cached:
+            self.log.debug(f"Found cached build of {self.binary}: {cached}")
+            return cached
+        alg_path = os.path.join(self.RNALoops_folder_path, self.binary)
+        # a concurrent run may have compiled the same build while this one waited for the lock
+        with self.builds.lock(key):
+            cached = self.builds.lookup(self.binary, key)
+            if cached:
+                self.log.debug(f"Found build of {self.binary} compiled by another run: {cached}")
+                return cached
+            self.log.warning(f"No build of {self.binary} for the current motifs and flags was found, trying to compile...")
+            try:
+                path = self._compile_algorithm(key)
+            except RuntimeError as error:
+                self.log.debug(error)
+                # installations without gapc may ship prebuilt binaries in the RNALoops root folder
+                if os.path.isfile(alg_path):
+                    self.log.warning(
+                        f"Could not compile {self.binary}, using the existing binary in the RNALoops root folder. It may not match the current motif sequences."
+                    )
+                    # binaries from before motif catalogue files do not know -X
+                    if self.catalogue_path:
+                        self.log.warning(
+                            f"Motif catalogue {self.catalogue_path} is ignored, the binary in the RNALoops root folder uses the motif sequences compiled into it. Motif updates take effect once {self.binary} can be compiled again."
+                        )
+                    self.catalogue_path = None
+                    return os.path.realpath(alg_path, strict=True)
                 raise LookupError(
-                    "Could not find algorithm. Please check log with debug level for compilation information. Make sure your chosen algorithm is installed in the RNALoops root folder"
+                    "Could not compile specified algorithm. Please check log with debug level for compilation information. Make sure your chosen algorithm is installed in the RNALoops root folder."
                 )
-        else:
-            raise LookupError(
-                "Could not compile specified algorithm. Please check log with debug level for compilation information. Make sure your chosen alrightm is installed in the RNALoops root folder."
-            )
+        self.log.warning(f"Compilation of {self.binary} successful.")
+        return path
+
+    # everything besides the motif header that changes the compiled binary, part of the build cache key
+    def _compilation_flags(self) -> str:
+        if self.custom_algorithm_bool:
+            return f"custom {self.custom_algorithm_comp}"
+        return builds.compilation_flags(self.algorithm, self.batch)
 
     # compile algorithm function that allows for the customization of calls through editing the compilation_call string. Just add a case or edit the cases present here.
-    def _compile_algorithm(self) -> bool:
+    # Compilation runs in a private build directory (see builds.BuildCache.compile), the binary ends up in the build cache.
+    def _compile_algorithm(self, key: str) -> str:
         match self.custom_algorithm_bool:
             case True:
                 self.log.info(
                     f"Using custom algorithm compilation call: {self.custom_algorithm_comp}"
                 )
-                compilation_call = f"cd {self.RNALoops_folder_path}; {self.custom_algorithm_comp}; perl Misc/Applications/addRNAoptions.pl {self.algorithm}.mf 0; make -f {self.algorithm}.mf"
+                compilation_call = f"{self.custom_algorithm_comp}; perl Misc/Applications/addRNAoptions.pl {self.algorithm}.mf 0; make -f {self.algorithm}.mf"
             case False:
-                if self.pfc:
-                    compilation_call = f"cd {self.RNALoops_folder_path}; gapc -o {self.algorithm}.cc -t --kbest -i {self.algorithm} RNALoops.gap; perl Misc/Applications/addRNAoptions.pl {self.algorithm}.mf 0; make -f {self.algorithm}.mf"
-                elif self.subopt:
-                    compilation_call = f"cd {self.RNALoops_folder_path}; gapc -o {self.algorithm}.cc -t --kbacktrace -i {self.algorithm} RNALoops.gap; perl Misc/Applications/addRNAoptions.pl {self.algorithm}.mf 0; make -f {self.algorithm}.mf"
-                else:
-                    compilation_call = f"cd {self.RNALoops_folder_path}; gapc -o {self.algorithm}.cc -t --kbacktrace --kbest -i {self.algorithm} RNALoops.gap; perl Misc/Applications/addRNAoptions.pl {self.algorithm}.mf 0; make -f {self.algorithm}.mf"
-        compilation_info = subprocess.run(
-            compilation_call, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+                compilation_call = builds.compilation_call(self.algorithm, self.batch)
+        return self.builds.compile(
+            self.RNALoops_folder_path,
+            compilation_call,
+            self.binary,
+            key,
+            {"algorithm": self.algorithm, "flags": self._compilation_flags(), "motifs": self.config["VERSIONS"]["hairpins"]},
         )
-        self.log.debug(compilation_info.stdout.decode())
-        if compilation_info.returncode:
-            raise RuntimeError(compilation_info.stderr)
-        if not compilation_info.returncode:
-            self.log.debug("Removing temporary files...")
-            subprocess.run(
-                "cd {RNALoops}; rm {alg}.o; rm {alg}.mf; rm {alg}.hh; rm {alg}.d; rm {alg}.cc; rm {alg}_main.o; rm {alg}_main.d; rm {alg}_main.cc; rm string.d; rm string.o".format(
-                    RNALoops=self.RNALoops_folder_path, alg=self.algorithm
-                ),
-                shell=True,
-                capture_output=False,
-            )
-            return True  # return compilation was successful.
 
-    # Call construction function, if you add a new algorithm you will need to add a call construction string here for the python script to call on each sequence in your input. Remember to keep the cd {path} && {time} with path = self.algorithm_path
+    # Call construction function, if you add a new algorithm you will need to add a call construction string here for the python script to call on each sequence in your input.
+    # The call gets split with shlex and executed without a shell, resource usage for --time and --metrics is collected through os.wait4 and /proc.
     def _call_constructor(self) -> str:
+        call = f"{self.algorithm_path} {self._call_parameters()}"
+        self.log.debug(f"Algorithm call construct created as: {call}")
+        return call
+
+    # Algorithm parameters of the call construct, without binary path and time prefix.
+    def _call_parameters(self) -> str:
         match self.custom_algorithm_bool:
             case True:
-                call = f"{self.algorithm_path} {self.custom_algorithm_call} "
+                parameters = f"{self.custom_algorithm_call} "
             case False:
                 if self.subopt:
-                    call = f"{self.algorithm_path} -e {self.energy} -Q {self.motif_src} -b {self.motif_orientation} "
+                    parameters = f"-e {self.energy} -Q {self.motif_src} -b {self.motif_orientation} "
                 else:
-                    call = f"{self.algorithm_path} -k {self.kvalue} -Q {self.motif_src} -b {self.motif_orientation} "
+                    parameters = f"-k {self.kvalue} -Q {self.motif_src} -b {self.motif_orientation} "
                 if self.algorithm == "motshapeX":
-                    call = call + f" -q {self.shape} "
-        if self.time:
-            call = "time " + call
-        self.log.debug(f"Algorithm call construct created as: {call}")
-        return call
+                    parameters = parameters + f" -q {self.shape} "
+                if self.catalogue_path:
+                    parameters = parameters + f"-X {shlex.quote(self.catalogue_path)} "
+        return parameters
+
+    # Result cache keyed by algorithm and call parameters, tagged with the motif version and the motif catalogue file in use (or the
+    # compiled in mot_header.hh).
+    def _create_cache(self) -> Optional[cache.ResultCache]:
+        if not self.cache_path:
+            return None
+        catalogue_tag = cache.ResultCache.catalogue_tag(
+            self.config["VERSIONS"]["hairpins"],
+            self.catalogue_path or os.path.join(self.RNALoops_folder_path, "Extensions", "mot_header.hh"),
+        )
+        self.log.debug(f"Using result cache {self.cache_path} for motif catalogue {catalogue_tag}")
+        return cache.ResultCache(
+            self.cache_path,
+            f"{self.algorithm} {self._call_parameters()}",
+            catalogue_tag,
+            self.cache_size * 1024 * 1024,
+        )
 
     def run_process(self):
-        if os.path.isfile(self.input):
+        if self.file_input:
             self.log.info("Running predictions in Multiprocessing mode")
             MultiProcess.run(
                 self.algorithm_input,
                 self.call_construct,
                 self.separator,
                 self.workers,
+                self.batch,
+                self.engine,
+                self.chunksize,
+                self.schedule,
+                self.lookahead,
+                self.result_cache,
+                self.dedup,
+                self.dedup_window,
+                self.metrics,
+                self.ordered,
+                self.reorder_buffer,
+                self.output,
+                self.output_format,
+                self.output_batch,
+                self.checkpoint,
+                self.resume,
+                self.shard,
+                self.shard_by,
+                self.profile,
+                self.progress_interval,
+                self.prometheus,
+                self.input_bytes if self.input != "-" else None,
             )
         else:
             self.log.info("Running prediction in Single")
-            SingleProcess.run(self.algorithm_input, self.call_construct, self.separator)
+            if self.profile:
+                self.log.warning("--profile only applies to file input, profiling is skipped for single sequences.")
+            SingleProcess.run(
+                self.algorithm_input,
+                self.call_construct,
+                self.separator,
+                self.output,
+                self.output_format,
+            )
 
-    # Finds File type based on file ending
-    def _find_filetype(self) -> None:
-        if self.input.split(".")[-1] == "gz" or self.input.split(".")[-1] == "zip":
+    # Finds compression and file type based on file ending. stdin has no file ending, its compression gets detected by read_records
+    # and its file type is taken from input_format, defaulting to fasta.
+    def _find_filetype(self) -> tuple[Optional[str], str]:
+        if self.input == "-":
+            compression = None
+            file_extension = self.input_format or "fasta"
+        elif self.input.split(".")[-1] in ("gz", "zip", "bz2", "xz"):
+            compression = self.input.split(".")[-1]
             file_extension = self.input.split(".")[-2]
-            input_zipped = True
         else:
+            compression = None
             file_extension = self.input.split(".")[-1]
-            input_zipped = False
+        if self.input_format:
+            file_extension = self.input_format
 
         match file_extension:
             case "fasta" | "fas" | "fa" | "fna" | "ffn" | "faa" | "mpfa" | "frn" | "txt" | "fsa":
@@ -339,13 +618,13 @@ class Process:
                 filetype = "stockholm"
             case _:
                 self.log.critical(
-                    "Could not identify file type as fasta, fastq or stockholm. If the file is zipped make sure it is .zip or .gz"
+                    "Could not identify file type as fasta, fastq or stockholm. If the file is compressed make sure it is .gz, .zip, .bz2 or .xz"
                 )
                 raise TypeError(
-                    "Filetype was not recognized as fasta, fastq or stockholm format. Or file could not be unpacked, please ensure it is zipped with either .gz or .zip or unzipped"
+                    "Filetype was not recognized as fasta, fastq or stockholm format. Or file could not be unpacked, please ensure it is compressed with .gz, .zip, .bz2, .xz or uncompressed"
                 )
         self.log.info(f"File type recognized as {filetype}")
-        return (input_zipped, filetype)
+        return (compression, filetype)
 
     def _read_input_file(
         self,
@@ -354,12 +633,8 @@ class Process:
         | SeqIO.QualityIO.FastqPhredIterator
         | Generator[SeqIO.SeqRecord, None, None]
     ):
-        (zipped, filetype) = self._find_filetype()
-        if not zipped:
-            return SeqIO.parse(self.input, filetype)
-        else:
-            with gzip.open(self.input, "rt") as handle:
-                return SeqIO.parse(handle, filetype)
+        (compression, filetype) = self._find_filetype()
+        return read_records(self.input, compression, filetype, self.input_bytes)
 
     def _create_record(self) -> SeqIO.SeqRecord:
         rec = SeqRecord(seq=Seq(self.input), id=self.name)
@@ -373,29 +648,36 @@ class Process:
 
 
 class SingleProcess:
-    def __init__(self, input_seq_record: str, call_construct: str, separator: str) -> None:
+    def __init__(
+        self,
+        input_seq_record: str,
+        call_construct: str,
+        separator: str,
+        output: Optional[str] = None,
+        output_format: str = "tsv",
+    ) -> None:
         self.record = input_seq_record
         self.call_construct = call_construct
         self.separator = separator
+        self.output = output
+        self.output_format = output_format
 
     @classmethod
-    def run(cls, input_seq_record, call_construct, separator) -> results.algorithm_output | str:
-        obj = cls(input_seq_record, call_construct, separator)
+    def run(cls, input_seq_record, call_construct, separator, output=None, output_format="tsv") -> results.algorithm_output | str:
+        obj = cls(input_seq_record, call_construct, separator, output, output_format)
         return obj.run_process()
 
     def run_process(self) -> results.algorithm_output | str:
-        subproc_out = subprocess.run(
-            self.call_construct + str(self.record.seq),
-            text=True,
-            capture_output=True,
-            shell=True,
-        )
-        if not subproc_out.returncode:
-            results.algorithm_output(
-                self.record.id, subproc_out.stdout, subproc_out.stderr
-            ).write_results(self.separator, False)
+        output = fold(self.call_construct, self.record)
+        if isinstance(output, results.algorithm_output):
+            if output.pfc:
+                output.calculate_pfc_probabilities()
+            sink = sinks.open_sink(self.output_format, self.output, self.separator)
+            sink.add(output)
+            sink.close()
+            output.write_time()
         else:
-            sys.stderr.write(subproc_out.stderr)
+            sys.stderr.write(output.error)
 
     def __repr__(self) -> str:
         return f"{type(self).__name__}: {self.__dict__}"
@@ -415,65 +697,593 @@ class MultiProcess:
         call_construct: str,
         separator: str,
         workers: int,
+        batch: bool = False,
+        engine: str = "queue",
+        chunksize: int = 16,
+        schedule: str = "fifo",
+        lookahead: int = 256,
+        result_cache: Optional[cache.ResultCache] = None,
+        dedup: str = "off",
+        dedup_window: int = 10000,
+        metrics: Optional[str] = None,
+        ordered: str = "off",
+        reorder_buffer: int = 1024,
+        output: Optional[str] = None,
+        output_format: str = "tsv",
+        output_batch: int = 4096,
+        checkpoint: bool = False,
+        resume: bool = False,
+        shard: Optional[str] = None,
+        shard_by: str = "ordinal",
+        profile: Optional[str] = None,
+        progress_interval: float = 0,
+        prometheus: Optional[str] = None,
+        input_bytes: Optional[progress.InputBytes] = None,
     ):
         self.seq_iterator = iterator
         self.call_construct = call_construct
         self.workers = workers
         self.separator = separator
+        self.batch = batch
+        self.engine = engine
+        self.chunksize = chunksize
+        self.schedule = schedule
+        self.lookahead = lookahead
+        self.result_cache = result_cache
+        self.dedup = dedup
+        self.dedup_window = dedup_window
+        self.metrics = metrics
+        self._metrics_file = None  # type:Optional[io.TextIOWrapper]
+        self.ordered = ordered
+        self.reorder_buffer = reorder_buffer
+        self._reorder = None  # type:Optional[ordering.ReorderBuffer]
+        self._slots = None  # type:Optional[multiprocessing.synchronize.Semaphore]
+        self.output = output
+        self.output_format = output_format
+        self.output_batch = output_batch
+        self._sink = None  # type:Optional[sinks.Sink]
+        self.checkpoint = checkpoint or resume
+        self.resume = resume
+        self.journal = None  # type:Optional[checkpoint.Journal]
+        self.shard = shard
+        self.shard_by = shard_by
+        self.profile = profile
+        self._profile = profiling.Profile() if profile else None  # type:Optional[profiling.Profile]
+        # input_bytes reports how much of the input file the reader has consumed for the ETA, None for stdin
+        self._progress = (
+            progress.Progress(workers, progress_interval, prometheus, input_bytes)
+            if progress_interval or prometheus
+            else None
+        )  # type:Optional[progress.Progress]
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.log = logging.getLogger(__name__)
 
     @classmethod
-    def run(cls, input_iterator, call_construct, workers, separator):
-        obj = cls(input_iterator, call_construct, workers, separator)
+    def run(
+        cls,
+        input_iterator,
+        call_construct,
+        separator,
+        workers,
+        batch=False,
+        engine="queue",
+        chunksize=16,
+        schedule="fifo",
+        lookahead=256,
+        result_cache=None,
+        dedup="off",
+        dedup_window=10000,
+        metrics=None,
+        ordered="off",
+        reorder_buffer=1024,
+        output=None,
+        output_format="tsv",
+        output_batch=4096,
+        checkpoint=False,
+        resume=False,
+        shard=None,
+        shard_by="ordinal",
+        profile=None,
+        progress_interval=0,
+        prometheus=None,
+        input_bytes=None,
+    ):
+        obj = cls(
+            input_iterator,
+            call_construct,
+            separator,
+            workers,
+            batch,
+            engine,
+            chunksize,
+            schedule,
+            lookahead,
+            result_cache,
+            dedup,
+            dedup_window,
+            metrics,
+            ordered,
+            reorder_buffer,
+            output,
+            output_format,
+            output_batch,
+            checkpoint,
+            resume,
+            shard,
+            shard_by,
+            profile,
+            progress_interval,
+            prometheus,
+            input_bytes,
+        )
         obj.run_process()
 
-    # Main processing function running and managing multiprocessing.
     def run_process(self) -> None:
+        sinks.check_sink(self.output_format, self.output)
+        if self._profile is not None:
+            self.seq_iterator = self._profile.timed(self.seq_iterator, "input_parse")
+        if self.shard:
+            index, count = sharding.parse_shard(self.shard)
+            self.log.info(f"Folding shard {index} of {count} (by {self.shard_by}).")
+            self.seq_iterator = sharding.select(self.seq_iterator, index, count, self.shard_by)
+        if self.checkpoint:
+            self._open_journal()
+        self.seq_iterator = ordering.numbered(self.seq_iterator)
+        if self._progress is not None:
+            self.seq_iterator = self._progress.track(self.seq_iterator)
+        match self.dedup:
+            case "off":
+                pass
+            case "window":
+                self.log.info(f"Folding identical sequences once within {self.dedup_window} records.")
+                self.seq_iterator = dedup.window_groups(self.seq_iterator, self.dedup_window)
+            case "spill":
+                self.log.info("Indexing input sequences for deduplication...")
+                self.seq_iterator = dedup.spill_groups(self.seq_iterator)
+            case _:
+                raise ValueError(f"Unknown deduplication mode: {self.dedup}")
+        match self.schedule:
+            case "fifo":
+                pass
+            case "lpt":
+                self.log.info(f"Dispatching longest sequences first within {self.lookahead} records.")
+                self.seq_iterator = scheduling.longest_first(self.seq_iterator, self.lookahead)
+            case _:
+                raise ValueError(f"Unknown schedule: {self.schedule}")
+        makespan = scheduling.Makespan(self.workers)
+        self.seq_iterator = makespan.track(self.seq_iterator)
+        self._check_ordered()
+        if self.result_cache is not None:
+            self._open_cache()
+        if self._progress is not None:
+            self._progress.begin()
+        start = perf_counter()
+        match self.engine:
+            case "queue":
+                self._run_queue()
+            case "pool":
+                self._run_pool()
+            case _:
+                raise ValueError(f"Unknown executor engine: {self.engine}")
+        elapsed = perf_counter() - start
+        if self._progress is not None:
+            self._progress.end()
+        self.log.info(makespan.report(elapsed))
+        if self.result_cache is not None:
+            self._close_cache()
+        if self._profile is not None:
+            self._profile.set_process("main")
+            profiling.write_report(
+                self._profile.report(elapsed, self.engine, self.workers), None if self.profile == "-" else self.profile
+            )
+
+    # The journal lives next to the output file. Resuming cuts the output back to its last checkpoint and skips all journaled records,
+    # the main process connection is closed again before forking like the result cache connection.
+    def _open_journal(self) -> None:
+        sinks.check_journal(self.output_format, self.output)
+        self.journal = checkpoint.Journal(checkpoint.Journal.journal_path(self.output))
+        if self.resume:
+            dropped = self.journal.truncate(self.output)
+            self.log.info(
+                f"Resuming from {self.journal.path}: {self.journal.completed()} records completed, dropped {dropped} bytes of unjournaled output."
+            )
+            self.seq_iterator = self.journal.skip_completed(self.seq_iterator)
+        self.journal.close()
+
+    # In block mode every dispatched record takes one of reorder_buffer slots, which the writer hands back once the records output is written.
+    # Dispatch stops while all slots are taken, so at most reorder_buffer outputs ever wait in the reorder buffer. This only works if records
+    # are dispatched in input order, lpt can hold back the next ordinal for the whole look-ahead window and falls back to spill.
+    def _check_ordered(self) -> None:
+        match self.ordered:
+            case "off":
+                return
+            case "block":
+                if self.schedule == "lpt":
+                    self.log.warning("lpt scheduling reorders dispatch, ordered output falls back to spill.")
+                    self.ordered = "spill"
+                    return
+                if self.engine == "pool" and self.reorder_buffer < self.chunksize:
+                    self.log.warning(f"Reorder buffer is smaller than the chunksize, increasing it to {self.chunksize}.")
+                    self.reorder_buffer = self.chunksize
+                self._slots = multiprocessing.Semaphore(self.reorder_buffer)
+                self.seq_iterator = self._gated(self.seq_iterator)
+            case "spill":
+                pass
+            case _:
+                raise ValueError(f"Unknown ordered output mode: {self.ordered}")
+        self.log.info(f"Writing results in input order, {self.ordered} mode with a reorder buffer of {self.reorder_buffer}.")
+
+    def _gated(self, iterator: Iterable[SeqRecord]) -> Generator[SeqRecord, None, None]:
+        for record in iterator:
+            self._slots.acquire()
+            yield record
+
+    # Drops results of outdated motif catalogues before the workers start, the main process connection is closed again before forking.
+    def _open_cache(self) -> None:
+        removed = self.result_cache.invalidate()
+        if removed:
+            self.log.info(f"Removed {removed} cached results of outdated motif catalogues.")
+        self.result_cache.close()
+
+    def _close_cache(self) -> None:
+        evicted = self.result_cache.evict()
+        if evicted:
+            self.log.debug(f"Evicted {evicted} least recently used results from the result cache.")
+        totals = self.result_cache.count(self.cache_hits, self.cache_misses)
+        self.result_cache.close()
+        self.log.info(
+            "Result cache: {hits} hits, {misses} misses this run ({total_hits} hits, {total_misses} misses in total).".format(
+                hits=self.cache_hits,
+                misses=self.cache_misses,
+                total_hits=totals.get("hits", 0),
+                total_misses=totals.get("misses", 0),
+            )
+        )
+
+    # Main processing function running and managing multiprocessing through Manager queues and a separate listener process.
+    def _run_queue(self) -> None:
         Manager = multiprocessing.Manager()
         input_q = Manager.Queue(
             maxsize=self.workers * 2
         )  # type:multiprocessing.Queue[SeqIO.SeqRecord | None]
         output_q = Manager.Queue()  # type:multiprocessing.Queue[tuple]
         Pool = multiprocessing.Pool(processes=self.workers)
-        listening = multiprocessing.Process(target=self._listener, args=(output_q,))
+        main_proc_conn, listener_conn = multiprocessing.Pipe(duplex=False)
+        listening = multiprocessing.Process(target=self._listener, args=(output_q, listener_conn))
         listening.start()  # start the listener
         workers = []  # type:list[multiprocessing.AsyncResult]
         for i in range(self.workers):
-            work = Pool.apply_async(worker, (self.call_construct, input_q, output_q))
+            work = Pool.apply_async(
+                worker,
+                (self.call_construct, input_q, output_q, self.batch, self.result_cache, self._profile is not None),
+            )
             workers.append(work)  # put workers on the funny list
+        if self._progress is not None:
+            self._progress.watch(input_q, output_q)
 
         for record in self.seq_iterator:
+            put = perf_counter()
             input_q.put(record)
+            if self._profile is not None:
+                self._profile.add("dispatch", perf_counter() - put)
 
         for i in range(self.workers):
             input_q.put(None)
 
         for work in workers:
-            work.get()
+            totals = work.get()
+            if totals is not None:
+                self._profile.add_worker(*totals)
         Pool.close()
         output_q.put(None)
         Pool.join()
+        self._collect(main_proc_conn.recv())
         listening.join()
+        if self._progress is not None:
+            self._progress.watch()
+
+    # Chunked executor: records are sent to the pool workers in chunks of self.chunksize over the pools own pipes and every chunk comes back
+    # as one list of results, which gets written by the main process. No Manager server process and no listener process are involved.
+    def _run_pool(self) -> None:
+        self._open_writer()
+        with multiprocessing.Pool(
+            processes=self.workers,
+            initializer=init_pool_worker,
+            initargs=(self.call_construct, self.batch, self.result_cache, self._profile is not None),
+        ) as Pool:
+            for outputs in Pool.imap_unordered(
+                fold_chunk, chunked(self.seq_iterator, self.chunksize)
+            ):
+                for output in outputs:
+                    self._write(output)
+            Pool.close()
+            Pool.join()
+        self._close_writer()
 
     # listener has the sole write access to make writing the logs and results mp save, connected back to the main process through a pipe (main_proc_conn)
-    def _listener(self, q: multiprocessing.Queue):
-        writing_started = False
+    def _listener(self, q: multiprocessing.Queue, main_proc_conn: multiprocessing.connection.Connection):
+        if self._profile is not None:
+            self._profile = profiling.Profile()  # the main process keeps its own stages, they get merged at the end
+        self._open_writer()
         while True:
-            output = q.get()  # type:'results.algorithm_output | results.error | None'
-            if output is None:
+            outputs = self._drain(q)
+            if outputs and outputs[-1] is None:
+                self._write_batch(outputs[:-1])
                 break
             else:
-                if isinstance(output, results.algorithm_output):
-                    writing_started = output.write_results(self.separator, writing_started)
-                    sys.stdout.flush()
-                if isinstance(output, results.error):
-                    sys.stderr.write(f"{output.id}: {output.error}")
+                self._write_batch(outputs)
+        self._close_writer()
+        if self._profile is not None:
+            self._profile.set_process("listener")
+        main_proc_conn.send(self._counters())
+
+    # the next output plus whatever else is already waiting in the queue, up to output_batch outputs
+    def _drain(self, q: multiprocessing.Queue) -> "list[results.algorithm_output | results.error | None]":
+        outputs = [q.get()]
+        while outputs[-1] is not None and len(outputs) < self.output_batch:
+            try:
+                outputs.append(q.get_nowait())
+            except queue.Empty:
+                break
+        return outputs
+
+    # pfc probabilities are calculated for all outputs of a batch at once, before any of them gets copied for deduplicated records
+    def _write_batch(self, outputs: "list[results.algorithm_output | results.error]") -> None:
+        if results.algorithm_output.pfc:
+            start = perf_counter()
+            results.pfc_probabilities([output for output in outputs if isinstance(output, results.algorithm_output)])
+            if self._profile is not None:
+                self._profile.add("write", perf_counter() - start)
+        for output in outputs:
+            self._write(output)
+
+    # writes an output and its copies for all deduplicated records sharing its sequence, in ordered mode only once all predecessors are written
+    def _write(self, output: "results.algorithm_output | results.error") -> None:
+        start = perf_counter()
+        outputs = [output] + [output.renamed(name, ordinal) for ordinal, name in output.duplicates]
+        if self._reorder is not None:
+            outputs = [ready for copy in outputs for ready in self._reorder.push(copy.ordinal, copy)]
+        for copy in outputs:
+            self._write_output(copy)
+        if self._profile is not None:
+            self._profile.add("write", perf_counter() - start)
+
+    def _write_output(self, output: "results.algorithm_output | results.error") -> None:
+        if isinstance(output, results.algorithm_output):
+            self._sink.add(output)
+            output.write_time()
+        if isinstance(output, results.error):
+            sys.stderr.write(f"{output.id}: {output.error}")
+            self._sink.skip(output.id)
+        if self._metrics_file is not None:
+            self._write_metrics(output)
+        if self._progress is not None:
+            self._progress.completed(output)
+        if not output.duplicate:
+            if self._profile is not None:
+                self._profile.add_output(output.profile)
+            if self.result_cache is not None:
+                if getattr(output, "cached", False):
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+            if self._slots is not None:
+                self._slots.release()
+
+    # The writer owns sink, reorder buffer and metrics sidecar, it runs in the listener process for the queue engine and in the main process
+    # for the pool engine. The reorder buffer is drained before the sink gets its final flush.
+    def _open_writer(self) -> None:
+        self._sink = sinks.open_sink(
+            self.output_format, self.output, self.separator, self.output_batch, self.journal, self.resume
+        )
+        self._open_metrics()
+        self._open_reorder()
+
+    def _close_writer(self) -> None:
+        start = perf_counter()
+        self._close_reorder()
+        self._sink.close()
+        self._close_metrics()
+        if self._profile is not None:
+            self._profile.add("write", perf_counter() - start)
+
+    def _open_reorder(self) -> None:
+        if self.ordered != "off":
+            self._reorder = ordering.ReorderBuffer(self.reorder_buffer, spill=self.ordered == "spill")
+
+    # anything left in the buffer had a missing predecessor, it still gets written in order
+    def _close_reorder(self) -> None:
+        if self._reorder is not None:
+            remaining = self._reorder.drain()
+            if remaining:
+                self.log.warning(f"{len(remaining)} outputs were still waiting for missing predecessors.")
+            for output in remaining:
+                self._write_output(output)
+            self._reorder.close()
+            self._reorder = None
+
+    # Metrics sidecar, one tab separated row per record ID. Source is run for records folded in this run, cache for results taken from
+    # the result cache and duplicate for deduplicated records, which have no resource usage of their own.
+    def _open_metrics(self) -> None:
+        if self.metrics:
+            self._metrics_file = open(self.metrics, "a" if self.resume else "w")
+            if not self._metrics_file.tell():
+                self._metrics_file.write("\t".join(["ID", "source", "status"] + results.usage.columns) + "\n")
+
+    def _close_metrics(self) -> None:
+        if self._metrics_file is not None:
+            self._metrics_file.close()
+            self._metrics_file = None
+
+    def _write_metrics(self, output: "results.algorithm_output | results.error") -> None:
+        status = "ok" if isinstance(output, results.algorithm_output) else "error"
+        if output.duplicate:
+            row = [output.id, "duplicate", status] + [""] * len(results.usage.columns)
+        elif output.usage is not None:
+            row = [output.id, "run", status] + output.usage.row()
+        else:
+            row = [output.id, "cache", status] + [""] * len(results.usage.columns)
+        self._metrics_file.write("\t".join(row) + "\n")
+
+    # counters collected while writing, the listener process sends them back to the main process when it is done
+    def _counters(self) -> dict:
+        counters = {"cache_hits": self.cache_hits, "cache_misses": self.cache_misses}
+        if self._profile is not None:
+            counters["profile"] = self._profile
+        return counters
+
+    def _collect(self, counters: dict) -> None:
+        for name, value in counters.items():
+            if name == "profile":
+                self._profile.merge(value)
+            else:
+                setattr(self, name, value)
 
     # str and repr methods for better documentation and useablity
     def __repr__(self) -> str:
         return f"{type(self).__name__}: {self.__dict__}"
 
     def __str__(self) -> str:
-        return f"{type(self).__name__}, Call: {self.call_construct}, Input: {self.seq_iterator}. Worker Processes: {self.workers}"
+        return f"{type(self).__name__}, Call: {self.call_construct}, Input: {self.seq_iterator}. Worker Processes: {self.workers}, Batch mode: {self.batch}, Engine: {self.engine}, Schedule: {self.schedule}"
+
+
+# Persistent algorithm instance for batch mode. The binary is compiled with Extensions/batch_main.cc, reads one sequence per line from stdin
+# and terminates the output of every record with a line starting with the ASCII record separator followed by the exit status of that record.
+# stderr of the instance goes to a per instance temporary file opened for appending, after every record the new part of it is read back
+# through a second handle and reported with the record like the stderr of single runs. Restarted instances append to the same file.
+class BatchInstance:
+    record_separator = "\x1e"
+
+    def __init__(self, call: str) -> None:
+        self.call = call
+        (handle, self.stderr_path) = tempfile.mkstemp(prefix="RNALoops_batch_", suffix=".err")
+        os.close(handle)
+        self._stderr = open(self.stderr_path, "r", errors="replace")
+        self.instance = self._start()
+        self.maxrss = 0  # type:int # VmHWM of the instance after its last record, reported if it dies
+
+    def _start(self) -> subprocess.Popen:
+        with open(self.stderr_path, "a") as stderr:
+            return subprocess.Popen(
+                shlex.split(self.call),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+                text=True,
+                bufsize=1,
+            )
+
+    # returns exit status, stdout, stderr and resource usage of the record like predict does for single runs
+    def predict(self, record: SeqRecord) -> tuple[int, str, str, results.usage]:
+        start = perf_counter()
+        before = proc_usage(self.instance.pid)
+        try:
+            self.instance.stdin.write(str(record.seq) + "\n")
+            self.instance.stdin.flush()
+        except BrokenPipeError:
+            return self._restart(record)
+        lines = []  # type:list[str]
+        while True:
+            line = self.instance.stdout.readline()
+            if not line:
+                return self._restart(record)
+            if line.startswith(self.record_separator):
+                status = int(line[1:])
+                break
+            lines.append(line)
+        after = proc_usage(self.instance.pid)
+        self.maxrss = after[2]
+        usage = results.usage(
+            perf_counter() - start, after[0] - before[0], after[1] - before[1], after[2], status
+        )
+        if not status:
+            return (status, "".join(lines), self._stderr.read(), usage)
+        else:
+            return (status, "", "".join(lines) + self._stderr.read(), usage)
+
+    # if the instance dies while folding a record (e.g. segfault) the record is reported as error with whatever the instance wrote to
+    # stderr and a new instance is started for the next one
+    def _restart(self, record: SeqRecord) -> tuple[int, str, str, results.usage]:
+        (_, status, rusage) = os.wait4(self.instance.pid, 0)
+        returncode = os.waitstatus_to_exitcode(status)
+        self.instance.returncode = returncode
+        self._close_pipes()
+        error = self._stderr.read()
+        self.instance = self._start()
+        maxrss, self.maxrss = self.maxrss, 0
+        return (
+            returncode or 1,
+            "",
+            f"{error}Batch instance terminated with exit code {returncode}.\n",
+            results.usage(0.0, rusage.ru_utime, rusage.ru_stime, maxrss, returncode),
+        )
+
+    def _close_pipes(self) -> None:
+        try:
+            self.instance.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.instance.stdout.close()
+
+    def close(self) -> None:
+        self._close_pipes()
+        self.instance.wait()
+        self._stderr.close()
+        os.remove(self.stderr_path)
+
+
+# Streams records from a (compressed) file or stdin ("-"). The handle stays open for as long as the generator is consumed and only
+# the current record is held in memory. Compression of stdin is detected from its magic bytes, zip archives need a seekable file.
+# The raw input file is handed to input_bytes, which reports how much of it is read for the progress ETA.
+def read_records(
+    path: str, compression: Optional[str], filetype: str, input_bytes: Optional[progress.InputBytes] = None
+) -> Generator[SeqRecord, None, None]:
+    if path == "-":
+        compression = sniff_compression(sys.stdin.buffer)
+        if compression == "zip":
+            raise TypeError("zip archives can not be streamed from stdin, please use gzip, bzip2 or xz")
+        with open_input(sys.stdin.buffer, compression) as handle:
+            yield from SeqIO.parse(handle, filetype)
+        return
+    with open(path, "rb") as source:
+        if input_bytes is not None:
+            input_bytes.open(source)
+        with open_input(source, compression, path) as handle:
+            yield from SeqIO.parse(handle, filetype)
+
+
+def open_input(source: io.BufferedReader, compression: Optional[str], path: str = "-") -> io.TextIOBase:
+    match compression:
+        case None:
+            return io.TextIOWrapper(source)
+        case "gz":
+            return gzip.open(source, "rt")
+        case "bz2":
+            return bz2.open(source, "rt")
+        case "xz":
+            return lzma.open(source, "rt")
+        case "zip":
+            archive = zipfile.ZipFile(source)
+            members = [member for member in archive.infolist() if not member.is_dir()]
+            if len(members) != 1:
+                raise TypeError(f"zip archives need to contain exactly one file, {path} contains {len(members)}")
+            return io.TextIOWrapper(archive.open(members[0]))
+        case _:
+            raise TypeError(f"Unknown compression {compression}")
+
+
+def sniff_compression(stream: io.BufferedReader) -> Optional[str]:
+    magic = stream.peek(6)[:6]
+    if magic.startswith(b"\x1f\x8b"):
+        return "gz"
+    if magic.startswith(b"BZh"):
+        return "bz2"
+    if magic.startswith(b"\xfd7zXZ\x00"):
+        return "xz"
+    if magic.startswith(b"PK\x03\x04"):
+        return "zip"
+    return None
 
 
 # Non Process class function that need to be unbound to be pickle'able. See: https://stackoverflow.com/questions/1816958/cant-pickle-type-instancemethod-when-using-multiprocessing-pool-map, guess it kinda is possible it really isnt all that necessary though.
@@ -503,28 +1313,249 @@ def worker(
     call: str,
     iq: multiprocessing.Queue,
     oq: multiprocessing.Queue,
-) -> list:
+    batch: bool = False,
+    result_cache: Optional[cache.ResultCache] = None,
+    profile: bool = False,
+) -> Optional[tuple[int, float, int]]:
+    instance = BatchInstance(call) if batch else None  # type:Optional[BatchInstance]
+    output_put = 0.0
     while True:
+        wait = perf_counter()
         record = iq.get()  # type:Optional[SeqIO.SeqRecord]
+        wait = perf_counter() - wait
         if record is None:
             break
         else:
-            if "T" in str(record.seq):
-                record.seq = record.seq.transcribe()
-            subprocess_output = subprocess.run(
-                call + str(record.seq), text=True, capture_output=True, shell=True
-            )
-        if not subprocess_output.returncode:
-            result = results.algorithm_output(
-                record.id, subprocess_output.stdout, subprocess_output.stderr
-            )
-        else:
-            result = results.error(record.id, subprocess_output.stderr)
+            result = fold(call, record, instance, result_cache, wait if profile else None)
+        put = perf_counter()
         oq.put(result)
+        output_put += perf_counter() - put
+    if instance is not None:
+        instance.close()
+    if result_cache is not None:
+        result_cache.close()
+    # with --profile the worker reports its time spent putting outputs into the output queue and its peak RSS
+    if profile:
+        return (os.getpid(), output_put, profiling.peak_rss())
+
+
+# Pool engine workers keep their call construct, batch instance and result cache as process globals, set once by the pool initializer.
+_pool_call = ""  # type:str
+_pool_instance = None  # type:Optional[BatchInstance]
+_pool_cache = None  # type:Optional[cache.ResultCache]
+_pool_profile = False  # type:bool
+_pool_idle = 0.0  # type:float # end of the last chunk, the time until the next chunk arrives is the queue wait of its first record
+
+
+def init_pool_worker(
+    call: str, batch: bool = False, result_cache: Optional[cache.ResultCache] = None, profile: bool = False
+) -> None:
+    global _pool_call, _pool_instance, _pool_cache, _pool_profile, _pool_idle
+    _pool_call = call
+    _pool_instance = BatchInstance(call) if batch else None
+    _pool_cache = result_cache
+    _pool_profile = profile
+    _pool_idle = perf_counter()
+    multiprocessing.util.Finalize(None, close_pool_worker, exitpriority=10)
+
+
+# runs when a pool worker exits, the batch instance gets shut down and the result cache flushes its buffered writes on close
+def close_pool_worker() -> None:
+    if _pool_instance is not None:
+        _pool_instance.close()
+    if _pool_cache is not None:
+        _pool_cache.close()
+
+
+# pfc probabilities are calculated for the whole chunk at once
+def fold_chunk(records: list[SeqRecord]) -> "list[results.algorithm_output | results.error]":
+    global _pool_idle
+    if not _pool_profile:
+        outputs = [fold(_pool_call, record, _pool_instance, _pool_cache) for record in records]
+    else:
+        waits = [perf_counter() - _pool_idle] + [0.0] * (len(records) - 1)
+        outputs = [fold(_pool_call, record, _pool_instance, _pool_cache, wait) for record, wait in zip(records, waits)]
+        _pool_idle = perf_counter()
+    if results.algorithm_output.pfc:
+        results.pfc_probabilities([output for output in outputs if isinstance(output, results.algorithm_output)])
+    return outputs
+
+
+def chunked(iterable, size: int) -> Generator[list, None, None]:
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+# Folds a record and hands its ordinal and those of deduplicated records sharing its sequence on to the output. With a queue_wait (--profile)
+# the output also carries the timings of this worker.
+def fold(
+    call: str,
+    record: SeqRecord,
+    instance: Optional[BatchInstance] = None,
+    result_cache: Optional[cache.ResultCache] = None,
+    queue_wait: Optional[float] = None,
+) -> "results.algorithm_output | results.error":
+    (output, output_parse) = _fold(call, record, instance, result_cache)
+    output.ordinal = getattr(record, "ordinal", None)
+    if hasattr(record, "duplicates"):
+        output.duplicates = record.duplicates
+    if queue_wait is not None:
+        output.profile = profiling.output_profile(
+            queue_wait, output.usage.wall if output.usage is not None else 0.0, output_parse
+        )
+    return output
+
+
+# Transcribes DNA records and folds them either through the workers batch instance or a new subprocess.
+# With a result cache, known sequences are answered from the cache and successful predictions get added to it.
+# Returns the output and the time spent parsing the algorithm output.
+def _fold(
+    call: str,
+    record: SeqRecord,
+    instance: Optional[BatchInstance] = None,
+    result_cache: Optional[cache.ResultCache] = None,
+) -> "tuple[results.algorithm_output | results.error, float]":
+    if "T" in str(record.seq):
+        record.seq = record.seq.transcribe()
+    if result_cache is not None:
+        cached = result_cache.get(str(record.seq))
+        if cached is not None:
+            start = perf_counter()
+            output = results.algorithm_output(record.id, cached, "")
+            output.cached = True
+            return (output, perf_counter() - start)
+    if instance is not None:
+        (returncode, stdout, stderr, usage) = instance.predict(record)
+    else:
+        (returncode, stdout, stderr, usage) = predict(call, record)
+    if returncode:
+        return (results.error(record.id, stderr, usage=usage), 0.0)
+    if result_cache is not None:
+        result_cache.put(str(record.seq), stdout)
+    start = perf_counter()
+    output = results.algorithm_output(record.id, stdout, stderr + str(usage))
+    output_parse = perf_counter() - start
+    output.usage = usage
+    return (output, output_parse)
+
+
+# One process per record, used whenever batch mode is off. The algorithm is executed without a shell and reaped with os.wait4,
+# which gives exit status, CPU times and peak RSS of exactly this run (see PeakRSS). stderr goes to a temporary file so neither pipe can block
+# the other.
+def predict(call: str, record: SeqRecord) -> tuple[int, str, str, results.usage]:
+    start = perf_counter()
+    with tempfile.TemporaryFile("w+") as stderr:
+        algorithm = subprocess.Popen(
+            shlex.split(call) + [str(record.seq)],
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            text=True,
+        )
+        PeakRSS.watch(algorithm.pid)
+        stdout = algorithm.stdout.read()
+        algorithm.stdout.close()
+        sampled = PeakRSS.stop(algorithm.pid)
+        (_, status, rusage) = os.wait4(algorithm.pid, 0)
+        algorithm.returncode = os.waitstatus_to_exitcode(status)
+        maxrss = PeakRSS.of_child(rusage.ru_maxrss, sampled)
+        stderr.seek(0)
+        error = stderr.read()
+    return (
+        algorithm.returncode,
+        stdout,
+        error,
+        results.usage(
+            perf_counter() - start,
+            rusage.ru_utime,
+            rusage.ru_stime,
+            maxrss,
+            algorithm.returncode,
+        ),
+    )
+
+
+# Peak RSS of single runs. The ru_maxrss of os.wait4 is the larger of the peak RSS of the child and the RSS of the Python process it was
+# spawned from, so it is the peak of the child only if it exceeds the peak RSS of this process. Smaller children are covered by one sampler
+# thread per process, which reads VmHWM from /proc every interval seconds for all watched children. Children that end within their first
+# interval are never sampled, records that short and smaller than the worker process report a peak RSS of 0.
+class PeakRSS:
+    interval = 0.005  # seconds
+    _peaks = {}  # type:dict[int, int] # kB by watched pid
+    _condition = threading.Condition()
+    _sampler_pid = None  # type:Optional[int] # process the sampler thread runs in, threads do not survive forks
+
+    @classmethod
+    def watch(cls, pid: int) -> None:
+        with cls._condition:
+            cls._peaks[pid] = 0
+            if cls._sampler_pid != os.getpid():
+                cls._sampler_pid = os.getpid()
+                threading.Thread(target=cls._sample, daemon=True).start()
+            cls._condition.notify()
+
+    # has to be called before the child gets reaped, afterwards its pid may belong to another process
+    @classmethod
+    def stop(cls, pid: int) -> int:
+        with cls._condition:
+            return cls._peaks.pop(pid, 0)
+
+    @classmethod
+    def of_child(cls, ru_maxrss: int, sampled: int) -> int:
+        return ru_maxrss if ru_maxrss > profiling.peak_rss() else sampled
+
+    @classmethod
+    def _sample(cls) -> None:
+        while True:
+            with cls._condition:
+                while not cls._peaks:
+                    cls._condition.wait()
+            sleep(cls.interval)
+            with cls._condition:
+                pids = list(cls._peaks)
+            for pid in pids:
+                peak = proc_usage(pid)[2]
+                with cls._condition:
+                    if pid in cls._peaks:
+                        cls._peaks[pid] = max(cls._peaks[pid], peak)
+
+
+# CPU times and peak RSS of a running process from /proc, used for batch instances which are never reaped between records.
+# Returns zeros where /proc is not available.
+def proc_usage(pid: int) -> tuple[float, float, int]:
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            fields = stat.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as status:
+            maxrss = next(
+                (int(line.split()[1]) for line in status if line.startswith("VmHWM:")), 0
+            )
+    except (OSError, IndexError, ValueError):
+        return (0.0, 0.0, 0)
+    ticks = os.sysconf("SC_CLK_TCK")
+    return (int(fields[11]) / ticks, int(fields[12]) / ticks, maxrss)
 
 
 if __name__ == "__main__":
     cmd_args = args.get_cmdarguments()
+    if cmd_args.merge:
+        make_new_logger(cmd_args.loglevel.upper(), sharding.__name__)
+        sharding.merge(cmd_args.merge, cmd_args.output, cmd_args.output_format)
+        sys.exit(0)
+    if cmd_args.prebuild is not None:
+        make_new_logger(cmd_args.loglevel.upper(), prebuild.__name__)
+        failed = prebuild.prebuild(
+            Constants.get_RNALoops_path(),
+            builds.BuildCache(
+                cmd_args.build_cache or os.path.join(Constants.get_cache_path(), "builds"), cmd_args.build_keep
+            ),
+            cmd_args.prebuild,
+            cmd_args.workers,
+            cmd_args.make_jobs,
+            cmd_args.batch,
+            args.get_config(Constants.get_conf_path())["VERSIONS"]["hairpins"],
+        )
+        sys.exit(1 if failed else 0)
     if cmd_args.config:
         proc = Process.from_config(args.get_config(Constants.get_conf_path()))
     else:
@@ -26,11 +26,24 @@ def get_cmdarguments() -> argparse.Namespace:
     parser.add_argument(
         "-i",
         "--input",
-        help="Set input path or input sequence. File formats fasta, fastq and stockholm are supported. File compression .zip and .gzip are also supported.",
+        help="Set input path or input sequence, - reads from stdin. File formats fasta, fastq and stockholm are supported. File compression .gz, .zip, .bz2 and .xz is also supported, compression of stdin gets detected automatically (except zip).",
         type=str,
         dest="input",
         nargs="?",
     )
+    parser.add_argument(
+        "-F",
+        "--input_format",
+        help="Specify input file format instead of detecting it from the file ending. Needed for fastq or stockholm input through stdin, which defaults to fasta.",
+        choices=[
+            "fasta",
+            "fastq",
+            "stockholm",
+        ],
+        type=str,
+        default=None,
+        dest="input_format",
+    )
     # Command line arguments that control which algorithm is called with which options.
     # If you add your own partition function algorithm and want the output to have probabilities be sure to add pfc at the end of the name! This tag is used to recognize partition function algorithms by the script.
     parser.add_argument(
@@ -139,7 +152,7 @@ def get_cmdarguments() -> argparse.Namespace:
     parser.add_argument(
         "-t",
         "--time",
-        help="Activate time logging, activating this will run predictions with unix time utility. Default is off",
+        help="Activate time logging, activating this will write wall time, user and sys CPU time, max RSS and exit status of every prediction to stderr. Default is off",
         action="store_true",
         dest="time",
     )
@@ -151,6 +164,304 @@ def get_cmdarguments() -> argparse.Namespace:
         default=os.cpu_count() - 2,
         dest="workers",
     )
+    parser.add_argument(
+        "-B",
+        "--batch",
+        help="Activate batch mode for file input. Every worker keeps one algorithm instance running and streams its sequences through it instead of starting a new process per sequence. Batch mode binaries are compiled separately as [algorithm]_batch. Default is off",
+        action="store_true",
+        dest="batch",
+    )
+    parser.add_argument(
+        "-E",
+        "--engine",
+        help="Specify executor engine for file input. queue sends every record through Manager queues to the workers and a separate listener process, pool sends chunks of records to the workers and writes the returned result chunks in the main process. Default is queue",
+        choices=[
+            "queue",
+            "pool",
+        ],
+        type=str,
+        default="queue",
+        dest="engine",
+    )
+    parser.add_argument(
+        "-C",
+        "--chunksize",
+        help="Specify how many records are sent to a worker at once with the pool engine. Default is 16",
+        type=int,
+        default=16,
+        dest="chunksize",
+    )
+    parser.add_argument(
+        "-S",
+        "--schedule",
+        help="Specify dispatch order for file input. fifo keeps file order, lpt reads ahead --lookahead records and dispatches the longest sequences first to reduce tail latency on mixed-length inputs. Default is fifo",
+        choices=[
+            "fifo",
+            "lpt",
+        ],
+        type=str,
+        default="fifo",
+        dest="schedule",
+    )
+    parser.add_argument(
+        "-L",
+        "--lookahead",
+        help="Specify how many records are read ahead for lpt scheduling. Default is 256",
+        type=int,
+        default=256,
+        dest="lookahead",
+    )
+    parser.add_argument(
+        "-rc",
+        "--cache",
+        help="Activate the persistent result cache for file input. Predictions are stored per sequence, algorithm call and motif catalogue and reused in later runs. Optionally specify the cache database path, default path is {cache_path}. Default is off".format(
+            cache_path=os.path.join(
+                os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                "cache",
+                "results.sqlite",
+            )
+        ),
+        type=str,
+        nargs="?",
+        const=os.path.join(
+            os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+            "cache",
+            "results.sqlite",
+        ),
+        default=None,
+        dest="cache",
+    )
+    parser.add_argument(
+        "-cs",
+        "--cache_size",
+        help="Specify maximum size of the result cache in MB, least recently used results get evicted at the end of each run. Default is 1024",
+        type=int,
+        default=1024,
+        dest="cache_size",
+    )
+    parser.add_argument(
+        "-D",
+        "--dedup",
+        help="Fold identical (transcribed) sequences only once and write the result for every record ID sharing the sequence. window deduplicates within --dedup_window records, spill indexes the whole input in a temporary file first and deduplicates across all records. Default is off",
+        choices=[
+            "off",
+            "window",
+            "spill",
+        ],
+        type=str,
+        default="off",
+        dest="dedup",
+    )
+    parser.add_argument(
+        "-Dw",
+        "--dedup_window",
+        help="Specify how many records are held in memory for window deduplication. Default is 10000",
+        type=int,
+        default=10000,
+        dest="dedup_window",
+    )
+    parser.add_argument(
+        "-m",
+        "--metrics",
+        help="Specify a path for a tab separated sidecar file with wall time, user and sys CPU time, max RSS and exit status of every record in file input. Default is off",
+        type=str,
+        default=None,
+        dest="metrics",
+    )
+    parser.add_argument(
+        "-O",
+        "--ordered",
+        help="Write results of file input in input order instead of completion order. block holds back dispatch while --reorder_buffer outputs wait for their predecessors, spill keeps dispatching and moves waiting outputs beyond the buffer size into a temporary file. Default is off",
+        choices=[
+            "off",
+            "block",
+            "spill",
+        ],
+        type=str,
+        default="off",
+        dest="ordered",
+    )
+    parser.add_argument(
+        "-Ob",
+        "--reorder_buffer",
+        help="Specify how many outputs may wait in memory for their predecessors in ordered output. Default is 1024",
+        type=int,
+        default=1024,
+        dest="reorder_buffer",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Specify an output file path, - writes to stdout. parquet and arrow output need a file path. Default is stdout",
+        type=str,
+        default=None,
+        dest="output",
+    )
+    parser.add_argument(
+        "-f",
+        "--output_format",
+        help="Specify the output format: tsv (separated by --sep), jsonl (one JSON object per structure), parquet or arrow (typed columnar files, need pyarrow). Default is tsv",
+        choices=[
+            "tsv",
+            "jsonl",
+            "parquet",
+            "arrow",
+        ],
+        type=str,
+        default="tsv",
+        dest="output_format",
+    )
+    parser.add_argument(
+        "-ob",
+        "--output_batch",
+        help="Specify how many result rows are buffered per write, also the parquet row group size. Default is 4096",
+        type=int,
+        default=4096,
+        dest="output_batch",
+    )
+    parser.add_argument(
+        "-j",
+        "--checkpoint",
+        help="Keep a checkpoint journal of completed record IDs next to the output file ([output].journal), needs a tsv or jsonl output file. Default is off",
+        action="store_true",
+        default=False,
+        dest="checkpoint",
+    )
+    parser.add_argument(
+        "-R",
+        "--resume",
+        help="Resume an interrupted checkpointed run: skips records listed in the journal and appends to the existing output file. Records that failed are journaled as well and are not retried. Default is off",
+        action="store_true",
+        default=False,
+        dest="resume",
+    )
+    parser.add_argument(
+        "-sh",
+        "--shard",
+        help="Only fold shard i of N of the input file (i/N, counted from 0), for splitting one input over N independent runs. Default is off",
+        type=str,
+        default=None,
+        dest="shard",
+    )
+    parser.add_argument(
+        "-sb",
+        "--shard_by",
+        help="Assign records to shards by ordinal (every N-th record) or by a stable hash of the record ID. Default is ordinal",
+        choices=[
+            "ordinal",
+            "hash",
+        ],
+        type=str,
+        default="ordinal",
+        dest="shard_by",
+    )
+    parser.add_argument(
+        "-M",
+        "--merge",
+        help="Merge shard output files (same --output_format) into --output or stdout with a single header instead of running predictions.",
+        type=str,
+        nargs="+",
+        default=None,
+        dest="merge",
+    )
+    parser.add_argument(
+        "-sr",
+        "--snapshot_record",
+        help="Record all API responses of a motif update into a snapshot archive at this path (a directory stores it as [release].zip), forces an update. Default is off",
+        type=str,
+        default=None,
+        dest="snapshot_record",
+    )
+    parser.add_argument(
+        "-sp",
+        "--snapshot_replay",
+        help="Update motifs from a recorded snapshot archive instead of the BGSU and Rfam APIs, for nodes without internet access. Default is off",
+        type=str,
+        default=None,
+        dest="snapshot_replay",
+    )
+    parser.add_argument(
+        "-vt",
+        "--version_ttl",
+        help="Seconds a motif version check against the BGSU API is cached for, 0 checks on every start. Failed checks are cached for at most an hour. Default is 86400",
+        type=float,
+        default=86400,
+        dest="version_ttl",
+    )
+    parser.add_argument(
+        "-vb",
+        "--version_background",
+        help="Refresh an expired motif version check in a detached background process instead of waiting for it, a newer release gets installed on the next start. Default is False",
+        action="store_true",
+        dest="version_background",
+    )
+    parser.add_argument(
+        "-bc",
+        "--build_cache",
+        help="Directory of the compiled algorithm cache, builds are kept per instance, compilation flags and motif header. Default is [RNALoops]/cache/builds",
+        type=str,
+        default=None,
+        dest="build_cache",
+    )
+    parser.add_argument(
+        "-bk",
+        "--build_keep",
+        help="Number of builds kept in the compiled algorithm cache, least recently used builds get removed. Default is 64",
+        type=int,
+        default=64,
+        dest="build_keep",
+    )
+    parser.add_argument(
+        "-P",
+        "--prebuild",
+        help="Compile the given RNALoops.gap instances (all instances if none are given) into the build cache instead of running predictions, --workers builds at a time. With --batch the batch mode binaries are built as well.",
+        type=str,
+        nargs="*",
+        default=None,
+        dest="prebuild",
+    )
+    parser.add_argument(
+        "-Pj",
+        "--make_jobs",
+        help="Total number of make jobs shared by all builds running at the same time. Default is os.cpu_count()",
+        type=int,
+        default=os.cpu_count(),
+        dest="make_jobs",
+    )
+    parser.add_argument(
+        "-mc",
+        "--motif_catalogue",
+        help="Motif catalogue file the algorithms load their motif sequences from, e.g. a custom motif set. Motif updates write Extensions/mot_catalogue.bin. Default is Extensions/mot_catalogue.bin if it exists, else the motif sequences compiled into the algorithms",
+        type=str,
+        default=None,
+        dest="motif_catalogue",
+    )
+    parser.add_argument(
+        "-pf",
+        "--profile",
+        help="Report a per stage profile of file input runs at the end of the run (input parsing, dispatch, queue waits, subprocess, output parsing and writing times, records per second per worker and peak RSS of all processes) as table on stderr and as JSON, written to the given path or to stderr without one. Default is off",
+        type=str,
+        nargs="?",
+        const="-",
+        default=None,
+        dest="profile",
+    )
+    parser.add_argument(
+        "-pg",
+        "--progress",
+        help="Print a progress line (records done, throughput, queue depths, errors and ETA) to stderr every given number of seconds during file input runs, 0 deactivates it. For file input the ETA is estimated from the share of the input file read so far, for stdin it is known once all records are read. Default is 0",
+        type=float,
+        default=0,
+        dest="progress_interval",
+    )
+    parser.add_argument(
+        "-pm",
+        "--prometheus",
+        help="Serve the live progress of file input runs in Prometheus text format over HTTP while the run lasts, on [host:]port (localhost without host) or on a Unix socket with unix:path. Default is off",
+        type=str,
+        default=None,
+        dest="prometheus",
+    )
     parser.add_argument(
         "-v",
         "--sep",
@@ -0,0 +1,412 @@
+# Micro-benchmarks of the Python pipeline stages, run with python3 benchmark.py. A stub shell script takes the place of a compiled gapcM
+# binary, it prints a fixed number of result lines per sequence in the output format of the RNALoops.gap instances, so the numbers only
+# reflect the wrapper. Stages are measured separately:
+#   parse    reading the input file (Process._read_input_file)
+#   dispatch records through MultiProcess with batch mode stub instances, per executor engine
+#   launch   one algorithm process per record (predict, as called by worker()), or one record through a batch instance
+#   results  parsing algorithm output into records (algorithm_output._format_results)
+#   pfc      pfc output parsing plus probabilities of all outputs at once (results.pfc_probabilities)
+#   write    writing outputs through the writer (MultiProcess._listener), per output format
+# Every stage runs for every combination of record count and sequence length, dispatch additionally for every worker count. The median of
+# repeats runs is reported and can be stored as JSON baseline, a later run compared against a baseline reports the throughput change of
+# every measurement and fails if one got slower than the tolerance allows.
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from time import perf_counter
+from typing import Callable, Optional
+
+import RNALoops
+import results
+import sinks
+
+BASELINE_FORMAT = 1
+stages = ["parse", "dispatch", "launch", "results", "pfc", "write"]
+
+# stub algorithm: stub.sh mfe|pfc LINES [SEQUENCE], without a sequence it runs like a batch mode binary (see Extensions/batch_main.cc)
+STUB = r"""#!/bin/sh
+mode=$1
+lines=$2
+fold() {
+    i=0
+    while [ $i -lt $lines ]; do
+        if [ "$mode" = pfc ]; then
+            echo "[][]_$i | $((i + 1)).5e+${#1}"
+        else
+            echo "motif_$i | -$((${#1} + i)) | $1"
+        fi
+        i=$((i + 1))
+    done
+}
+if [ $# -gt 2 ]; then
+    fold "$3"
+else
+    while read -r sequence; do
+        fold "$sequence"
+        printf '\036%d\n' 0
+    done
+fi
+"""
+
+
+# same output as the stub, for the stages that do not run it
+def stub_output(sequence: str, mode: str, lines: int) -> str:
+    if mode == "pfc":
+        return "".join(f"[][]_{i} | {i + 1}.5e+{len(sequence)}\n" for i in range(lines))
+    return "".join(f"motif_{i} | -{len(sequence) + i} | {sequence}\n" for i in range(lines))
+
+
+def write_stub(directory: str) -> str:
+    path = os.path.join(directory, "stub.sh")
+    with open(path, "w") as stub:
+        stub.write(STUB)
+    os.chmod(path, 0o755)
+    return path
+
+
+def make_records(records: int, length: int, seed: int = 0) -> list[RNALoops.SeqRecord]:
+    rng = random.Random(seed)
+    return [
+        RNALoops.SeqRecord(RNALoops.Seq("".join(rng.choices("ACGU", k=length))), id=f"seq_{i}", description="")
+        for i in range(records)
+    ]
+
+
+def write_fasta(records: list[RNALoops.SeqRecord], path: str) -> None:
+    with open(path, "w") as fasta:
+        for record in records:
+            fasta.write(f">{record.id}\n{record.seq}\n")
+
+
+def outputs(records: list[RNALoops.SeqRecord], mode: str, lines: int) -> list[results.algorithm_output]:
+    return [results.algorithm_output(record.id, stub_output(str(record.seq), mode, lines), "") for record in records]
+
+
+# One benchmark setup. Every stage function prepares its input and returns the callable that gets timed.
+class Bench:
+    def __init__(self, directory: str, stub: str, lines: int, records: int, length: int) -> None:
+        self.directory = directory
+        self.stub = stub
+        self.lines = lines
+        self.records = make_records(records, length)
+        self.fasta = os.path.join(directory, f"input_{records}_{length}.fasta")
+        write_fasta(self.records, self.fasta)
+
+    def call(self, mode: str = "mfe") -> str:
+        return f"{self.stub} {mode} {self.lines}"
+
+    def parse(self) -> Callable[[], int]:
+        process = RNALoops.Process.__new__(RNALoops.Process)
+        process.input = self.fasta
+        process.input_format = None
+        process.input_bytes = None
+        process.log = logging.getLogger(RNALoops.__name__)
+        return lambda: sum(1 for _ in process._read_input_file())
+
+    def dispatch(self, engine: str, workers: int) -> Callable[[], None]:
+        output = os.path.join(self.directory, "dispatch.tsv")
+        return lambda: RNALoops.MultiProcess.run(
+            iter(self.records), self.call(), "\t", workers, batch=True, engine=engine, output=output
+        )
+
+    def launch(self, batch: bool) -> Callable[[], None]:
+        if not batch:
+            return lambda: [RNALoops.predict(self.call(), record) for record in self.records]
+
+        def batch_run():
+            instance = RNALoops.BatchInstance(self.call())
+            for record in self.records:
+                instance.predict(record)
+            instance.close()
+
+        return batch_run
+
+    def results(self) -> Callable[[], list]:
+        texts = [(record.id, stub_output(str(record.seq), "mfe", self.lines)) for record in self.records]
+        return lambda: [results.algorithm_output(name, text, "") for name, text in texts]
+
+    def pfc(self) -> Callable[[], list]:
+        texts = [(record.id, stub_output(str(record.seq), "pfc", self.lines)) for record in self.records]
+
+        def pfc_run():
+            pfc_outputs = [results.algorithm_output(name, text, "") for name, text in texts]
+            results.pfc_probabilities(pfc_outputs)
+            return pfc_outputs
+
+        return pfc_run
+
+    def write(self, output_format: str) -> Callable[[], None]:
+        prepared = outputs(self.records, "mfe", self.lines)
+        path = os.path.join(self.directory, f"write.{output_format}")
+        if output_format in sinks.columnar_formats:
+            sinks.load_pyarrow(output_format)  # the one time import is not part of the measurement
+
+        def write_run():
+            q = queue.SimpleQueue()
+            for output in prepared:
+                q.put(output)
+            q.put(None)
+            process = RNALoops.MultiProcess(iter(()), "", "\t", 1, output=path, output_format=output_format)
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process._listener(q, sender)
+            receiver.recv()
+
+        return write_run
+
+
+def measure(function: Callable, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = perf_counter()
+        function()
+        timings.append(perf_counter() - start)
+    return statistics.median(timings)
+
+
+# (stage, variant, workers, callable) of all selected stages for one record count and sequence length
+def cases(bench: Bench, selected: list[str], workers: list[int], engines: list[str], output_formats: list[str]) -> list[tuple]:
+    found = []
+    for stage in selected:
+        match stage:
+            case "parse":
+                found.append((stage, "fasta", 1, bench.parse()))
+            case "dispatch":
+                found += [(stage, engine, count, bench.dispatch(engine, count)) for engine in engines for count in workers]
+            case "launch":
+                found += [(stage, "single", 1, bench.launch(False)), (stage, "batch", 1, bench.launch(True))]
+            case "results":
+                found.append((stage, "mfe", 1, bench.results()))
+            case "pfc":
+                found.append((stage, "pfc", 1, bench.pfc()))
+            case "write":
+                found += [(stage, output_format, 1, bench.write(output_format)) for output_format in output_formats]
+            case _:
+                raise ValueError(f"Unknown benchmark stage {stage}, available stages: {', '.join(stages)}")
+    return found
+
+
+def run(
+    records: list[int],
+    lengths: list[int],
+    workers: list[int],
+    selected: list[str],
+    repeats: int = 3,
+    lines: int = 5,
+    engines: Optional[list[str]] = None,
+    output_formats: Optional[list[str]] = None,
+) -> list[dict]:
+    log = logging.getLogger(__name__)
+    engines = engines or ["queue", "pool"]
+    output_formats = output_formats or [x for x in sinks.formats if x not in sinks.columnar_formats or sinks.has_pyarrow()]
+    results.algorithm_output.set_pfc(False)
+    results.algorithm_output.set_time(False)
+    results.algorithm_output.set_algorithm("motmfepretty")
+    measurements = []
+    with tempfile.TemporaryDirectory(prefix="rnaloops_bench_") as directory:
+        stub = write_stub(directory)
+        for record_count in records:
+            for length in lengths:
+                bench = Bench(directory, stub, lines, record_count, length)
+                for stage, variant, worker_count, function in cases(bench, selected, workers, engines, output_formats):
+                    seconds = measure(function, repeats)
+                    measurement = {
+                        "stage": stage,
+                        "variant": variant,
+                        "records": record_count,
+                        "length": length,
+                        "workers": worker_count,
+                        "seconds": round(seconds, 6),
+                        "records_per_s": round(record_count / seconds, 1) if seconds else None,
+                    }
+                    log.info(format_row(measurement))
+                    measurements.append(measurement)
+    return measurements
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save(measurements: list[dict], path: str, repeats: int, lines: int) -> None:
+    with open(path, "w") as baseline:
+        json.dump(
+            {
+                "format": BASELINE_FORMAT,
+                "environment": environment(),
+                "repeats": repeats,
+                "lines": lines,
+                "measurements": measurements,
+            },
+            baseline,
+            indent=1,
+        )
+        baseline.write("\n")
+
+
+def load(path: str) -> list[dict]:
+    with open(path) as baseline:
+        content = json.load(baseline)
+    if content.get("format") != BASELINE_FORMAT:
+        raise ValueError(f"{path} has baseline format {content.get('format')}, expected format {BASELINE_FORMAT}.")
+    return content["measurements"]
+
+
+def key(measurement: dict) -> tuple:
+    return (measurement["stage"], measurement["variant"], measurement["records"], measurement["length"], measurement["workers"])
+
+
+# Throughput change of every measurement that is part of the baseline, positive is faster. Returns the measurements slower than tolerance.
+def compare(measurements: list[dict], baseline: list[dict], tolerance: float) -> list[dict]:
+    known = {key(measurement): measurement for measurement in baseline}
+    slower = []
+    for measurement in measurements:
+        reference = known.get(key(measurement))
+        if reference is None or not reference["seconds"] or not measurement["seconds"]:
+            measurement["change"] = None
+            continue
+        measurement["change"] = round(reference["seconds"] / measurement["seconds"] - 1, 4)
+        if measurement["change"] < -tolerance:
+            slower.append(measurement)
+    return slower
+
+
+def format_row(measurement: dict) -> str:
+    row = "{stage:<9}{variant:<8}{records:>8}{length:>7}{workers:>8}{seconds:>11.4f}{rate:>13}".format(
+        rate=f"{measurement['records_per_s']:.1f}" if measurement["records_per_s"] else "-", **measurement
+    )
+    if "change" in measurement:
+        row += f"{measurement['change']:>+9.1%}" if measurement["change"] is not None else f"{'new':>9}"
+    return row
+
+
+def header(compared: bool) -> str:
+    row = f"{'stage':<9}{'variant':<8}{'records':>8}{'length':>7}{'workers':>8}{'seconds':>11}{'records/s':>13}"
+    return row + (f"{'change':>9}" if compared else "")
+
+
+def get_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="benchmark.py",
+        description="Micro-benchmarks of the RNALoops pipeline stages with a stub algorithm in place of a gapcM binary.",
+    )
+    parser.add_argument(
+        "-s",
+        "--stages",
+        nargs="+",
+        choices=stages,
+        default=stages,
+        help="Stages to benchmark. Default is all stages.",
+    )
+    parser.add_argument(
+        "-r",
+        "--records",
+        nargs="+",
+        type=int,
+        default=[100, 1000],
+        help="Record counts of the benchmark inputs. Default is 100 1000.",
+    )
+    parser.add_argument(
+        "-l",
+        "--lengths",
+        nargs="+",
+        type=int,
+        default=[50, 300],
+        help="Sequence lengths of the benchmark inputs. Default is 50 300.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        nargs="+",
+        type=int,
+        default=[1, 4],
+        help="Worker counts for the dispatch stage. Default is 1 4.",
+    )
+    parser.add_argument(
+        "-n",
+        "--repeats",
+        type=int,
+        default=3,
+        help="Runs per measurement, the median run is reported. Default is 3.",
+    )
+    parser.add_argument(
+        "-L",
+        "--lines",
+        type=int,
+        default=5,
+        help="Result lines the stub algorithm prints per sequence. Default is 5.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default=None,
+        help="Store the measurements as JSON baseline at the given path. Default is None.",
+    )
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        type=str,
+        default=None,
+        help="Compare the measurements against a stored baseline. Default is None.",
+    )
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Allowed throughput loss against the baseline before the benchmark fails, as fraction. Default is 0.1.",
+    )
+    parser.add_argument(
+        "-v",
+        "--loglevel",
+        type=str,
+        default="warning",
+        choices=["debug", "info", "warning", "error", "critical"],
+        help="Logging level, info logs every measurement as it finishes. Default is warning.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    cmd_args = get_arguments()
+    RNALoops.make_new_logger(cmd_args.loglevel.upper(), __name__)
+    RNALoops.make_new_logger("warning", RNALoops.__name__)
+    measurements = run(
+        cmd_args.records, cmd_args.lengths, cmd_args.workers, cmd_args.stages, cmd_args.repeats, cmd_args.lines
+    )
+    slower = []  # type:list[dict]
+    if cmd_args.baseline:
+        slower = compare(measurements, load(cmd_args.baseline), cmd_args.tolerance)
+    print(header(cmd_args.baseline is not None))
+    for measurement in measurements:
+        print(format_row(measurement))
+    if cmd_args.output:
+        save([{k: v for k, v in m.items() if k != "change"} for m in measurements], cmd_args.output, cmd_args.repeats, cmd_args.lines)
+    if slower:
+        sys.stderr.write(f"{len(slower)} measurements are more than {cmd_args.tolerance:.0%} slower than {cmd_args.baseline}.\n")
+        sys.exit(1)
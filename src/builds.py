@@ -0,0 +1,180 @@
+# Cache of compiled algorithm binaries. Every build is stored in its own directory [cache]/[key]/[binary] next to a build.json describing it,
+# the key is the sha256 of the binary name, the compilation flags (gapc options, addRNAoptions.pl mode, custom compilation call) and the
+# content of the motif sources in Extensions (see sources). Builds for different parameter sets and compiled in motif tables therefore exist
+# side by side and a lookup is a single path check. Builds that were not used for a while are garbage collected, at most keep builds are kept (least recently used first).
+# Compilation runs in a private build directory inside the cache (a copy of Extensions, symlinks to the other sources) under a file lock per
+# key, concurrent builds neither clobber each other's intermediate files nor compile the same build twice.
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from time import time
+from typing import Generator, Optional
+
+stale_build = 86400  # seconds, interrupted build directories older than this get removed
+
+
+# gapc options of a RNALoops.gap instance, pfc instances only need kbest and subopt instances only kbacktrace
+def gapc_flags(instance: str) -> str:
+    if instance.endswith("pfc"):
+        return "-t --kbest"
+    elif instance.endswith("_subopt"):
+        return "-t --kbacktrace"
+    else:
+        return "-t --kbacktrace --kbest"
+
+
+# compiled in motif tables and the code reading them, the motif catalogue file loaded at runtime is not part of the build
+def sources(root: str) -> list[str]:
+    return [
+        os.path.join(root, "Extensions", name)
+        for name in ("mot_header.hh", "motif.hh", "motif_catalogue.hh", "motif_table.hh", "rnaoptions.hh")
+    ]
+
+
+# batch mode binaries are compiled with a different main function and need their own name next to the regular binary
+def binary_name(instance: str, batch: bool = False) -> str:
+    return f"{instance}_batch" if batch else instance
+
+
+# addRNAoptions.pl mode 3 swaps in Extensions/batch_main.cc as main function for batch mode binaries
+def compilation_mode(batch: bool = False) -> int:
+    return 3 if batch else 0
+
+
+# everything besides the motif header that changes the compiled binary, part of the build key
+def compilation_flags(instance: str, batch: bool = False) -> str:
+    return f"gapc {gapc_flags(instance)} mode {compilation_mode(batch)}"
+
+
+def compilation_call(instance: str, batch: bool = False) -> str:
+    binary = binary_name(instance, batch)
+    return f"gapc -o {binary}.cc {gapc_flags(instance)} -i {instance} RNALoops.gap; perl Misc/Applications/addRNAoptions.pl {binary}.mf {compilation_mode(batch)}; make -f {binary}.mf"
+
+
+class BuildCache:
+    def __init__(self, directory: str, keep: int = 16):
+        self.directory = directory  # type:str
+        self.keep = keep  # type:int
+        self.hits = 0  # type:int
+        self.stores = 0  # type:int
+        self.log = logging.getLogger(__name__)
+
+    @staticmethod
+    def build_key(binary: str, flags: str, source_paths: list[str]) -> str:
+        key = hashlib.sha256()
+        key.update(json.dumps([binary, flags]).encode())
+        for path in source_paths:
+            with open(path, "rb") as source:
+                key.update(hashlib.sha256(source.read()).digest())
+        return key.hexdigest()
+
+    def entry(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    # path of the cached binary or None, marks the build as recently used
+    def lookup(self, binary: str, key: str) -> Optional[str]:
+        path = os.path.join(self.entry(key), binary)
+        if not os.access(path, os.X_OK):
+            return None
+        try:
+            os.utime(os.path.join(self.entry(key), "build.json"))
+        except OSError:
+            pass
+        self.hits += 1
+        return path
+
+    # Moves a freshly compiled binary into the cache. The entry is assembled in a temporary directory and renamed into place, so concurrent
+    # runs never see a half written build. If another run stored the same build first, that one is kept.
+    def store(self, source: str, binary: str, key: str, info: dict) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = tempfile.mkdtemp(dir=self.directory, prefix=".build-")
+        try:
+            shutil.move(source, os.path.join(temporary, binary))
+            with open(os.path.join(temporary, "build.json"), "w") as manifest:
+                json.dump(dict(info, binary=binary, key=key, created=time()), manifest, indent=1)
+            os.chmod(temporary, 0o755)
+            os.replace(temporary, self.entry(key))
+        except OSError:
+            if not os.access(os.path.join(self.entry(key), binary), os.X_OK):
+                raise
+        finally:
+            shutil.rmtree(temporary, ignore_errors=True)
+        self.stores += 1
+        self.collect(protect=key)
+        return os.path.join(self.entry(key), binary)
+
+    # exclusive per key, held while a build is compiled and stored
+    @contextlib.contextmanager
+    def lock(self, key: str) -> Generator[None, None, None]:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f".{key}.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @contextlib.contextmanager
+    def build_directory(self, root: str) -> Generator[str, None, None]:
+        os.makedirs(self.directory, exist_ok=True)
+        directory = tempfile.mkdtemp(dir=self.directory, prefix=".build-")
+        try:
+            for name in os.listdir(root):
+                source = os.path.join(root, name)
+                if name == "Extensions":
+                    shutil.copytree(source, os.path.join(directory, name))
+                elif (os.path.isdir(source) and name not in ("cache", ".git")) or name.endswith(".gap"):
+                    os.symlink(source, os.path.join(directory, name))
+            yield directory
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    # Runs the compilation call in a private build directory with a make job budget and stores the binary. Raises RuntimeError with the
+    # compiler output if compilation fails.
+    def compile(self, root: str, call: str, binary: str, key: str, info: dict, jobs: Optional[int] = None) -> str:
+        with self.build_directory(root) as directory:
+            compilation = subprocess.run(
+                call,
+                shell=True,
+                cwd=directory,
+                env=dict(os.environ, MAKEFLAGS=f"-j{jobs or os.cpu_count() or 1}"),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            self.log.debug(compilation.stdout.decode())
+            built = os.path.join(directory, binary)
+            if compilation.returncode or not os.path.isfile(built):
+                raise RuntimeError(compilation.stderr.decode() or f"Compilation did not produce {binary}.")
+            return self.store(built, binary, key, info)
+
+    def builds(self) -> list[tuple[float, str]]:
+        if not os.path.isdir(self.directory):
+            return []
+        builds = []
+        for name in os.listdir(self.directory):
+            manifest = os.path.join(self.directory, name, "build.json")
+            if not name.startswith(".") and os.path.isfile(manifest):
+                builds.append((os.path.getmtime(manifest), name))
+        return sorted(builds, reverse=True)
+
+    # Removes builds beyond keep (least recently used first) and leftovers of interrupted stores. Returns the number of removed builds.
+    def collect(self, protect: Optional[str] = None) -> int:
+        removed = 0
+        for _, name in self.builds()[self.keep :]:
+            if name != protect:
+                shutil.rmtree(self.entry(name), ignore_errors=True)
+                removed += 1
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            path = self.entry(name)
+            if name.startswith(".build-") and time() - os.path.getmtime(path) > stale_build:
+                shutil.rmtree(path, ignore_errors=True)
+        return removed
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}: {self.directory}, {len(self.builds())}/{self.keep} builds, {self.hits} hits, {self.stores} stores"
@@ -0,0 +1,149 @@
+# Persistent, content addressed result cache for RNALoops predictions, stored in a single SQLite database.
+# Keys are the sha256 of the call parameters and the normalized sequence, every entry is additionally tagged with the motif catalogue
+# (motif version from config.ini and a hash of the motif catalogue file or Extensions/mot_header.hh). Entries of an older catalogue are
+# dropped on invalidate(), so a new motif catalogue automatically invalidates all previous results.
+# Inserts and last used updates are buffered and written in one transaction every commit_every records and on close, so the hot path
+# does not pay for a synchronous SQLite commit per record.
+import hashlib
+import os
+import sqlite3
+import zlib
+from time import time
+from typing import Optional
+
+
+class ResultCache:
+    commit_every = 256  # type:int # buffered writes per transaction
+
+    def __init__(self, path: str, parameters: str, catalogue: str, max_size: int):
+        self.path = path  # type:str
+        self.parameters = parameters  # type:str
+        self.catalogue = catalogue  # type:str
+        self.max_size = max_size  # type:int # in bytes of compressed output
+        self._connection = None  # type:Optional[sqlite3.Connection]
+        self._pid = None  # type:Optional[int]
+        self._pending = {}  # type:dict[str, tuple[str, bytes, int, float]] # buffered inserts by key
+        self._used = {}  # type:dict[str, float] # buffered last used updates by key
+
+    # motif catalogue tag, changes whenever the motif version gets updated or the catalogue file (or mot_header.hh) gets rewritten
+    @staticmethod
+    def catalogue_tag(motif_version: str, header_path: str) -> str:
+        with open(header_path, "rb") as header:
+            header_hash = hashlib.sha256(header.read()).hexdigest()
+        return f"{motif_version}:{header_hash}"
+
+    @staticmethod
+    def normalize(sequence: str) -> str:
+        return sequence.strip().upper().replace("T", "U")
+
+    # Connections are opened lazily and per process, since SQLite connections must not be shared between forked workers.
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._pid = os.getpid()
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, catalogue TEXT, output BLOB, size INTEGER, last_used REAL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def key(self, sequence: str) -> str:
+        return hashlib.sha256(
+            f"{self.parameters}\0{self.normalize(sequence)}".encode()
+        ).hexdigest()
+
+    def get(self, sequence: str) -> Optional[str]:
+        key = self.key(sequence)
+        if key in self._pending:
+            return zlib.decompress(self._pending[key][1]).decode()
+        row = self.connection.execute(
+            "SELECT output FROM results WHERE key = ? AND catalogue = ?", (key, self.catalogue)
+        ).fetchone()
+        if row is None:
+            return None
+        self._used[key] = time()
+        self._flush_if_full()
+        return zlib.decompress(row[0]).decode()
+
+    def put(self, sequence: str, output: str) -> None:
+        compressed = zlib.compress(output.encode())
+        self._pending[self.key(sequence)] = (self.catalogue, compressed, len(compressed), time())
+        self._flush_if_full()
+
+    def _flush_if_full(self) -> None:
+        if len(self._pending) + len(self._used) >= self.commit_every:
+            self.flush()
+
+    # writes all buffered inserts and last used updates in a single transaction
+    def flush(self) -> None:
+        if not self._pending and not self._used:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                [(key,) + entry for key, entry in self._pending.items()],
+            )
+            self.connection.executemany(
+                "UPDATE results SET last_used = ? WHERE key = ?", [(used, key) for key, used in self._used.items()]
+            )
+        self._pending.clear()
+        self._used.clear()
+
+    # removes all results computed with a different motif catalogue
+    def invalidate(self) -> int:
+        self.flush()
+        removed = self.connection.execute(
+            "DELETE FROM results WHERE catalogue != ?", (self.catalogue,)
+        ).rowcount
+        self.connection.commit()
+        return removed
+
+    # least recently used entries get removed until the cache fits into max_size again
+    def evict(self) -> int:
+        self.flush()
+        removed = self.connection.execute(
+            "DELETE FROM results WHERE key IN (SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS cumulative FROM results) WHERE cumulative > ?)",
+            (self.max_size,),
+        ).rowcount
+        self.connection.commit()
+        return removed
+
+    # adds the hits and misses of a run to the lifetime counters of the cache and returns the new totals
+    def count(self, hits: int, misses: int) -> dict[str, int]:
+        for name, value in (("hits", hits), ("misses", misses)):
+            self.connection.execute(
+                "INSERT INTO counters VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, value),
+            )
+        self.connection.commit()
+        return dict(self.connection.execute("SELECT name, value FROM counters").fetchall())
+
+    def close(self) -> None:
+        if self._pid is None or self._pid == os.getpid():
+            self.flush()
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._pid = None
+
+    # the open connection and the buffered writes stay in the process that opened it
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_pid"] = None
+        state["_pending"] = {}
+        state["_used"] = {}
+        return state
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}: {self.path}, {self.parameters}, {self.catalogue}"
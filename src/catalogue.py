@@ -0,0 +1,79 @@
+# Runtime motif catalogue file, loaded by the algorithms with -X [path] instead of the motif tables compiled in from Extensions/mot_header.hh
+# (see load_motif_catalogue in Extensions/motif.hh). All integers are little endian uint32:
+#   "RLMC" | format version | 32 byte motif version stamp | table count | table count x (16 byte name | offset | length) | table data
+# Tables carry the same "SEQUENCE,ABBREVIATION" lines as the header arrays and are named the same (hbgsu_fw, irfam_rv, ...), so a motif
+# update or a custom motif set only needs a new catalogue file instead of recompiling every algorithm.
+import mmap
+import os
+import struct
+import tempfile
+from typing import Optional
+
+MAGIC = b"RLMC"
+FORMAT = 1
+_header = struct.Struct("<4sI32sI")
+_entry = struct.Struct("<16sII")
+
+
+# tables in header order, name -> "SEQUENCE,ABBREVIATION" lines without trailing newline
+def write(tables: dict[str, str], path: str, version: str) -> None:
+    data_offset = _header.size + _entry.size * len(tables)
+    entries, blobs = [], []
+    for name, table in tables.items():
+        blob = table.encode("ascii")
+        entries.append(_entry.pack(name.encode("ascii"), data_offset, len(blob)))
+        blobs.append(blob)
+        data_offset += len(blob)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(dir=directory, suffix=".bin")
+    with os.fdopen(fd, "wb") as file:
+        file.write(_header.pack(MAGIC, FORMAT, version.encode("ascii")[:32], len(tables)))
+        file.write(b"".join(entries))
+        file.write(b"".join(blobs))
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temporary, 0o666 & ~umask)
+    os.replace(temporary, path)
+
+
+def _check(data: mmap.mmap, path: str) -> tuple[str, int]:
+    if len(data) < _header.size:
+        raise ValueError(f"{path} is too short to be a motif catalogue.")
+    magic, file_format, version, count = _header.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a motif catalogue.")
+    if file_format != FORMAT:
+        raise ValueError(f"Motif catalogue {path} has format {file_format}, expected format {FORMAT}.")
+    return version.rstrip(b"\0").decode("ascii"), count
+
+
+def version(path: str) -> str:
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return _check(data, path)[0]
+
+
+def read(path: str) -> tuple[str, dict[str, str]]:
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        stamp, count = _check(data, path)
+        tables = {}  # type:dict[str, str]
+        for i in range(count):
+            name, offset, length = _entry.unpack_from(data, _header.size + i * _entry.size)
+            name = name.rstrip(b"\0").decode("ascii")
+            if offset + length > len(data):
+                raise ValueError(f"Table {name} exceeds motif catalogue {path}.")
+            tables[name] = data[offset : offset + length].decode("ascii")
+    return stamp, tables
+
+
+def default_path(RNALoops_location: str) -> str:
+    return os.path.join(RNALoops_location, "Extensions", "mot_catalogue.bin")
+
+
+# configured catalogue or the default one, None if neither exists and the compiled in tables are used
+def resolve(path: Optional[str], RNALoops_location: str) -> Optional[str]:
+    if path:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Motif catalogue {path} does not exist.")
+        return os.path.abspath(path)
+    default = default_path(RNALoops_location)
+    return default if os.path.isfile(default) else None
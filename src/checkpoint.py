@@ -0,0 +1,87 @@
+# Checkpoint journal for file output. Every time the output sink flushes a batch of rows, the IDs of the records in that batch (plus the
+# records that failed or had no rows since the last batch) and the new size of the output file are committed to a SQLite journal next to
+# the output ([output].journal) in a single transaction, after the output itself was synced to disk. The journal therefore never lists a
+# record whose rows are not completely in the output file.
+# A resumed run truncates the output back to the journaled size, which drops rows written after the last commit, skips all journaled records
+# and appends to the output.
+import os
+import sqlite3
+from typing import Generator, Iterable, Optional
+from Bio.SeqRecord import SeqRecord
+
+
+class Journal:
+    def __init__(self, path: str):
+        self.path = path  # type:str
+        self._connection = None  # type:Optional[sqlite3.Connection]
+        self._pid = None  # type:Optional[int]
+
+    @staticmethod
+    def journal_path(output: str) -> str:
+        return f"{output}.journal"
+
+    # opened lazily and per process like cache.ResultCache, the writer may run in the listener process
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._pid = os.getpid()
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=FULL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS completed (id TEXT PRIMARY KEY)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value INTEGER)")
+            self._connection.commit()
+        return self._connection
+
+    # starts a new journal for a run that is not resumed
+    def reset(self) -> None:
+        self.connection.execute("DELETE FROM completed")
+        self.connection.execute("DELETE FROM state")
+        self.connection.commit()
+
+    def commit(self, ids: list[str], offset: int) -> None:
+        with self.connection:
+            self.connection.executemany("INSERT OR IGNORE INTO completed VALUES (?)", ((i,) for i in ids))
+            self.connection.execute(
+                "INSERT INTO state VALUES ('offset', ?) ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                (offset,),
+            )
+
+    @property
+    def offset(self) -> int:
+        row = self.connection.execute("SELECT value FROM state WHERE name = 'offset'").fetchone()
+        return row[0] if row else 0
+
+    def completed(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM completed").fetchone()[0]
+
+    # cuts the output back to the last journaled size, rows after it belong to records that are not journaled and get folded again
+    def truncate(self, output: str) -> int:
+        size = os.path.getsize(output) if os.path.exists(output) else 0
+        offset = min(self.offset, size)
+        with open(output, "a") as output_file:
+            output_file.truncate(offset)
+        return size - offset
+
+    # uses its own connection, the pool engine consumes the input iterator in a separate thread
+    def skip_completed(self, iterator: Iterable[SeqRecord]) -> Generator[SeqRecord, None, None]:
+        connection = sqlite3.connect(self.path, timeout=60)
+        for record in iterator:
+            if connection.execute("SELECT 1 FROM completed WHERE id = ?", (record.id,)).fetchone() is None:
+                yield record
+        connection.close()
+
+    def close(self) -> None:
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_pid"] = None
+        return state
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}: {self.path}"
@@ -0,0 +1,78 @@
+# Deduplication of input records for MultiProcess. Records sharing the same (transcribed) sequence are folded only once, the first record of
+# each group is dispatched and carries ordinal and ID of all other group members in record.duplicates. The writer fans the result out to them.
+# window keeps at most window records in memory and only deduplicates within them, spill indexes the whole input in a temporary SQLite file
+# first and deduplicates across all records.
+import hashlib
+import os
+import sqlite3
+import tempfile
+from typing import Generator, Iterable, Optional
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+
+# the sequence exactly as the algorithm will receive it, see RNALoops.fold
+def folded_sequence(record: SeqRecord) -> str:
+    if "T" in str(record.seq):
+        return str(record.seq.transcribe())
+    return str(record.seq)
+
+
+def window_groups(
+    iterator: Iterable[SeqRecord], window: int
+) -> Generator[SeqRecord, None, None]:
+    groups = {}  # type:dict[str, SeqRecord]
+    members = 0
+    for record in iterator:
+        sequence = folded_sequence(record)
+        if sequence in groups:
+            groups[sequence].duplicates.append((record.ordinal, record.id))
+        else:
+            record.duplicates = []
+            groups[sequence] = record
+        members += 1
+        if members >= window:
+            yield from groups.values()
+            groups = {}
+            members = 0
+    yield from groups.values()
+
+
+def spill_groups(
+    iterator: Iterable[SeqRecord], directory: Optional[str] = None
+) -> Generator[SeqRecord, None, None]:
+    with tempfile.TemporaryDirectory(dir=directory) as spill_dir:
+        connection = sqlite3.connect(os.path.join(spill_dir, "dedup.sqlite"))
+        connection.execute("PRAGMA journal_mode=OFF")
+        connection.execute("PRAGMA synchronous=OFF")
+        connection.execute(
+            "CREATE TABLE sequences (key TEXT PRIMARY KEY, ordinal INTEGER, id TEXT, sequence TEXT)"
+        )
+        connection.execute("CREATE TABLE members (key TEXT, ordinal INTEGER, id TEXT)")
+        for record in iterator:
+            ordinal = record.ordinal
+            sequence = folded_sequence(record)
+            key = hashlib.sha256(sequence.encode()).hexdigest()
+            inserted = connection.execute(
+                "INSERT OR IGNORE INTO sequences VALUES (?, ?, ?, ?)",
+                (key, ordinal, record.id, sequence),
+            ).rowcount
+            if not inserted:
+                connection.execute("INSERT INTO members VALUES (?, ?, ?)", (key, ordinal, record.id))
+        connection.execute("CREATE INDEX members_key ON members (key, ordinal)")
+        connection.commit()
+        # separate cursor for the member lookups, the outer cursor keeps streaming the distinct sequences in input order
+        distinct = connection.cursor().execute(
+            "SELECT key, ordinal, id, sequence FROM sequences ORDER BY ordinal"
+        )
+        for key, ordinal, record_id, sequence in distinct:
+            record = SeqRecord(Seq(sequence), id=record_id)
+            record.ordinal = ordinal
+            record.duplicates = [
+                (row[0], row[1])
+                for row in connection.execute(
+                    "SELECT ordinal, id FROM members WHERE key = ? ORDER BY ordinal", (key,)
+                )
+            ]
+            yield record
+        connection.close()
@@ -0,0 +1,90 @@
+# Reorder buffer for writing outputs in input order. Every record gets a sequence number (ordinal) before dispatch, outputs that arrive
+# before their predecessors wait in the buffer until all smaller ordinals are written. In spill mode outputs beyond the buffer capacity are
+# pickled into a temporary SQLite file instead of memory, in block mode MultiProcess keeps the buffer bounded by holding back dispatch.
+import os
+import pickle
+import sqlite3
+import tempfile
+from typing import Any, Generator, Iterable, Optional
+from Bio.SeqRecord import SeqRecord
+
+
+def numbered(iterator: Iterable[SeqRecord]) -> Generator[SeqRecord, None, None]:
+    for ordinal, record in enumerate(iterator):
+        record.ordinal = ordinal
+        yield record
+
+
+class ReorderBuffer:
+    def __init__(self, capacity: int, spill: bool = False, directory: Optional[str] = None):
+        self.capacity = capacity  # type:int
+        self.spill = spill  # type:bool
+        self.directory = directory  # type:Optional[str]
+        self.next = 0  # type:int # ordinal that gets written next
+        self.memory = {}  # type:dict[int, Any]
+        self.spilled = set()  # type:set[int]
+        self._spill_dir = None  # type:Optional[tempfile.TemporaryDirectory]
+        self._connection = None  # type:Optional[sqlite3.Connection]
+
+    # adds an output and returns all outputs that can be written now, in order
+    def push(self, ordinal: int, output: Any) -> list:
+        if ordinal == self.next or not self.spill or len(self.memory) < self.capacity:
+            self.memory[ordinal] = output
+        else:
+            self._spill(ordinal, output)
+        return self._ready()
+
+    def _ready(self) -> list:
+        ready = []
+        while True:
+            if self.next in self.memory:
+                ready.append(self.memory.pop(self.next))
+            elif self.next in self.spilled:
+                ready.append(self._unspill(self.next))
+            else:
+                break
+            self.next += 1
+        return ready
+
+    def _spill(self, ordinal: int, output: Any) -> None:
+        if self._connection is None:
+            self._spill_dir = tempfile.TemporaryDirectory(dir=self.directory)
+            self._connection = sqlite3.connect(os.path.join(self._spill_dir.name, "reorder.sqlite"))
+            self._connection.execute("PRAGMA journal_mode=OFF")
+            self._connection.execute("PRAGMA synchronous=OFF")
+            self._connection.execute("CREATE TABLE outputs (ordinal INTEGER PRIMARY KEY, output BLOB)")
+        self._connection.execute(
+            "INSERT INTO outputs VALUES (?, ?)", (ordinal, pickle.dumps(output))
+        )
+        self.spilled.add(ordinal)
+
+    def _unspill(self, ordinal: int) -> Any:
+        (data,) = self._connection.execute(
+            "SELECT output FROM outputs WHERE ordinal = ?", (ordinal,)
+        ).fetchone()
+        self._connection.execute("DELETE FROM outputs WHERE ordinal = ?", (ordinal,))
+        self.spilled.discard(ordinal)
+        return pickle.loads(data)
+
+    # remaining outputs in order, only non empty if ordinals went missing
+    def drain(self) -> list:
+        remaining = []
+        for ordinal in sorted(set(self.memory) | self.spilled):
+            if ordinal in self.memory:
+                remaining.append(self.memory.pop(ordinal))
+            else:
+                remaining.append(self._unspill(ordinal))
+        return remaining
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._spill_dir.cleanup()
+            self._connection = None
+            self._spill_dir = None
+
+    def __len__(self) -> int:
+        return len(self.memory) + len(self.spilled)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}: next {self.next}, {len(self.memory)} in memory, {len(self.spilled)} spilled"
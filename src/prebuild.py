@@ -0,0 +1,74 @@
+# Parallel prebuild of RNALoops.gap instances into the build cache, e.g. after a motif update. Every build is compiled in its own private
+# build directory under its build lock (see builds.BuildCache), workers builds run at the same time and share a budget of jobs make jobs.
+# Builds that are already cached for the current motif header are skipped.
+import concurrent.futures
+import logging
+import os
+import re
+from time import perf_counter
+from typing import Optional
+
+import builds
+
+
+def instances(gap_file: str) -> list[str]:
+    with open(gap_file) as gap:
+        return re.findall(r"^\s*instance\s+(\w+)\s*=", gap.read(), flags=re.MULTILINE)
+
+
+def _build(
+    root: str, cache: builds.BuildCache, instance: str, batch: bool, jobs: int, motifs: str
+) -> tuple[str, bool]:
+    log = logging.getLogger(__name__)
+    binary = builds.binary_name(instance, batch)
+    flags = builds.compilation_flags(instance, batch)
+    key = builds.BuildCache.build_key(binary, flags, builds.sources(root))
+    with cache.lock(key):
+        cached = cache.lookup(binary, key)
+        if cached:
+            log.info(f"{binary} is up to date: {cached}")
+            return binary, True
+        start = perf_counter()
+        try:
+            path = cache.compile(
+                root,
+                builds.compilation_call(instance, batch),
+                binary,
+                key,
+                {"algorithm": instance, "flags": flags, "motifs": motifs},
+                jobs,
+            )
+        except RuntimeError as error:
+            log.error(f"Compilation of {binary} failed: {error}")
+            return binary, False
+    log.info(f"Compiled {binary} in {perf_counter() - start:.1f}s: {path}")
+    return binary, True
+
+
+# Builds the given instances (all instances of RNALoops.gap for None) and their batch mode binaries if batch is set. Returns the binaries
+# that failed to compile.
+def prebuild(
+    root: str,
+    cache: builds.BuildCache,
+    names: Optional[list[str]] = None,
+    workers: Optional[int] = None,
+    jobs: Optional[int] = None,
+    batch: bool = False,
+    motifs: str = "",
+) -> list[str]:
+    available = instances(os.path.join(root, "RNALoops.gap"))
+    names = names or available
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown instances {', '.join(unknown)}, RNALoops.gap has: {', '.join(available)}")
+    variants = [(name, False) for name in names] + ([(name, True) for name in names] if batch else [])
+    # prebuilt variants must not evict each other
+    cache.keep = max(cache.keep, len(variants))
+    workers = max(1, min(workers or os.cpu_count() or 1, len(variants)))
+    jobs = max(1, (jobs or os.cpu_count() or 1) // workers)
+    logging.getLogger(__name__).info(
+        f"Building {len(variants)} binaries, {workers} at a time with {jobs} make jobs each..."
+    )
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        done = executor.map(lambda variant: _build(root, cache, *variant, jobs, motifs), variants)
+        return [binary for binary, success in done if not success]
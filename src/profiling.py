@@ -0,0 +1,141 @@
+# Per stage profile of a MultiProcess run (--profile). The main process times reading and parsing the input and putting the records into the
+# input queue (pickling and waiting for room, queue engine only), workers attach their timings (queue wait, subprocess, output parsing) and peak RSS to every output, and the
+# writer (listener process or main process) adds up those timings and its own write time. At the end of the run the profile is reported as
+# table on stderr and as JSON.
+# All stage times are summed over the processes they run in, the worker stages can therefore add up to workers times the run time.
+import json
+import os
+import resource
+import sys
+from time import perf_counter
+from typing import Generator, Iterable, Optional
+
+stages = ["input_parse", "dispatch", "queue_wait", "subprocess", "output_parse", "output_put", "write"]
+
+
+def peak_rss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # kB
+
+
+# Timings of one output, measured in the worker that folded it. queue_wait is the time the worker waited for the record, subprocess the
+# algorithm run (0 for cached results) and output_parse the time spent parsing the algorithm output into records.
+def output_profile(queue_wait: float, subprocess: float, output_parse: float) -> dict:
+    return {
+        "worker": os.getpid(),
+        "queue_wait": queue_wait,
+        "subprocess": subprocess,
+        "output_parse": output_parse,
+        "maxrss": peak_rss(),
+    }
+
+
+class Profile:
+    def __init__(self) -> None:
+        self.times = dict.fromkeys(stages, 0.0)  # type:dict[str, float] # seconds
+        self.records = 0  # type:int
+        self.workers = {}  # type:dict[int, dict] # pid -> records, busy seconds, peak RSS
+        self.processes = {}  # type:dict[str, int] # main, listener -> peak RSS in kB
+
+    # time spent in next() of the iterator counts as stage
+    def timed(self, iterator: Iterable, stage: str) -> Generator:
+        iterator = iter(iterator)
+        while True:
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.times[stage] += perf_counter() - start
+                return
+            self.times[stage] += perf_counter() - start
+            yield item
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.times[stage] += seconds
+
+    # outputs folded in this run, copies of deduplicated records and outputs without timings are not counted
+    def add_output(self, profile: Optional[dict]) -> None:
+        if profile is None:
+            return
+        self.records += 1
+        for stage in ("queue_wait", "subprocess", "output_parse"):
+            self.times[stage] += profile[stage]
+        worker = self.workers.setdefault(profile["worker"], {"records": 0, "busy": 0.0, "maxrss": 0})
+        worker["records"] += 1
+        worker["busy"] += profile["subprocess"] + profile["output_parse"]
+        worker["maxrss"] = max(worker["maxrss"], profile["maxrss"])
+
+    # worker totals that are not attached to outputs (queue engine workers report them when they finish)
+    def add_worker(self, pid: int, output_put: float, maxrss: int) -> None:
+        self.times["output_put"] += output_put
+        worker = self.workers.setdefault(pid, {"records": 0, "busy": 0.0, "maxrss": 0})
+        worker["maxrss"] = max(worker["maxrss"], maxrss)
+
+    def set_process(self, name: str) -> None:
+        self.processes[name] = peak_rss()
+
+    # profile of another process of the same run, e.g. the listener
+    def merge(self, other: "Profile") -> None:
+        for stage, seconds in other.times.items():
+            self.times[stage] += seconds
+        self.records += other.records
+        for pid, worker in other.workers.items():
+            own = self.workers.setdefault(pid, {"records": 0, "busy": 0.0, "maxrss": 0})
+            own["records"] += worker["records"]
+            own["busy"] += worker["busy"]
+            own["maxrss"] = max(own["maxrss"], worker["maxrss"])
+        self.processes.update(other.processes)
+
+    def report(self, elapsed: float, engine: str, workers: int) -> dict:
+        return {
+            "elapsed_s": round(elapsed, 6),
+            "engine": engine,
+            "workers": workers,
+            "records": self.records,
+            "records_per_s": round(self.records / elapsed, 3) if elapsed else None,
+            "stages_s": {stage: round(seconds, 6) for stage, seconds in self.times.items()},
+            "per_worker": [
+                {
+                    "pid": pid,
+                    "records": worker["records"],
+                    "busy_s": round(worker["busy"], 6),
+                    "records_per_s": round(worker["records"] / elapsed, 3) if elapsed else None,
+                    "utilization": round(worker["busy"] / elapsed, 4) if elapsed else None,
+                    "maxrss_kb": worker["maxrss"],
+                }
+                for pid, worker in sorted(self.workers.items())
+            ],
+            "maxrss_kb": dict(
+                self.processes, workers=max((worker["maxrss"] for worker in self.workers.values()), default=0)
+            ),
+        }
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}: {self.__dict__}"
+
+
+def table(report: dict) -> str:
+    elapsed = report["elapsed_s"]
+    lines = [
+        f"Profile: {report['records']} records in {elapsed:.3f}s ({report['records_per_s'] or 0:.1f} records/s) on {report['workers']} {report['engine']} workers",
+        f"{'stage':<15}{'seconds':>12}{'% of run':>10}",
+    ]
+    for stage, seconds in report["stages_s"].items():
+        lines.append(f"{stage:<15}{seconds:>12.3f}{seconds / elapsed if elapsed else 0:>10.1%}")
+    lines.append(f"{'worker':<15}{'records':>12}{'busy_s':>10}{'records/s':>11}{'busy':>8}{'maxrss_kb':>12}")
+    for worker in report["per_worker"]:
+        lines.append(
+            f"{worker['pid']:<15}{worker['records']:>12}{worker['busy_s']:>10.3f}{worker['records_per_s'] or 0:>11.2f}{worker['utilization'] or 0:>8.1%}{worker['maxrss_kb']:>12}"
+        )
+    lines.append("peak RSS " + ", ".join(f"{name} {rss} kB" for name, rss in report["maxrss_kb"].items()))
+    return "\n".join(lines) + "\n"
+
+
+# table on stderr, JSON into path or after the table for an empty path
+def write_report(report: dict, path: Optional[str]) -> None:
+    sys.stderr.write(table(report))
+    if path:
+        with open(path, "w") as file:
+            json.dump(report, file, indent=1)
+            file.write("\n")
+    else:
+        sys.stderr.write(json.dumps(report) + "\n")
@@ -0,0 +1,257 @@
+# Live progress of a MultiProcess run. The writer (listener or main process) counts written records and errors in shared memory, the main
+# process counts the records it reads and a reporter thread in the main process prints records done, throughput, queue depths, errors and ETA
+# to stderr every interval seconds (--progress). The same numbers can be scraped in Prometheus text format over HTTP from a local TCP port
+# or a Unix socket (--prometheus).
+# The ETA needs the number of records of the run. While the input is read it gets extrapolated from the records read so far and the bytes
+# of the input file the reader has consumed (compressed bytes for compressed input), once the input is read completely it is exact.
+# stdin has no size, its ETA is unknown until the input is exhausted.
+import http.server
+import logging
+import multiprocessing
+import os
+import socketserver
+import sys
+import threading
+from time import perf_counter
+from typing import BinaryIO, Callable, Generator, Iterable, Optional
+
+import results
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+# Position of the reader in the input file, set by the reader once it opened the file. The reporter thread polls it, so counting bytes
+# costs nothing on the read path.
+class InputBytes:
+    def __init__(self):
+        self.source = None  # type:Optional[BinaryIO] # raw input file, decompression reads from it
+        self.size = None  # type:Optional[int]
+
+    def open(self, source: BinaryIO) -> None:
+        self.size = os.fstat(source.fileno()).st_size
+        self.source = source
+
+    # bytes read from the input file so far, None before it is opened
+    def consumed(self) -> Optional[int]:
+        if self.source is None:
+            return None
+        try:
+            return self.source.tell()
+        except (ValueError, OSError):  # closed once the reader is done
+            return self.size
+
+
+class Progress:
+    def __init__(
+        self, workers: int, interval: float = 0, address: Optional[str] = None, input_bytes: Optional[InputBytes] = None
+    ):
+        self.workers = workers  # type:int
+        self.interval = interval  # type:float # seconds between progress lines, 0 prints none
+        self.address = address  # type:Optional[str] # [host:]port or unix:path of the metrics endpoint
+        self.done = multiprocessing.Value("q", 0)  # written records, including copies of deduplicated records
+        self.errors = multiprocessing.Value("q", 0)
+        self.read = 0  # type:int # records read from the input, deduplication and lpt scheduling hold some of them back before dispatch
+        self.exhausted = False  # type:bool # all input records are read
+        self.input_bytes = input_bytes  # type:Optional[InputBytes] # None for stdin
+        self._first = None  # type:Optional[tuple[int, int]] # records read and input bytes consumed at the first estimate
+        self.queues = None  # type:Optional[tuple] # input and output queue of the queue engine
+        self.start = perf_counter()  # type:float
+        self._stopped = threading.Event()
+        self._threads = []  # type:list[threading.Thread]
+        self._server = None  # type:Optional[socketserver.BaseServer]
+        self.log = logging.getLogger(__name__)
+
+    def track(self, iterator: Iterable) -> Generator:
+        for record in iterator:
+            self.read += 1
+            yield record
+        self.exhausted = True
+
+    # queues of the queue engine, reported until they are unwatched again at the end of the engine
+    def watch(self, input_q=None, output_q=None) -> None:
+        self.queues = (input_q, output_q) if input_q is not None else None
+
+    # called by the writer for every written output
+    def completed(self, output: "results.algorithm_output | results.error") -> None:
+        with self.done.get_lock():
+            self.done.value += 1
+        if isinstance(output, results.error):
+            with self.errors.get_lock():
+                self.errors.value += 1
+
+    def _queue_depths(self) -> tuple[Optional[int], Optional[int]]:
+        if self.queues is None:
+            return (None, None)
+        try:
+            return tuple(q.qsize() for q in self.queues)
+        except (OSError, EOFError):  # the Manager is shut down at the end of the run
+            return (None, None)
+
+    # Records of the run, extrapolated from the input bytes per record until the input is exhausted. The reader is always some buffers
+    # ahead of the records it yielded, bytes and records are therefore counted from the first sample on, which cancels that offset.
+    def expected(self) -> tuple[Optional[int], bool]:
+        if self.exhausted:
+            return (self.read, False)
+        if self.input_bytes is None:
+            return (None, True)
+        consumed = self.input_bytes.consumed()
+        if not consumed or not self.read:
+            return (None, True)
+        if self._first is None:
+            self._first = (self.read, consumed)
+        read, first = self._first
+        if consumed > first and self.read > read:
+            per_record = (consumed - first) / (self.read - read)
+            expected = read + (self.input_bytes.size - first) / per_record
+        else:
+            expected = self.read * self.input_bytes.size / consumed
+        return (max(round(expected), self.read), True)
+
+    def snapshot(self) -> dict:
+        elapsed = perf_counter() - self.start
+        done = self.done.value
+        expected, estimated = self.expected()
+        rate = done / elapsed if elapsed else 0.0
+        input_depth, output_depth = self._queue_depths()
+        return {
+            "elapsed": elapsed,
+            "done": done,
+            "errors": self.errors.value,
+            "read": self.read,
+            "expected": expected,
+            "estimated": estimated,
+            "rate": rate,
+            "eta": max(expected - done, 0) / rate if expected is not None and rate else None,
+            "input_queue": input_depth,
+            "output_queue": output_depth,
+            "in_flight": self.read - done,
+        }
+
+    @staticmethod
+    def line(snapshot: dict) -> str:
+        done = f"{snapshot['done']}"
+        if snapshot["expected"]:
+            done += f"/{'~' if snapshot['estimated'] else ''}{snapshot['expected']} records ({snapshot['done'] / snapshot['expected']:.1%})"
+        else:
+            done += " records"
+        queues = (
+            f"input queue {snapshot['input_queue']}, output queue {snapshot['output_queue']}"
+            if snapshot["input_queue"] is not None
+            else f"{snapshot['in_flight']} in flight"
+        )
+        eta = format_duration(snapshot["eta"]) if snapshot["eta"] is not None else "unknown"
+        return f"Progress: {done}, {snapshot['rate']:.2f} records/s, {snapshot['errors']} errors, {queues}, elapsed {format_duration(snapshot['elapsed'])}, ETA {eta}\n"
+
+    def prometheus(self) -> str:
+        snapshot = self.snapshot()
+        metrics = [
+            ("records_done_total", "counter", "Records written, including copies of deduplicated records.", snapshot["done"]),
+            ("records_read_total", "counter", "Records read from the input.", snapshot["read"]),
+            ("errors_total", "counter", "Records the algorithm failed on.", snapshot["errors"]),
+            ("records_expected", "gauge", "Records of the run, estimated from the input bytes read until the input is exhausted, -1 while unknown.", snapshot["expected"] if snapshot["expected"] is not None else -1),
+            ("records_per_second", "gauge", "Average throughput since the start of the run.", round(snapshot["rate"], 6)),
+            ("eta_seconds", "gauge", "Estimated seconds until the run completes, -1 while unknown.", round(snapshot["eta"], 3) if snapshot["eta"] is not None else -1),
+            ("elapsed_seconds", "gauge", "Seconds since the start of the run.", round(snapshot["elapsed"], 3)),
+            ("in_flight", "gauge", "Records read but not written yet.", snapshot["in_flight"]),
+            ("workers", "gauge", "Worker processes.", self.workers),
+            ("input_exhausted", "gauge", "1 once all input records are read.", int(self.exhausted)),
+        ]
+        if snapshot["input_queue"] is not None:
+            metrics += [
+                ("input_queue_depth", "gauge", "Records waiting in the input queue.", snapshot["input_queue"]),
+                ("output_queue_depth", "gauge", "Outputs waiting in the output queue.", snapshot["output_queue"]),
+            ]
+        return "".join(
+            f"# HELP rnaloops_{name} {description}\n# TYPE rnaloops_{name} {kind}\nrnaloops_{name} {value}\n"
+            for name, kind, description, value in metrics
+        )
+
+    def _thread(self, target: Callable) -> None:
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _report(self) -> None:
+        while not self._stopped.wait(self.interval):
+            sys.stderr.write(self.line(self.snapshot()))
+
+    def begin(self) -> None:
+        self.start = perf_counter()
+        if self.interval > 0:
+            self._thread(self._report)
+        if self.address:
+            self._server = serve(self.address, self)
+            self._thread(self._server.serve_forever)
+            self.log.info(f"Serving Prometheus metrics on {self.address}")
+
+    def end(self) -> None:
+        self._stopped.set()
+        if self.interval > 0:
+            sys.stderr.write(self.line(self.snapshot()))
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            if isinstance(self._server, UnixHTTPServer):
+                os.remove(self._server.server_address)
+            self._server = None
+
+    # the listener process only counts, reporter threads, server and queues stay in the main process
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_stopped"] = None
+        state["_threads"] = []
+        state["_server"] = None
+        state["queues"] = None
+        state["input_bytes"] = None
+        return state
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}: {self.read} read, {self.done.value} done, {self.errors.value} errors"
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    progress = None  # type:Optional[Progress] # set per server in serve
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.progress.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # scrapes are not logged, unix socket clients have no address to log anyway
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+# [host:]port listens on TCP (localhost without host), unix:path on a Unix socket
+def serve(address: str, progress: Progress) -> socketserver.BaseServer:
+    handler = type("Handler", (MetricsHandler,), {"progress": progress})
+    if address.startswith("unix:"):
+        path = address[len("unix:") :]
+        if os.path.exists(path):
+            os.remove(path)
+        return UnixHTTPServer(path, handler)
+    host, _, port = address.rpartition(":")
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError(f"Invalid metrics address {address}, expected [host:]port or unix:path.")
+    server = http.server.ThreadingHTTPServer((host or "127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
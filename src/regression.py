@@ -0,0 +1,349 @@
+# End-to-end golden output and performance regression harness over the RNALoops.gap instances, run with python3 regression.py.
+# Every instance folds a fixed corpus of sequences of increasing length (Misc/Test-Suite/RNALoops/corpus.fasta). The outputs are compared
+# against the golden files in Misc/Test-Suite/RNALoops/Truth ([instance].out, one "ID<tab>output line" per line), a run fails if an output
+# differs from its golden file. Wall time and peak RSS depend on the machine, they are only compared against
+# Misc/Test-Suite/RNALoops/performance.json with --performance warn (logged) or fail (fails the run if a run got slower beyond a noise floor
+# or larger than the tolerances allow), against a baseline recorded on the same machine. --update rewrites golden files and performance
+# baseline from the current run, after an intended change of the motifs, the grammar or Extensions/motif.hh.
+# Binaries come from the build cache and get compiled like with --prebuild if they are missing, all runs use the motif tables compiled
+# in from Extensions/mot_header.hh with fixed parameters, so the results only change with the sources that are part of the build.
+# --root builds and runs another checkout (e.g. a worktree of the base revision) to record its golden files and baseline.
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+from typing import Optional
+
+from Bio import SeqIO
+
+import RNALoops
+import benchmark
+import builds
+import prebuild
+
+BASELINE_FORMAT = 1
+noise_floor = 0.05  # seconds, wall time differences below this are never a regression
+
+
+def suite_path(root: str) -> str:
+    return os.path.join(root, "Misc", "Test-Suite", "RNALoops")
+
+
+def golden_file(suite: str, instance: str) -> str:
+    return os.path.join(suite, "Truth", f"{instance}.out")
+
+
+# fixed parameters like the RNALoops.py defaults, subopt instances with a small energy range to keep their output small
+def parameters(instance: str) -> str:
+    if instance.endswith("_subopt"):
+        parameters = "-e 1.0 -Q 3 -b 3"
+    else:
+        parameters = "-k 15 -Q 3 -b 3"
+    if instance == "motshapeX":
+        parameters += " -q 3"
+    return parameters
+
+
+# cached binary of every instance, missing builds are compiled first
+def binaries(root: str, cache: builds.BuildCache, instances: list[str], jobs: Optional[int]) -> dict[str, str]:
+    failed = prebuild.prebuild(root, cache, instances, jobs=jobs)
+    if failed:
+        raise RuntimeError(f"Could not compile {', '.join(failed)}.")
+    found = {}
+    for instance in instances:
+        key = builds.BuildCache.build_key(instance, builds.compilation_flags(instance), builds.sources(root))
+        found[instance] = cache.lookup(instance, key)
+    return found
+
+
+def read_golden(path: str) -> Optional[dict[str, list[str]]]:
+    if not os.path.isfile(path):
+        return None
+    golden = {}  # type:dict[str, list[str]]
+    with open(path) as file:
+        for line in file:
+            name, _, output = line.rstrip("\n").partition("\t")
+            golden.setdefault(name, []).append(output)
+    return golden
+
+
+def write_golden(path: str, outputs: dict[str, list[str]]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        for name, lines in outputs.items():
+            for line in lines:
+                file.write(f"{name}\t{line}\n")
+
+
+def output_lines(stdout: str) -> list[str]:
+    return [line.rstrip() for line in stdout.strip().split("\n")]
+
+
+# Folds one record with RNALoops.predict, returns exit status, stdout, stderr, wall time and peak RSS in kB.
+def run_record(call: str, record: RNALoops.SeqRecord) -> tuple[int, str, str, float, int]:
+    (returncode, stdout, error, usage) = RNALoops.predict(call, record)
+    return (returncode, stdout, error, usage.wall, usage.maxrss)
+
+
+# Folds every corpus record repeats times with one instance. Returns the output lines per record and one measurement per record with
+# median wall time and largest peak RSS of its runs.
+def run_instance(
+    instance: str, binary: str, corpus: list[RNALoops.SeqRecord], repeats: int
+) -> tuple[dict[str, list[str]], list[dict]]:
+    log = logging.getLogger(__name__)
+    call = f"{binary} {parameters(instance)}"
+    outputs = {}  # type:dict[str, list[str]]
+    measurements = []
+    for record in corpus:
+        walls, maxrss, status = [], 0, 0
+        for _ in range(repeats):
+            (returncode, stdout, stderr, wall, peak) = run_record(call, record)
+            walls.append(wall)
+            maxrss = max(maxrss, peak)
+            status = status or returncode
+        outputs[record.id] = output_lines(stdout) if not status else [f"error {status}: {stderr.strip()}"]
+        measurement = {
+            "instance": instance,
+            "id": record.id,
+            "length": len(record.seq),
+            "wall_s": round(statistics.median(walls), 6),
+            "maxrss_kb": maxrss,
+            "status": status,
+        }
+        log.info(format_row(measurement))
+        measurements.append(measurement)
+    return outputs, measurements
+
+
+def compare_outputs(outputs: dict[str, list[str]], golden: dict[str, list[str]]) -> list[str]:
+    return [name for name in outputs if name not in golden or golden[name] != outputs[name]]
+
+
+def key(measurement: dict) -> tuple:
+    return (measurement["instance"], measurement["id"])
+
+
+# Marks every measurement with its change against the baseline. Returns the measurements that are slower or larger than allowed.
+def compare_performance(measurements: list[dict], baseline: list[dict], tolerance: float, memory_tolerance: float) -> list[dict]:
+    known = {key(measurement): measurement for measurement in baseline}
+    regressed = []
+    for measurement in measurements:
+        reference = known.get(key(measurement))
+        if reference is None:
+            measurement["wall_change"] = measurement["maxrss_change"] = None
+            continue
+        measurement["wall_change"] = round(measurement["wall_s"] / reference["wall_s"] - 1, 4) if reference["wall_s"] else None
+        measurement["maxrss_change"] = (
+            round(measurement["maxrss_kb"] / reference["maxrss_kb"] - 1, 4) if reference["maxrss_kb"] else None
+        )
+        slower = measurement["wall_s"] > reference["wall_s"] * (1 + tolerance) + noise_floor
+        # runs too short to be sampled have no peak RSS
+        larger = bool(reference["maxrss_kb"]) and measurement["maxrss_kb"] > reference["maxrss_kb"] * (1 + memory_tolerance)
+        if slower or larger:
+            regressed.append(measurement)
+    return regressed
+
+
+def load(path: str) -> Optional[list[dict]]:
+    if not os.path.isfile(path):
+        return None
+    with open(path) as baseline:
+        content = json.load(baseline)
+    if content.get("format") != BASELINE_FORMAT:
+        raise ValueError(f"{path} has baseline format {content.get('format')}, expected format {BASELINE_FORMAT}.")
+    return content["measurements"]
+
+
+# measurements of instances that were not part of this run are kept
+def save(measurements: list[dict], path: str, repeats: int) -> None:
+    run_instances = {measurement["instance"] for measurement in measurements}
+    kept = [measurement for measurement in (load(path) or []) if measurement["instance"] not in run_instances]
+    columns = ("instance", "id", "length", "wall_s", "maxrss_kb", "status")
+    with open(path, "w") as baseline:
+        json.dump(
+            {
+                "format": BASELINE_FORMAT,
+                "environment": benchmark.environment(),
+                "repeats": repeats,
+                "measurements": kept + [{column: measurement[column] for column in columns} for measurement in measurements],
+            },
+            baseline,
+            indent=1,
+        )
+        baseline.write("\n")
+
+
+def format_change(change: Optional[float]) -> str:
+    return f"{change:>+9.1%}" if change is not None else f"{'new':>9}"
+
+
+def format_row(measurement: dict) -> str:
+    row = "{instance:<22}{length:>7}{wall_s:>11.3f}{maxrss_kb:>12}".format(**measurement)
+    if "wall_change" in measurement:
+        row += format_change(measurement["wall_change"]) + format_change(measurement["maxrss_change"])
+    return row
+
+
+def header(compared: bool) -> str:
+    row = f"{'instance':<22}{'length':>7}{'wall_s':>11}{'maxrss_kb':>12}"
+    return row + (f"{'wall':>9}{'maxrss':>9}" if compared else "")
+
+
+def get_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="regression.py",
+        description="Golden output and performance regression runs of the RNALoops.gap instances.",
+    )
+    parser.add_argument(
+        "-a",
+        "--instances",
+        nargs="+",
+        default=None,
+        help="Instances to run. Default is all instances of RNALoops.gap.",
+    )
+    parser.add_argument(
+        "-l",
+        "--max_length",
+        type=int,
+        default=None,
+        help="Only fold corpus sequences up to this length. Default is None (the whole corpus).",
+    )
+    parser.add_argument(
+        "-n",
+        "--repeats",
+        type=int,
+        default=3,
+        help="Runs per sequence, the median wall time and the largest peak RSS are reported. Default is 3.",
+    )
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help=f"Allowed wall time increase against the baseline as fraction, on top of a noise floor of {noise_floor}s. Default is 0.25.",
+    )
+    parser.add_argument(
+        "-m",
+        "--memory_tolerance",
+        type=float,
+        default=0.1,
+        help="Allowed peak RSS increase against the baseline as fraction. Default is 0.1.",
+    )
+    parser.add_argument(
+        "-p",
+        "--performance",
+        type=str,
+        default="off",
+        choices=["off", "warn", "fail"],
+        help="Compare wall time and peak RSS against the performance baseline and log regressions (warn) or fail the run on them (fail). Only meaningful against a baseline recorded on the same machine. Default is off.",
+    )
+    parser.add_argument(
+        "-u",
+        "--update",
+        action="store_true",
+        default=False,
+        help="Write golden files and performance baseline from this run instead of comparing against them. Default is False.",
+    )
+    parser.add_argument(
+        "-d",
+        "--suite",
+        type=str,
+        default=None,
+        help="Directory with corpus.fasta, the Truth folder and performance.json. Default is Misc/Test-Suite/RNALoops.",
+    )
+    parser.add_argument(
+        "-r",
+        "--root",
+        type=str,
+        default=None,
+        help="RNALoops checkout whose instances get built and run. Default is the checkout of this script.",
+    )
+    parser.add_argument(
+        "-bc",
+        "--build_cache",
+        type=str,
+        default=None,
+        help="Build cache directory. Default is cache/builds of the checkout given with --root or RNALoops/cache/builds.",
+    )
+    parser.add_argument(
+        "-Pj",
+        "--make_jobs",
+        type=int,
+        default=None,
+        help="Total number of make jobs for missing builds. Default is os.cpu_count()",
+    )
+    parser.add_argument(
+        "-v",
+        "--loglevel",
+        type=str,
+        default="warning",
+        choices=["debug", "info", "warning", "error", "critical"],
+        help="Logging level, info logs every measurement as it finishes. Default is warning.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    cmd_args = get_arguments()
+    log = RNALoops.make_new_logger(cmd_args.loglevel.upper(), __name__)
+    RNALoops.make_new_logger(cmd_args.loglevel.upper(), prebuild.__name__)
+    root = os.path.abspath(cmd_args.root) if cmd_args.root else RNALoops.Constants.get_RNALoops_path()
+    suite = cmd_args.suite or suite_path(RNALoops.Constants.get_RNALoops_path())
+    performance = cmd_args.performance != "off" and not cmd_args.update
+    instances = cmd_args.instances or prebuild.instances(os.path.join(root, "RNALoops.gap"))
+    corpus = [
+        record
+        for record in SeqIO.parse(os.path.join(suite, "corpus.fasta"), "fasta")
+        if cmd_args.max_length is None or len(record.seq) <= cmd_args.max_length
+    ]
+    baseline_path = os.path.join(suite, "performance.json")
+    if not cmd_args.update:
+        # nothing to compare against is a failure, not a pass, checked before any binary gets compiled
+        missing = [instance for instance in instances if not os.path.isfile(golden_file(suite, instance))]
+        if missing:
+            log.error(f"No golden files for {', '.join(missing)}, run with --update to create them.")
+        if performance and not os.path.isfile(baseline_path):
+            log.error(f"No performance baseline at {baseline_path}, run with --update to create it.")
+        if missing or (performance and not os.path.isfile(baseline_path)):
+            sys.exit(1)
+    # build keys only cover the Extensions sources, another checkout gets its own build cache so a changed grammar is never mixed up
+    cache = builds.BuildCache(cmd_args.build_cache or os.path.join(root, "cache", "builds"), max(16, len(instances)))
+    found = binaries(root, cache, instances, cmd_args.make_jobs)
+    baseline = load(baseline_path) if performance else None
+    mismatches = {}  # type:dict[str, list[str]]
+    measurements = []  # type:list[dict]
+    for instance in instances:
+        outputs, instance_measurements = run_instance(instance, found[instance], corpus, cmd_args.repeats)
+        measurements += instance_measurements
+        if cmd_args.update:
+            write_golden(golden_file(suite, instance), outputs)
+            continue
+        if differing := compare_outputs(outputs, read_golden(golden_file(suite, instance))):
+            mismatches[instance] = differing
+    regressed = []  # type:list[dict]
+    unknown = []  # type:list[dict] # measurements without reference in the baseline
+    if baseline is not None:
+        regressed = compare_performance(measurements, baseline, cmd_args.tolerance, cmd_args.memory_tolerance)
+        known = {key(measurement) for measurement in baseline}
+        unknown = [measurement for measurement in measurements if key(measurement) not in known]
+    print(header(baseline is not None))
+    for measurement in measurements:
+        print(format_row(measurement))
+    if cmd_args.update:
+        save(measurements, baseline_path, cmd_args.repeats)
+        log.warning(f"Wrote golden files and performance baseline of {len(instances)} instances to {suite}.")
+        sys.exit(0)
+    for instance, names in mismatches.items():
+        log.error(f"{instance}: output differs from its golden file for {', '.join(names)}.")
+    # with --performance warn slower or larger runs are only reported
+    report = log.error if cmd_args.performance == "fail" else log.warning
+    for measurement in regressed:
+        report(f"{measurement['instance']} {measurement['id']}: regression beyond tolerance ({format_row(measurement).strip()}).")
+    if unknown:
+        report(
+            f"{len(unknown)} runs have no reference in {baseline_path} ({', '.join(sorted({m['instance'] for m in unknown}))}), run with --update to add them."
+        )
+    failed = mismatches or (cmd_args.performance == "fail" and (regressed or unknown))
+    sys.exit(1 if failed else 0)
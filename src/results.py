@@ -1,22 +1,69 @@
 import sys
-from dataclasses import dataclass
+import copy
+import math
+import logging
+import numpy as np
+from dataclasses import dataclass, field, replace
+from typing import Optional
 
 
-class result:
-    def __init__(self, id: str, result_list: list) -> None:
-        self.id = id
-        self.cols = result_list
+# numbers in the algorithm output are kept as numbers, everything else (structures, shapes, motif strings) stays a string
+def typed(value: str) -> int | float | str:
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+LN10 = math.log(10)
+# natural logs of the largest and the smallest normal double
+MAX_LOG = math.log(sys.float_info.max)
+MIN_LOG = math.log(sys.float_info.min)
+
+
+# natural log of a non negative number printed by gapcM, taken from mantissa and exponent so values beyond double range stay finite
+def log_value(text: str) -> float:
+    mantissa, _, exponent = text.strip().lower().partition("e")
+    mantissa_value = float(mantissa)
+    if mantissa_value == 0:
+        return -math.inf
+    return math.log(mantissa_value) + int(exponent or 0) * LN10
+
+
+# inverse of log_value, printed like gapcM prints doubles (C++ stream default, 6 significant digits) also beyond double range in both
+# directions, values too large for a double would print as inf and values too small as 0 or with lost precision
+def format_log(log: float) -> str:
+    if math.isnan(log) or MIN_LOG <= log <= MAX_LOG:
+        return f"{math.exp(log):g}"
+    if math.isinf(log):
+        return "inf" if log > 0 else "0"
+    exponent = math.floor(log / LN10)
+    mantissa = f"{math.exp(log - exponent * LN10):.6g}"
+    if mantissa == "10":
+        mantissa, exponent = "1", exponent + 1
+    return f"{mantissa}e{exponent:+d}"
+
+
+# One line of algorithm output. gapcM prints the components of an algebra product separated by |, fields are the names of those components
+# and values their typed contents. cols are the string columns written to tsv output.
+class record:
+    __slots__ = ("id",)
+    fields = []  # type:list[str]
+
+    def values(self) -> list:
+        raise NotImplementedError
+
+    @property
+    def cols(self) -> list[str]:
+        raise NotImplementedError
 
     def tsv(self, separator: str):
         return self.id + separator + separator.join(self.cols) + "\n"
 
     def header(self, separator: str):
-        return (
-            "ID"
-            + separator
-            + separator.join([f"col{self.cols.index(x)}" for x in self.cols])
-            + "\n"
-        )
+        return "ID" + separator + separator.join(self.fields) + "\n"
 
     def write_tsv(self, separator: str) -> None:
         sys.stdout.write(self.tsv(separator))
@@ -24,23 +71,196 @@ class result:
     def write_header(self, separator: str) -> None:
         sys.stdout.write(self.header(separator))
 
+    # copy of the record for another record ID, used to fan out deduplicated records
+    def renamed(self, name: str) -> "record":
+        renamed_record = copy.copy(self)
+        renamed_record.id = name
+        return renamed_record
+
+
+# Generic record with string columns col0..colN, used for custom algorithms and output lines the typed records can not parse.
+class result(record):
+    __slots__ = ("cols",)
+
+    def __init__(self, id: str, result_list: list) -> None:
+        self.id = id
+        self.cols = result_list
+
+    @classmethod
+    def parse(cls, id: str, line: str) -> "result":
+        return cls(id, [x.strip() for x in line.split("|")])
+
+    @property
+    def fields(self) -> list[str]:
+        return [f"col{i}" for i in range(len(self.cols))]
+
+    def values(self) -> list:
+        return [typed(x) for x in self.cols]
+
+
+# Typed records of the prebuild instances in RNALoops.gap. The classifier is the motif string, the shape or the hishape of a structure,
+# depending on the instance. mfe instances print classifier | energy | motif bracket, pfc instances classifier | partition function value.
+class mfe_result(record):
+    __slots__ = ("classifier", "energy", "structure")
+    fields = ["classifier", "energy", "structure"]
+
+    def __init__(self, id: str, classifier: str, energy: int, structure: str) -> None:
+        self.id = id
+        self.classifier = classifier
+        self.energy = energy  # dcal/mol
+        self.structure = structure
+
+    @classmethod
+    def parse(cls, id: str, line: str) -> "mfe_result":
+        classifier, energy, structure = [x.strip() for x in line.split("|")]
+        return cls(id, classifier, int(energy), structure)
+
+    def values(self) -> list:
+        return [self.classifier, self.energy, self.structure]
+
+    @property
+    def cols(self) -> list[str]:
+        return [self.classifier, str(self.energy), self.structure]
+
+
+# partition function values are kept as natural logs, long sequences can exceed double range
+class pfc_result(record):
+    __slots__ = ("classifier", "log_partition", "probability")
+    fields = ["classifier", "partition", "probability"]
+
+    def __init__(self, id: str, classifier: str, log_partition: float, probability: Optional[float] = None) -> None:
+        self.id = id
+        self.classifier = classifier
+        self.log_partition = log_partition
+        self.probability = probability  # set by pfc_probabilities
+
+    @classmethod
+    def parse(cls, id: str, line: str) -> "pfc_result":
+        classifier, partition = [x.strip() for x in line.split("|")]
+        return cls(id, classifier, log_value(partition))
+
+    # inf beyond double range, log_partition stays exact
+    @property
+    def partition(self) -> float:
+        try:
+            return math.exp(self.log_partition)
+        except OverflowError:
+            return math.inf
+
+    def values(self) -> list:
+        return [self.classifier, self.partition, self.probability]
+
+    @property
+    def cols(self) -> list[str]:
+        cols = [self.classifier, format_log(self.log_partition)]
+        if self.probability is not None:
+            cols.append(str(round(self.probability, 5)))
+        return cols
+
+
+class motif_mfe_result(mfe_result):
+    __slots__ = ()
+    fields = ["motif", "energy", "structure"]
+
+
+class shape_mfe_result(mfe_result):
+    __slots__ = ()
+    fields = ["shape", "energy", "structure"]
+
+
+class hishape_mfe_result(mfe_result):
+    __slots__ = ()
+    fields = ["hishape", "energy", "structure"]
+
+
+class motif_pfc_result(pfc_result):
+    __slots__ = ()
+    fields = ["motif", "partition", "probability"]
+
+
+class shape_pfc_result(pfc_result):
+    __slots__ = ()
+    fields = ["shape", "partition", "probability"]
+
+
+class hishape_pfc_result(pfc_result):
+    __slots__ = ()
+    fields = ["hishape", "partition", "probability"]
+
+
+# record type of every instance in RNALoops.gap, algorithms missing here use the generic result
+instance_records = {
+    "motmfepretty": motif_mfe_result,
+    "motmfepretty_subopt": motif_mfe_result,
+    "motshapeX": shape_mfe_result,
+    "motshapeX_subopt": shape_mfe_result,
+    "mothishape_h": hishape_mfe_result,
+    "mothishape_m": hishape_mfe_result,
+    "mothishape_b": hishape_mfe_result,
+    "mothishape_h_subopt": hishape_mfe_result,
+    "mothishape_m_subopt": hishape_mfe_result,
+    "mothishape_b_subopt": hishape_mfe_result,
+    "motpfc": motif_pfc_result,
+    "motshapeX_pfc": shape_pfc_result,
+    "mothishape_h_pfc": hishape_pfc_result,
+    "mothishape_m_pfc": hishape_pfc_result,
+    "mothishape_b_pfc": hishape_pfc_result,
+}  # type:dict[str, type[record]]
+
+
+# Resource usage of one algorithm run, CPU times from os.wait4 (or /proc for batch mode instances) and peak RSS from os.wait4 or /proc (see
+# RNALoops.PeakRSS), 0 where it could not be measured.
+@dataclass
+class usage:
+    wall: float  # seconds
+    user: float  # seconds
+    sys: float  # seconds
+    maxrss: int  # kB
+    status: int
+
+    columns = ["wall_s", "user_s", "sys_s", "maxrss_kb", "exit_status"]
+
+    def row(self) -> list[str]:
+        return [
+            f"{self.wall:.6f}",
+            f"{self.user:.6f}",
+            f"{self.sys:.6f}",
+            str(self.maxrss),
+            str(self.status),
+        ]
+
+    def __str__(self) -> str:
+        return f"real {self.wall:.3f}s user {self.user:.3f}s sys {self.sys:.3f}s maxrss {self.maxrss}kB exit {self.status}\n"
+
 
 @dataclass
 class error:
     id: str
     error: str
+    duplicates: list = field(default_factory=list)  # (ordinal, ID) of deduplicated records sharing this records sequence
+    usage: Optional[usage] = None
+    ordinal: Optional[int] = None  # input position of the record
+    duplicate: bool = False  # True for copies fanned out to deduplicated records
+    profile: Optional[dict] = None  # worker timings with --profile, see profiling.output_profile
+
+    def renamed(self, name: str, ordinal: Optional[int] = None) -> "error":
+        return replace(self, id=name, duplicates=[], ordinal=ordinal, duplicate=True)
 
 
 class algorithm_output:
+    pfc = False  # set with set_pfc, probabilities are calculated by the engines for whole batches of outputs with pfc_probabilities
+    cached = False  # set on outputs that were answered from the result cache
+    duplicates = []  # (ordinal, ID) of deduplicated records sharing this records sequence, set per output
+    ordinal = None  # type:Optional[int] # input position of the record
+    duplicate = False  # True for copies fanned out to deduplicated records
+    usage = None  # type:Optional[usage] # resource usage of the algorithm run, None for cached outputs
+    profile = None  # type:Optional[dict] # worker timings with --profile, see profiling.output_profile
+    record_type = result  # type:type[record] # set per algorithm with set_algorithm
+
     def __init__(self, name: str, result_str: str, time_str: str):
         self.id = name
-        self.results = self._format_results(result_str)  # type:list[result]
+        self.results = self._format_results(result_str)  # type:list[record]
         self.time_str = time_str
-        try:
-            if self.pfc:
-                self.calculate_pfc_probabilities()
-        except:
-            pass
 
     @classmethod
     def set_pfc(cls, pfc_bool: bool):
@@ -50,13 +270,18 @@ class algorithm_output:
     def set_time(cls, time_bool: bool):
         cls.time = time_bool
 
-    def _format_results(self, result_str: str) -> list[result]:
+    @classmethod
+    def set_algorithm(cls, algorithm: str, custom: bool = False):
+        cls.record_type = result if custom else instance_records.get(algorithm, result)
+
+    def _format_results(self, result_str: str) -> list[record]:
         reslist = []
         split = result_str.strip().split("\n")
         for output in split:
-            split_result = output.split("|")
-            split_stripped_results = [x.strip() for x in split_result]
-            res = result(self.id, split_stripped_results)
+            try:
+                res = self.record_type.parse(self.id, output)
+            except ValueError:
+                res = result.parse(self.id, output)
             reslist.append(res)
         return reslist
 
@@ -65,12 +290,25 @@ class algorithm_output:
             self.results[0].write_header(separator)
         for result_obj in self.results:
             result_obj.write_tsv(separator)
+        self.write_time()
+        return True
+
+    def write_time(self) -> None:
         try:
             if self.time:
                 sys.stderr.write(f"{self.id}: {self.time_str}")
         except:
             pass
-        return True
+
+    # copy of the output for another record ID, used to fan out deduplicated records
+    def renamed(self, name: str, ordinal: Optional[int] = None) -> "algorithm_output":
+        output = copy.copy(self)
+        output.id = name
+        output.ordinal = ordinal
+        output.duplicate = True
+        output.duplicates = []
+        output.results = [result_obj.renamed(name) for result_obj in self.results]
+        return output
 
     def get_result_list(self, separator):
         return [x.tsv(separator) for x in self.results]
@@ -78,11 +316,51 @@ class algorithm_output:
     def get_header(self, separator: str):
         return self.results[0].header(separator)
 
+    # single outputs only, batches of outputs should go through pfc_probabilities at once
     def calculate_pfc_probabilities(self) -> None:
-        pfc_list = []
-        for result_obj in self.results:
-            pfc_val = float(result_obj.cols[-1])
-            pfc_list.append(pfc_val)
-        pfc_sum = sum(pfc_list)
-        for result_obj in self.results:
-            result_obj.cols.append(str(round(float(result_obj.cols[-1]) / pfc_sum, 5)))
+        pfc_probabilities([self])
+
+
+# Shape (or motif) probabilities of pfc outputs, each partition value divided by the sum of all partition values of its output.
+# All records of all given outputs are handled at once as one NumPy array in log space: every output is shifted by its largest log partition
+# value before exponentiation (log-sum-exp), so neither huge nor tiny partition values overflow or lose the smaller terms.
+# Generic records of custom pfc algorithms get their probability appended as last string column. Outputs whose last column is not a number
+# (e.g. an error message) get no probabilities and a warning, outputs whose partition values are all 0 get probability 0 and a warning.
+def pfc_probabilities(outputs: list[algorithm_output]) -> None:
+    logs = []  # type:list[float]
+    sizes = []  # type:list[int]
+    valid = []  # type:list[algorithm_output]
+    for output in outputs:
+        try:
+            output_logs = [
+                result_obj.log_partition if isinstance(result_obj, pfc_result) else log_value(result_obj.cols[-1])
+                for result_obj in output.results
+            ]
+        except (ValueError, IndexError):
+            logging.getLogger(__name__).warning(f"{output.id}: no partition function values found, skipping probabilities.")
+            continue
+        logs.extend(output_logs)
+        sizes.append(len(output_logs))
+        valid.append(output)
+    if not valid:
+        return
+    log_array = np.array(logs, dtype=np.float64)
+    starts = np.cumsum([0] + sizes[:-1])
+    maxima = np.maximum.reduceat(log_array, starts)
+    empty = maxima == -np.inf  # all partition values 0, shifting by -inf would give nan
+    maxima[empty] = 0.0
+    with np.errstate(under="ignore", invalid="ignore"):
+        shifted = np.exp(log_array - np.repeat(maxima, sizes))
+    sums = np.repeat(np.add.reduceat(shifted, starts), sizes)
+    probabilities = np.divide(shifted, sums, out=np.zeros_like(shifted), where=sums > 0).tolist()
+    for output, zero in zip(valid, empty):
+        if zero:
+            logging.getLogger(__name__).warning(f"{output.id}: all partition function values are 0, probabilities set to 0.")
+    position = 0
+    for output in valid:
+        for result_obj in output.results:
+            if isinstance(result_obj, pfc_result):
+                result_obj.probability = probabilities[position]
+            else:
+                result_obj.cols.append(str(round(probabilities[position], 5)))
+            position += 1
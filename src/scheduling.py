@@ -0,0 +1,69 @@
+# Dispatch order of input records for MultiProcess. Folding with the macrostate grammar grows roughly cubically with sequence length,
+# so a long sequence at the end of a file in file order keeps one worker busy while all others idle.
+import heapq
+import itertools
+from typing import Callable, Generator, Iterable
+from Bio.SeqRecord import SeqRecord
+
+
+def estimated_cost(record: SeqRecord) -> int:
+    return len(record.seq) ** 3
+
+
+# Longest processing time first within a bounded look-ahead window: up to window records are read ahead and always the most expensive one
+# gets dispatched next. Memory stays bounded by the window size, records with the same cost keep their file order.
+def longest_first(
+    iterator: Iterable[SeqRecord],
+    window: int,
+    cost: Callable[[SeqRecord], int] = estimated_cost,
+) -> Generator[SeqRecord, None, None]:
+    heap = []  # type:list[tuple[int, int, SeqRecord]]
+    counter = itertools.count()
+    for record in iterator:
+        heapq.heappush(heap, (-cost(record), next(counter), record))
+        if len(heap) >= window:
+            yield heapq.heappop(heap)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+# Keeps track of the dispatch order and simulates greedy list scheduling of the records on the workers with the cost model above.
+# The estimated makespan can then be compared to its lower bound (perfect balancing or the single most expensive record).
+class Makespan:
+    def __init__(self, workers: int, cost: Callable[[SeqRecord], int] = estimated_cost):
+        self.workers = workers
+        self.cost = cost
+        self.loads = [0] * workers  # type:list[int]
+        self.total = 0  # type:int
+        self.longest = 0  # type:int
+        self.records = 0  # type:int
+
+    def track(self, iterator: Iterable[SeqRecord]) -> Generator[SeqRecord, None, None]:
+        for record in iterator:
+            cost = self.cost(record)
+            heapq.heappush(self.loads, heapq.heappop(self.loads) + cost)
+            self.total += cost
+            self.longest = max(self.longest, cost)
+            self.records += 1
+            yield record
+
+    @property
+    def estimated(self) -> int:
+        return max(self.loads)
+
+    @property
+    def lower_bound(self) -> float:
+        return max(self.total / self.workers, self.longest)
+
+    def report(self, wall_time: float) -> str:
+        if not self.records:
+            return f"Makespan: {wall_time:.3f}s, no records dispatched."
+        return "Makespan: {wall:.3f}s for {n} records on {w} workers, estimated cost makespan is {ratio:.3f}x its lower bound.".format(
+            wall=wall_time,
+            n=self.records,
+            w=self.workers,
+            ratio=self.estimated / self.lower_bound if self.lower_bound else 1.0,
+        )
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}: {self.__dict__}"
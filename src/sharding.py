@@ -0,0 +1,103 @@
+# Deterministic input sharding for runs spread over several nodes. N invocations with --shard 0/N to --shard N-1/N on the same input file
+# each fold a disjoint part of it, either every N-th record by ordinal or by a stable hash of the record ID (independent of input order).
+# merge combines the shard outputs into one file with a single header.
+import hashlib
+import itertools
+import logging
+import shutil
+import sys
+from typing import Generator, Iterable, Optional
+from Bio.SeqRecord import SeqRecord
+
+import sinks
+
+
+# parses i/N, shards are counted from 0 to N-1
+def parse_shard(shard: str) -> tuple[int, int]:
+    index, _, count = shard.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"Invalid shard {shard}, expected i/N.")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {shard}, i has to be between 0 and N-1.")
+    return index, count
+
+
+# python's hash() is salted per process, shards on different nodes need the same assignment
+def stable_hash(record_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(record_id.encode(), digest_size=8).digest(), "big")
+
+
+def select(
+    iterator: Iterable[SeqRecord], index: int, count: int, strategy: str = "ordinal"
+) -> Generator[SeqRecord, None, None]:
+    match strategy:
+        case "ordinal":
+            yield from itertools.islice(iterator, index, None, count)
+        case "hash":
+            for record in iterator:
+                if stable_hash(record.id) % count == index:
+                    yield record
+        case _:
+            raise ValueError(f"Unknown sharding strategy: {strategy}")
+
+
+# Concatenates shard outputs of the same output format. tsv keeps only the header of the first shard, parquet and arrow are copied batch by
+# batch (one row group per batch) into a single file with the schema of the first shard.
+def merge(inputs: list[str], output: Optional[str] = None, output_format: str = "tsv") -> None:
+    sinks.check_sink(output_format, output)
+    match output_format:
+        case "tsv" | "jsonl":
+            _merge_text(inputs, output, output_format == "tsv")
+        case "parquet":
+            _merge_parquet(inputs, output)
+        case "arrow":
+            _merge_arrow(inputs, output)
+    logging.getLogger(__name__).info(f"Merged {len(inputs)} shard outputs into {output or 'stdout'}.")
+
+
+def _merge_text(inputs: list[str], output: Optional[str], header: bool) -> None:
+    merged = open(output, "w") if output and output != "-" else sys.stdout
+    header_line = None
+    for path in inputs:
+        with open(path) as shard:
+            if header:
+                first = shard.readline()
+                if not first:
+                    continue
+                if header_line is None:
+                    header_line = first
+                    merged.write(first)
+                elif first != header_line:
+                    raise ValueError(f"Header of {path} does not match the header of {inputs[0]}.")
+            shutil.copyfileobj(shard, merged)
+    if merged is not sys.stdout:
+        merged.close()
+
+
+def _merge_parquet(inputs: list[str], output: str) -> None:
+    pyarrow = sinks.load_pyarrow()
+    writer = None
+    for path in inputs:
+        shard = pyarrow.parquet.ParquetFile(path)
+        if writer is None:
+            writer = pyarrow.parquet.ParquetWriter(output, shard.schema_arrow, compression="zstd")
+        for batch in shard.iter_batches():
+            writer.write_table(pyarrow.Table.from_batches([batch]).cast(writer.schema), row_group_size=len(batch))
+    if writer is not None:
+        writer.close()
+
+
+def _merge_arrow(inputs: list[str], output: str) -> None:
+    pyarrow = sinks.load_pyarrow()
+    writer = None
+    for path in inputs:
+        with pyarrow.ipc.open_file(path) as shard:
+            if writer is None:
+                writer = pyarrow.ipc.new_file(output, shard.schema)
+                schema = shard.schema
+            for i in range(shard.num_record_batches):
+                writer.write_table(pyarrow.Table.from_batches([shard.get_batch(i)]).cast(schema))
+    if writer is not None:
+        writer.close()
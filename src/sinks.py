@@ -0,0 +1,278 @@
+# Output sinks for algorithm outputs. Every result record becomes one row of ID plus the record fields, prebuild instances have typed fields
+# (see results.instance_records), custom algorithms the string columns col0..colN. Rows are buffered and written batch_rows at a time,
+# instead of one write (and flush) per line.
+# tsv keeps the classic separated text output, jsonl writes one JSON object per row, parquet and arrow write typed columnar files with one
+# row group / record batch per buffered batch. parquet and arrow need pyarrow, which is an optional dependency and only gets imported once a
+# columnar format is chosen, it would slow down the start of every other run.
+import importlib.util
+import json
+import logging
+import math
+import os
+import sys
+from typing import Any, Optional, TextIO
+
+import checkpoint
+import results
+
+pyarrow = None  # set by load_pyarrow
+
+formats = ["tsv", "jsonl", "parquet", "arrow"]
+columnar_formats = ["parquet", "arrow"]
+
+
+class Sink:
+    def __init__(self, path: Optional[str] = None, batch_rows: int = 4096):
+        self.path = path if path and path != "-" else None  # type:Optional[str] # None writes to stdout
+        self.batch_rows = batch_rows  # type:int
+        self.rows = []  # type:list[results.record]
+        self.written = 0  # type:int
+        self.log = logging.getLogger(__name__)
+
+    def add(self, output: "results.algorithm_output") -> None:
+        if not output.results:
+            self.skip(output.id)
+        self.rows.extend(output.results)
+        if len(self.rows) >= self.batch_rows:
+            self.flush()
+
+    # records that are done without any row (failed records, empty outputs)
+    def skip(self, record_id: str) -> None:
+        pass
+
+    def flush(self) -> None:
+        if self.rows:
+            self._write_rows(self.rows)
+            self.written += len(self.rows)
+            self.rows = []
+
+    def _write_rows(self, rows: "list[results.record]") -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.flush()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}: {self.path or 'stdout'}, {self.written} rows written, {len(self.rows)} buffered"
+
+
+# Text sinks writing to a file can keep a checkpoint journal. With resume they append to the (already truncated) output instead of
+# overwriting it, the header is only written into an empty file.
+class TextSink(Sink):
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        batch_rows: int = 4096,
+        journal: Optional[checkpoint.Journal] = None,
+        resume: bool = False,
+    ):
+        super().__init__(path, batch_rows)
+        self.stream = open(self.path, "a" if resume else "w") if self.path else sys.stdout  # type:TextIO
+        self.journal = journal  # type:Optional[checkpoint.Journal]
+        self.skipped = []  # type:list[str] # IDs of records without rows, journaled with the next batch
+        self.header_written = bool(self.path) and self.stream.tell() > 0  # type:bool
+        if self.journal is not None and not resume:
+            self.journal.reset()
+
+    def _write_rows(self, rows: "list[results.record]") -> None:
+        self.stream.write("".join(self._line(row) for row in rows))
+        self.stream.flush()
+        if self.journal is not None:
+            os.fsync(self.stream.fileno())
+            self._commit([row.id for row in rows])
+
+    # failed records are journaled as completed too, a resumed run does not fold them again
+    def skip(self, record_id: str) -> None:
+        if self.journal is not None:
+            self.skipped.append(record_id)
+            if len(self.skipped) >= self.batch_rows:
+                self._commit([])
+
+    def _commit(self, ids: list[str]) -> None:
+        self.journal.commit(ids + self.skipped, self.stream.tell())
+        self.skipped = []
+
+    def _line(self, row: "results.record") -> str:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        super().close()
+        if self.journal is not None and self.skipped:
+            self._commit([])
+        if self.path:
+            self.stream.close()
+        if self.journal is not None:
+            self.journal.close()
+
+
+class TsvSink(TextSink):
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        batch_rows: int = 4096,
+        separator: str = "\t",
+        journal: Optional[checkpoint.Journal] = None,
+        resume: bool = False,
+    ):
+        super().__init__(path, batch_rows, journal, resume)
+        self.separator = separator  # type:str
+
+    def _write_rows(self, rows: "list[results.record]") -> None:
+        if not self.header_written:
+            self.stream.write(rows[0].header(self.separator))
+            self.header_written = True
+        super()._write_rows(rows)
+
+    def _line(self, row: "results.record") -> str:
+        return row.tsv(self.separator)
+
+
+# Infinity and NaN are no valid JSON. Values beyond double range (e.g. partition function values like 1.5e+400) are written as the string
+# the tsv sink writes for them, NaN as null.
+class JsonlSink(TextSink):
+    def _line(self, row: "results.record") -> str:
+        values = row.values()
+        if any(isinstance(value, float) and not math.isfinite(value) for value in values):
+            cols = row.cols
+            values = [self._finite(value, cols[i] if i < len(cols) else None) for i, value in enumerate(values)]
+        return json.dumps(dict(zip(["ID"] + row.fields, [row.id] + values)), allow_nan=False) + "\n"
+
+    @staticmethod
+    def _finite(value: Any, col: Optional[str]) -> Any:
+        if isinstance(value, float) and not math.isfinite(value):
+            return None if math.isnan(value) else col
+        return value
+
+
+# Columnar sinks fix their schema with the first batch: a column is int64 or float64 if all its values in the first batch are numbers,
+# otherwise string. Typed records always fit, values of generic records that do not fit their column type are written as null.
+class ColumnarSink(Sink):
+    def __init__(self, path: Optional[str] = None, batch_rows: int = 4096):
+        super().__init__(path, batch_rows)
+        load_pyarrow()
+        self.schema = None  # type:Optional[pyarrow.Schema]
+        self.writer = None  # type:Any
+        self.mismatches = 0  # type:int
+
+    def _infer_schema(self, rows: "list[results.record]") -> "pyarrow.Schema":
+        fields = [pyarrow.field("ID", pyarrow.string())]
+        columns = list(zip(*(row.values() for row in rows)))
+        for name, values in zip(rows[0].fields, columns):
+            kinds = {type(value) for value in values if value is not None}
+            if kinds == {int}:
+                fields.append(pyarrow.field(name, pyarrow.int64()))
+            elif kinds and kinds <= {int, float}:
+                fields.append(pyarrow.field(name, pyarrow.float64()))
+            else:
+                fields.append(pyarrow.field(name, pyarrow.string()))
+        return pyarrow.schema(fields)
+
+    def _convert(self, value: Any, kind: "pyarrow.DataType") -> Any:
+        if value is None:
+            return None
+        if pyarrow.types.is_string(kind):
+            return str(value)
+        if isinstance(value, int) or (isinstance(value, float) and pyarrow.types.is_floating(kind)):
+            return value
+        self.mismatches += 1
+        return None
+
+    def _batch(self, rows: "list[results.record]") -> "pyarrow.RecordBatch":
+        width = len(self.schema)
+        padded = [([row.id] + row.values())[:width] for row in rows]
+        padded = [row + [None] * (width - len(row)) for row in padded]
+        columns = [
+            pyarrow.array([self._convert(value, field.type) for value in values], type=field.type)
+            for field, values in zip(self.schema, zip(*padded))
+        ]
+        return pyarrow.RecordBatch.from_arrays(columns, schema=self.schema)
+
+    def _write_rows(self, rows: "list[results.record]") -> None:
+        if self.schema is None:
+            self.schema = self._infer_schema(rows)
+            self.writer = self._open_writer()
+        self._write_batch(self._batch(rows))
+
+    def _open_writer(self) -> Any:
+        raise NotImplementedError
+
+    def _write_batch(self, batch: "pyarrow.RecordBatch") -> None:
+        self.writer.write_batch(batch)
+
+    def close(self) -> None:
+        super().close()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.mismatches:
+            self.log.warning(f"{self.mismatches} values did not fit the column types of {self.path} and were written as null.")
+
+
+class ParquetSink(ColumnarSink):
+    def _open_writer(self) -> "pyarrow.parquet.ParquetWriter":
+        return pyarrow.parquet.ParquetWriter(self.path, self.schema, compression="zstd")
+
+    # one row group per buffered batch
+    def _write_batch(self, batch: "pyarrow.RecordBatch") -> None:
+        self.writer.write_table(pyarrow.Table.from_batches([batch]), row_group_size=len(batch))
+
+
+class ArrowSink(ColumnarSink):
+    def _open_writer(self) -> "pyarrow.ipc.RecordBatchFileWriter":
+        return pyarrow.ipc.new_file(self.path, self.schema)
+
+
+def has_pyarrow() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def load_pyarrow(output_format: str = "columnar") -> Any:
+    global pyarrow
+    if pyarrow is None:
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError(
+                f"{output_format} output needs pyarrow, install it with pip install pyarrow or choose tsv or jsonl output."
+            )
+    return pyarrow
+
+
+# MultiProcess checks the sink before starting any worker, since the queue engine only opens it in the listener process
+def check_sink(output_format: str, path: Optional[str] = None) -> None:
+    if output_format not in formats:
+        raise ValueError(f"Unknown output format: {output_format}")
+    if output_format in columnar_formats:
+        load_pyarrow(output_format)
+        if not path or path == "-":
+            raise ValueError(f"{output_format} output needs an output file path.")
+
+
+# checkpoint journals need an output file they can truncate and append to
+def check_journal(output_format: str, path: Optional[str] = None) -> None:
+    if not path or path == "-":
+        raise ValueError("Checkpointing and resuming need an output file path.")
+    if output_format in columnar_formats:
+        raise ValueError(f"Checkpointing and resuming need tsv or jsonl output, {output_format} files can not be appended to.")
+
+
+def open_sink(
+    output_format: str,
+    path: Optional[str] = None,
+    separator: str = "\t",
+    batch_rows: int = 4096,
+    journal: Optional[checkpoint.Journal] = None,
+    resume: bool = False,
+) -> Sink:
+    check_sink(output_format, path)
+    match output_format:
+        case "tsv":
+            return TsvSink(path, batch_rows, separator, journal, resume)
+        case "jsonl":
+            return JsonlSink(path, batch_rows, journal, resume)
+        case "parquet":
+            return ParquetSink(path, batch_rows)
+        case "arrow":
+            return ArrowSink(path, batch_rows)
@@ -0,0 +1,112 @@
+# Cached motif version check. The current BGSU hairpin release is looked up at most once every ttl seconds and stored in
+# [cache]/motif_version.json, so regular starts do not wait for the BGSU API. Failed lookups are cached as well (for at most failure_ttl
+# seconds), offline nodes then skip the check instead of waiting through the connection failure on every start.
+# In background mode an expired check is refreshed by a detached process, the current run continues with the last known release and picks
+# up a newer one on the next start.
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from time import time
+from typing import Optional
+
+import Motif_collection as mc
+
+failure_ttl = 3600  # seconds
+lock_timeout = 120  # seconds, a refresh lock older than this is considered stale
+
+
+def cache_file(directory: str) -> str:
+    return os.path.join(directory, "motif_version.json")
+
+
+def fetch(timeout: float = 10.0) -> str:
+    return mc.release_version(mc.get_api_response(mc.ApiClient().release_call("hl"), attempts=1, timeout=timeout))
+
+
+def read(path: str) -> Optional[dict]:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _expired(entry: Optional[dict], ttl: float) -> bool:
+    if entry is None:
+        return True
+    if entry.get("release") is None:
+        ttl = min(ttl, failure_ttl)
+    return time() - entry.get("checked", 0) >= ttl
+
+
+def _write(path: str, release: Optional[str], error: Optional[str] = None) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".json")
+    with os.fdopen(fd, "w") as file:
+        json.dump({"release": release, "checked": time(), "error": error}, file)
+    os.replace(temporary, path)
+
+
+# looks up the current release and caches the result, failures are cached and raised
+def refresh(path: str) -> str:
+    try:
+        release = fetch()
+    except Exception as error:
+        try:
+            _write(path, None, str(error))
+        except OSError:
+            pass
+        raise ConnectionError(f"Unable to get current motif version. {error}")
+    try:
+        _write(path, release)
+    except OSError:
+        pass  # read only installations check on every start
+    return release
+
+
+# starts at most one detached refresh at a time, it outlives the current run
+def refresh_in_background(path: str) -> None:
+    path = os.path.abspath(path)
+    lock = f"{path}.lock"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(lock) and time() - os.path.getmtime(lock) >= lock_timeout:
+            os.remove(lock)
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL))
+    except OSError:
+        return
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), path],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+# Returns the current release, None if it is unknown because the check runs in the background. Raises ConnectionError if the (cached)
+# check failed. A ttl of 0 checks on every start.
+def current_version(directory: str, ttl: float = 86400, background: bool = False) -> Optional[str]:
+    path = cache_file(directory)
+    entry = read(path)
+    if not _expired(entry, ttl):
+        if entry["release"] is None:
+            raise ConnectionError(f"Unable to get current motif version at the last check. {entry.get('error')}")
+        return entry["release"]
+    if not background:
+        return refresh(path)
+    refresh_in_background(path)
+    return entry["release"] if entry else None
+
+
+if __name__ == "__main__":
+    try:
+        refresh(sys.argv[1])
+    finally:
+        try:
+            os.remove(f"{sys.argv[1]}.lock")
+        except OSError:
+            pass